@@ -0,0 +1,167 @@
+"""Benchmark of the QueryBuilder phases: parameters validation, builder construction, statement build, SQL compilation
+and execution against a SQLite database seeded with articles and authors.
+
+Usage:
+    python benchmarks/bench_query.py [--rows 10000 1000000] [--output results.json] [--compare baseline.json]
+
+Results are written as JSON (one entry per phase, case and database size), and can be compared to the results of a
+previous release: the script exits with an error if a phase is slower than the baseline by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+from importlib import metadata
+from typing import List, Optional
+import sqlalchemy
+from sqlalchemy import insert, JSON
+from sqlalchemy.dialects import sqlite
+from sqlmodel import SQLModel, Field, Relationship, Column, Session, create_engine, func, select
+from enacit4r_sql.utils.query import QueryBuilder, validate_params
+
+
+class Author(SQLModel, table=True):
+    id: Optional[int] = Field(primary_key=True)
+    name: str
+    email: str
+    institutions: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
+    article_id: Optional[int] = Field(default=None, foreign_key="article.id", ondelete="CASCADE", index=True)
+
+    # relationships
+    article: Optional["Article"] = Relationship(back_populates="authors")
+
+
+class Article(SQLModel, table=True):
+    id: Optional[int] = Field(primary_key=True)
+    title: str
+    stars: int
+    # relationships
+    authors: List["Author"] = Relationship(back_populates="article")
+
+
+CASES = {
+    "empty": {},
+    "simple": {"title": {"$ilike": "drone"}},
+    "nested": {"$and": [{"stars": {"$gte": 2}}, {"$or": [{"title": {"$ilike": "drone"}}, {"$and": [{"stars": {"$in": [3, 4]}}, {"title": {"$like": "Robot"}}]}]}]},
+    "deep": {"$or": [{"$and": [{"stars": {"$gte": i % 5}}, {"$or": [{"title": {"$like": f"Drone {i}"}}, {"id": i}]}]} for i in range(50)]},
+    "wide_in": {"id": list(range(1, 5001))},
+    "join": {"stars": {"$gte": 2}, "$author": {"name": {"$ilike": "john"}}},
+}
+
+
+def seed(path, rows):
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        if session.exec(select(func.count(Article.id))).one() == rows:
+            return engine
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    chunk = 50000
+    with engine.begin() as connection:
+        for offset in range(0, rows, chunk):
+            ids = range(offset + 1, min(offset + chunk, rows) + 1)
+            connection.execute(insert(Article), [{"id": i, "title": f"Drone {i}" if i % 2 else f"Robot {i}", "stars": i % 5} for i in ids])
+            connection.execute(insert(Author), [{"id": i, "name": "John Doe" if i % 3 else "Jane Doe", "email": f"author{i}@epfl.ch",
+                                                 "institutions": ["EPFL"], "article_id": i} for i in ids])
+    return engine
+
+
+def measure(func, number, repeat):
+    timings = [t / number * 1e6 for t in timeit.repeat(func, number=number, repeat=repeat)]
+    return {"min_us": round(min(timings), 2), "median_us": round(statistics.median(timings), 2)}
+
+
+def make_builder(filter):
+    return QueryBuilder(Article, filter, ["title", "desc"], [0, 9], joinModels={"$author": Author}, joinMode="exists")
+
+
+def run(rows_list, number, repeat, db_dir):
+    results = []
+    for case, filter in CASES.items():
+        builder = make_builder(filter)
+        start, end, query = builder.build_query(0)
+        phases = {
+            "validate": lambda: validate_params(filter, ["title", "desc"], [0, 9]),
+            "construct": lambda: make_builder(filter),
+            "build_query": lambda: make_builder(filter).build_query(0),
+            "build_count_query": lambda: make_builder(filter).build_count_query(),
+            "compile": lambda: query.compile(dialect=sqlite.dialect()),
+        }
+        if case in ["deep", "wide_in", "join"]:
+            # filters that the query schema does not accept
+            del phases["validate"]
+        for phase, func in phases.items():
+            results.append({"phase": phase, "case": case, "rows": None, **measure(func, number, repeat)})
+    for rows in rows_list:
+        engine = seed(os.path.join(db_dir, f"bench-{rows}.db"), rows)
+        with Session(engine) as session:
+            for case, filter in CASES.items():
+                builder = make_builder(filter)
+                count_query = builder.build_count_query()
+                start, end, query = builder.build_query(0)
+                # execution is slower, fewer iterations
+                results.append({"phase": "execute_count", "case": case, "rows": rows,
+                                **measure(lambda: session.exec(count_query).one(), max(1, number // 100), repeat)})
+                results.append({"phase": "execute_query", "case": case, "rows": rows,
+                                **measure(lambda: session.exec(query).all(), max(1, number // 100), repeat)})
+        engine.dispose()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    reference = {(r["phase"], r["case"], r["rows"]): r["min_us"] for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        key = (result["phase"], result["case"], result["rows"])
+        if key in reference and reference[key] > 0:
+            ratio = result["min_us"] / reference[key]
+            print(f"{result['phase']:>18} {result['case']:>8} {str(result['rows']):>8}: {ratio:6.2f}x")
+            if ratio > 1 + tolerance:
+                regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="*", default=[10000], help="database sizes, e.g. 10000 1000000")
+    parser.add_argument("--number", type=int, default=200, help="iterations per measure")
+    parser.add_argument("--repeat", type=int, default=5, help="measures per phase")
+    parser.add_argument("--db-dir", default=tempfile.gettempdir(), help="directory of the seeded databases, reused across runs")
+    parser.add_argument("--output", help="JSON results file, standard output if not specified")
+    parser.add_argument("--compare", help="JSON results file of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="accepted slowdown ratio when comparing")
+    args = parser.parse_args()
+
+    report = {
+        "version": _version(),
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "results": run(args.rows, args.number, args.repeat, args.db_dir),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report["results"], json.load(f), args.tolerance)
+        if len(regressions):
+            print(f"{len(regressions)} regression(s): {regressions}", file=sys.stderr)
+            sys.exit(1)
+
+
+def _version():
+    try:
+        return metadata.version("enacit4r-sql")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+if __name__ == "__main__":
+    main()
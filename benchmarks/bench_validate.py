@@ -0,0 +1,31 @@
+"""Micro-benchmark of validate_params: schema loaded and validator built per call vs cached validator.
+
+Usage:
+    python benchmarks/bench_validate.py [number]
+"""
+import sys
+import timeit
+from jsonschema import validate
+from enacit4r_sql.utils.query import load_schema, get_validator, validate_params
+
+FILTER = {"$and": [{"stars": {"$ge": 1}}, {"$or": [{"title": {"$like": "Drone"}}, {"title": {"$like": "Robot"}}]}]}
+SORT = ["title", "desc"]
+RANGE = [0, 9]
+
+
+def uncached():
+    # previous behavior: read the schema and build a validator on every call
+    schema = load_schema()
+    validate(instance={"filter": FILTER, "sort": SORT, "range": RANGE, "fields": []}, schema=schema)
+
+
+def cached():
+    validate_params(FILTER, SORT, RANGE)
+
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    get_validator()
+    for name, func in [("uncached", uncached), ("cached", cached)]:
+        seconds = min(timeit.repeat(func, number=number, repeat=5))
+        print(f"{name:>10}: {seconds / number * 1e6:10.1f} us/call")
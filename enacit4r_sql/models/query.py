@@ -1,6 +1,50 @@
+from typing import Any, Dict, List
 from pydantic import BaseModel
 
 class ListResult(BaseModel):
     total: int
     skip: int | None
     limit: int | None
+    count_strategy: str = "exact"
+    is_estimate: bool = False
+
+
+class IndexRecommendation(BaseModel):
+    table: str
+    columns: List[str]
+    using: str
+    ddl: str
+    count: int
+    reason: str
+
+
+class AccessPatternWarning(BaseModel):
+    table: str
+    column: str
+    operator: str
+    count: int
+    message: str
+
+
+class PlanIssue(BaseModel):
+    kind: str
+    relation: str | None
+    rows: int | None
+    message: str
+    criteria: List[str]
+
+
+class PlanSummary(BaseModel):
+    dialect: str
+    kind: str
+    filter: dict
+    duration: float | None = None
+    issues: List[PlanIssue]
+    plan: Any
+
+
+class AggregateResult(BaseModel):
+    total: int
+    skip: int | None
+    limit: int | None
+    columns: Dict[str, List[Any]]
@@ -0,0 +1,168 @@
+from collections import Counter
+from threading import Lock
+from enacit4r_sql.models.query import IndexRecommendation, AccessPatternWarning
+from enacit4r_sql.utils.query import QueryBuilder
+
+EQUALITY_OPERATORS = ["$eq", "$in"]
+RANGE_OPERATORS = ["$gt", "$gte", "$ge", "$lt", "$lte", "$le"]
+
+WARNINGS = {
+    "$like": "the %value% pattern has a leading wildcard, a B-tree index cannot be used (trigram index required)",
+    "$ilike": "the %value% pattern has a leading wildcard, a B-tree index cannot be used (trigram index required)",
+    "$endswith": "the %value pattern has a leading wildcard, a B-tree index cannot be used (trigram index required)",
+    "$exists": "the column is cast to a string, an index on the column cannot be used",
+    "$ne": "a negation cannot use an index",
+    "$nin": "a negation cannot use an index",
+}
+
+
+class IndexAdvisor:
+    """Recorder of the access patterns of the queries (filtered columns and operators, sort columns), per model,
+    that recommends the PostgreSQL indexes that would serve them:
+
+    * B-tree composite indexes on the equality columns followed by the sort column (or a range column)
+    * B-tree indexes on the foreign keys of the join models, followed by their equality columns
+    * trigram GIN indexes (`pg_trgm`) for `$like`, `$ilike` and `$endswith`
+    * B-tree indexes with `text_pattern_ops` for `$startswith` and `$istartswith`
+    * full-text GIN indexes for `$search`
+    * GIN indexes on JSONB columns for `$contains`
+
+    It also reports the patterns that cannot use an index.
+    """
+
+    def __init__(self):
+        self._btree = Counter()
+        self._trigram = Counter()
+        self._gin = Counter()
+        self._pattern = Counter()
+        self._fulltext = Counter()
+        self._warnings = Counter()
+        self._lock = Lock()
+
+    def record(self, query_builder: QueryBuilder):
+        """Record the access pattern of a query builder.
+
+        Args:
+            query_builder (QueryBuilder): The query builder
+        """
+        with self._lock:
+            model = query_builder.model
+            eq, ranges = self._walk(query_builder, model, query_builder.filter, True)
+            sort = [field for field, _, _ in query_builder._parse_sort() if "." not in field]
+            columns = self._make_composite(eq, ranges, sort)
+            if len(columns):
+                self._btree[(model.__table__.name, tuple(columns), "equality and sort columns")] += 1
+
+    def recommend(self, min_count: int = 1) -> list:
+        """Get the recommended indexes, the most used first.
+
+        Args:
+            min_count (int, optional): Minimum number of recorded queries that would use an index. Defaults to 1.
+
+        Returns:
+            list: The list of IndexRecommendation
+        """
+        recommendations = []
+        with self._lock:
+            for (table, columns, reason), count in self._btree.items():
+                name = f"ix_{table}_{'_'.join(columns)}"
+                ddl = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)});"
+                recommendations.append(IndexRecommendation(table=table, columns=list(columns), using="btree", ddl=ddl, count=count, reason=reason))
+            for (table, column), count in self._trigram.items():
+                ddl = f"CREATE EXTENSION IF NOT EXISTS pg_trgm; CREATE INDEX IF NOT EXISTS ix_{table}_{column}_trgm ON {table} USING gin ({column} gin_trgm_ops);"
+                recommendations.append(IndexRecommendation(table=table, columns=[column], using="gin_trgm", ddl=ddl, count=count, reason="$like, $ilike and $endswith patterns"))
+            for (table, column, operator), count in self._pattern.items():
+                if operator == "$istartswith":
+                    ddl = f"CREATE INDEX IF NOT EXISTS ix_{table}_{column}_lower_pattern ON {table} (lower({column}) text_pattern_ops);"
+                else:
+                    ddl = f"CREATE INDEX IF NOT EXISTS ix_{table}_{column}_pattern ON {table} ({column} text_pattern_ops);"
+                recommendations.append(IndexRecommendation(table=table, columns=[column], using="btree", ddl=ddl, count=count, reason=f"{operator} prefix patterns"))
+            for (table, column, config), count in self._fulltext.items():
+                ddl = f"CREATE INDEX IF NOT EXISTS ix_{table}_{column}_fts ON {table} USING gin (to_tsvector('{config}', {column}));"
+                recommendations.append(IndexRecommendation(table=table, columns=[column], using="gin_fts", ddl=ddl, count=count, reason="$search full-text search"))
+            for (table, column), count in self._gin.items():
+                ddl = f"CREATE INDEX IF NOT EXISTS ix_{table}_{column}_gin ON {table} USING gin ({column} jsonb_path_ops);"
+                recommendations.append(IndexRecommendation(table=table, columns=[column], using="gin", ddl=ddl, count=count, reason="$contains on JSONB"))
+        return sorted([r for r in recommendations if r.count >= min_count], key=lambda r: (-r.count, r.table, r.columns))
+
+    def warnings(self) -> list:
+        """Get the recorded patterns that cannot use an index, the most frequent first.
+
+        Returns:
+            list: The list of AccessPatternWarning
+        """
+        with self._lock:
+            warnings = [AccessPatternWarning(table=table, column=column, operator=operator, count=count, message=WARNINGS[operator])
+                        for (table, column, operator), count in self._warnings.items()]
+        return sorted(warnings, key=lambda w: (-w.count, w.table, w.column, w.operator))
+
+    def clear(self):
+        """Forget the recorded access patterns."""
+        with self._lock:
+            self._btree.clear()
+            self._trigram.clear()
+            self._gin.clear()
+            self._pattern.clear()
+            self._fulltext.clear()
+            self._warnings.clear()
+
+    def _walk(self, query_builder, model, filter, conjunctive):
+        # collect the equality and range columns that are AND-ed at this level, the criteria
+        # of OR-ed branches can only use single column indexes
+        table = model.__table__.name
+        eq = []
+        ranges = []
+        for field, value in filter.items():
+            if field == "$and" or field == "$or":
+                for sub_filter in value:
+                    sub_eq, sub_ranges = self._walk(query_builder, model, sub_filter, conjunctive and field == "$and")
+                    eq.extend(sub_eq)
+                    ranges.extend(sub_ranges)
+            elif field in query_builder.joinModels:
+                self._record_join(query_builder, model, query_builder.joinModels[field], value)
+            else:
+                for operator in self._get_operators(value):
+                    if operator in EQUALITY_OPERATORS or operator in RANGE_OPERATORS:
+                        if conjunctive:
+                            (eq if operator in EQUALITY_OPERATORS else ranges).append(field)
+                        elif field != "id":
+                            self._btree[(table, (field,), "single column criteria in $or")] += 1
+                    elif operator in ["$like", "$ilike", "$endswith"]:
+                        self._trigram[(table, field)] += 1
+                    elif operator == "$startswith" or operator == "$istartswith":
+                        self._pattern[(table, field, operator)] += 1
+                    elif operator == "$search":
+                        self._fulltext[(table, field, query_builder.searchConfig)] += 1
+                    elif operator == "$contains":
+                        self._gin[(table, field)] += 1
+                    if operator in WARNINGS:
+                        self._warnings[(table, field, operator)] += 1
+        return eq, ranges
+
+    def _record_join(self, query_builder, model, joinModel, filter):
+        eq, ranges = self._walk(query_builder, joinModel, filter, True)
+        # foreign keys of the join model that reference the model (one-to-many)
+        keys = [fk.parent.name for fk in joinModel.__table__.foreign_keys if fk.column.table is model.__table__]
+        if len(keys):
+            columns = keys + [column for column in self._make_composite(eq, ranges, []) if column not in keys]
+            self._btree[(joinModel.__table__.name, tuple(columns), "join foreign key and equality columns")] += 1
+        else:
+            columns = self._make_composite(eq, ranges, [])
+            if len(columns):
+                self._btree[(joinModel.__table__.name, tuple(columns), "equality columns")] += 1
+
+    def _make_composite(self, eq, ranges, sort):
+        if "id" in eq:
+            # primary key lookup
+            return []
+        columns = sorted(set(eq))
+        for column in sort[:1] if len(sort) else ranges[:1]:
+            if column not in columns and column != "id":
+                columns.append(column)
+        return columns
+
+    def _get_operators(self, value):
+        if isinstance(value, dict):
+            return list(value.keys())
+        # list (IN), scalar or null value
+        return ["$in"] if isinstance(value, list) else ["$eq"]
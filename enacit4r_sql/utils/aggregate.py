@@ -0,0 +1,239 @@
+import json
+from sqlalchemy import func, select, cast, Integer, literal_column
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+from sqlalchemy.types import DateTime
+from enacit4r_sql.models.query import AggregateResult
+from enacit4r_sql.utils.query import QueryBuilder, ValidationError, paramAsDict
+
+AGGREGATE_OPERATORS = ["count", "count_distinct", "sum", "avg", "min", "max"]
+
+BUCKET_UNITS = ["year", "quarter", "month", "week", "day", "hour", "minute"]
+
+# SQLite formats of the truncated date times, see DateTrunc
+_SQLITE_FORMATS = {
+    "year": "%Y-01-01 00:00:00",
+    "month": "%Y-%m-01 00:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "minute": "%Y-%m-%d %H:%M:00",
+}
+
+
+class DateTrunc(ColumnElement):
+    """Date time truncated to the start of its year, quarter, month, week (Monday), day, hour or minute:
+    `date_trunc(unit, column)` on PostgreSQL, formatted with `strftime` on SQLite.
+    """
+
+    inherit_cache = True
+    type = DateTime()
+    _traverse_internals = [
+        ("unit", InternalTraversal.dp_string),
+        ("column", InternalTraversal.dp_clauseelement),
+    ]
+
+    def __init__(self, unit: str, column):
+        """Initialize the expression.
+
+        Args:
+            unit (str): The unit, one of `BUCKET_UNITS`
+            column: The date or date time column
+
+        Raises:
+            ValidationError: If the unit is not supported
+        """
+        if unit not in BUCKET_UNITS:
+            raise ValidationError(f"Invalid bucket unit: {unit}")
+        self.unit = unit
+        self.column = column
+
+
+@compiles(DateTrunc)
+def _compile_date_trunc(element, compiler, **kw):
+    # the unit is rendered inline, so that the select and group by expressions are identical
+    return compiler.process(func.date_trunc(literal_column(f"'{element.unit}'"), element.column), **kw)
+
+
+@compiles(DateTrunc, "sqlite")
+def _compile_date_trunc_sqlite(element, compiler, **kw):
+    column = element.column
+    if element.unit == "week":
+        # back to the Monday, %w being 0 for Sunday
+        days = (cast(func.strftime(literal_column("'%w'"), column), Integer) + 6) % 7
+        expression = func.datetime(column, literal_column("'start of day'"), func.printf(literal_column("'-%d days'"), days))
+    elif element.unit == "quarter":
+        month = (cast(func.strftime(literal_column("'%m'"), column), Integer) - 1) // 3 * 3 + 1
+        expression = func.printf(literal_column("'%s-%02d-01 00:00:00'"), func.strftime(literal_column("'%Y'"), column), month)
+    else:
+        expression = func.strftime(literal_column(f"'{_SQLITE_FORMATS[element.unit]}'"), column)
+    return compiler.process(expression, **kw)
+
+
+class AggregateBuilder:
+    """Builds a single `GROUP BY` statement over the rows that match the filter of a query builder (including the
+    join models criteria and the join mode), from a declarative specification:
+
+    * `groupBy`: the fields to group by, of the model, of a join model (`"$joinKey.field"`) or of a relationship (`"relationship.field"`)
+    * `buckets`: date time fields truncated to a unit, by name, e.g. `{"month": {"field": "created", "unit": "month"}}`
+    * `measures`: aggregates by name, e.g. `{"total": {"op": "sum", "field": "amount"}}`, `count` not requiring a field
+
+    The sort and range of the query builder apply to the groups: the sort fields are the names of the groups, buckets
+    and measures. The related fields are outer joined, and the measures computed over the joined rows: `count` counts
+    the distinct rows of the model, `min`, `max` and `count_distinct` are not changed by duplicated rows, but the rows
+    are multiplied by the one-to-many related models, hence `sum`, `avg` and the `count` of a field are only allowed
+    on the fields of the one-to-many related model, if there is a single one.
+    """
+
+    def __init__(self, query_builder: QueryBuilder, spec: dict | str):
+        """Initialize the builder.
+
+        Args:
+            query_builder (QueryBuilder): The query builder, which filter, sort and range are applied
+            spec (dict | str): The aggregation specification, or its JSON
+
+        Raises:
+            ValidationError: If the specification is not valid
+        """
+        self.query_builder = query_builder
+        self.spec = paramAsDict(spec) if isinstance(spec, str) else spec
+        self._joins = []
+        # one-to-many related models, which multiply the rows
+        self._multiplying = []
+        self.groups = {}
+        self.measures = {}
+        for field in self.spec.get("groupBy", []):
+            self._add(self.groups, field, self._resolve(field)[1])
+        for name, bucket in self.spec.get("buckets", {}).items():
+            self._add(self.groups, name, DateTrunc(bucket.get("unit"), self._resolve(bucket.get("field"))[1]))
+        measures = self.spec.get("measures", {})
+        # joins first, the count depends on them
+        for measure in measures.values():
+            if isinstance(measure, dict) and measure.get("field") is not None:
+                self._resolve(measure["field"])
+        for name, measure in measures.items():
+            self._add(self.measures, name, self._make_measure(name, measure))
+        if not len(self.groups) and not len(self.measures):
+            raise ValidationError("Empty aggregation")
+
+    def build_query(self):
+        """Build the query that groups the rows that match the filter and computes the measures, sorted and ranged as
+        specified. Each row holds the groups, the measures and the total count of groups in an extra `total_count`
+        column (`count(*) OVER ()`), see `make_result`. When a cache is used, the statement is shared and its
+        parameter values are set in the `params` of the query builder, to be passed at execution time.
+
+        Returns:
+            tuple: A tuple containing the start index, end index and the query object.
+
+        Raises:
+            ValidationError: If the filter applies to join models without a join mode, or if a sort field is not a group or a measure
+        """
+        query_builder = self.query_builder
+        query_builder._check_join_mode()
+        joined = query_builder.joinMode != "exists" and query_builder._has_join()
+        model = query_builder.model
+
+        def build(filter):
+            groups = [expression.label(name) for name, expression in self.groups.items()]
+            measures = [expression.label(name) for name, expression in self.measures.items()]
+            query_ = select(*groups, *measures, func.count().over().label("total_count")).select_from(model)
+            for join_model in self._joins:
+                query_ = query_.outerjoin(join_model, query_builder._get_join_condition(model, join_model))
+            if joined:
+                # the rows multiplied by the filter joins are not aggregated
+                ids = query_builder._apply_model_filter(select(model.id).distinct(), model, filter).cte("filtered_ids")
+                query_ = query_.where(model.id.in_(select(ids.c.id)))
+            else:
+                query_ = query_builder._apply_model_filter(query_, model, filter)
+            if len(groups):
+                query_ = query_.group_by(*self.groups.values())
+            return self._apply_sort(query_, {label.name: label for label in groups + measures})
+
+        if query_builder.cache is not None:
+            key = ("aggregate", json.dumps(self.spec, sort_keys=True), tuple(query_builder._parse_sort()), joined)
+            query_ = query_builder._build_cached(key, build)
+        else:
+            query_ = build(query_builder.filter)
+        return query_builder._apply_range(query_, None)
+
+    def make_result(self, rows: list, total_count: int = None) -> AggregateResult:
+        """Turn the rows retrieved with the aggregate query into arrays of values, by group and measure name.
+
+        Args:
+            rows (list): The rows retrieved with the query built by `build_query`
+            total_count (int, optional): The total count of groups, required only when the page is empty and does not start at 0. Defaults to None.
+
+        Returns:
+            AggregateResult: The total count of groups, the range and the values by name
+
+        Raises:
+            ValueError: If the total count cannot be determined
+        """
+        range = self.query_builder.range
+        start, end = range if len(range) == 2 and range[1] >= 0 else (0, None)
+        if len(rows):
+            total_count = rows[0][-1]
+        elif start == 0:
+            total_count = 0
+        elif total_count is None:
+            raise ValueError("Total count is unknown when the page is out of range")
+        if end is None:
+            end = total_count
+        names = list(self.groups) + list(self.measures)
+        columns = {name: [row[i] for row in rows] for i, name in enumerate(names)}
+        return AggregateResult(total=total_count, skip=start, limit=end, columns=columns)
+
+    def _add(self, expressions, name, expression):
+        if name in self.groups or name in self.measures:
+            raise ValidationError(f"Duplicate aggregate name: {name}")
+        expressions[name] = expression
+
+    def _resolve(self, field):
+        if not isinstance(field, str):
+            raise ValidationError(f"Invalid aggregate field: {field}")
+        model = self.query_builder.model
+        if "." not in field and field not in model.__table__.columns:
+            raise ValidationError(f"Invalid aggregate field: {field}")
+        field_model, column = self.query_builder._resolve_field(field)
+        if field_model is not model and field_model not in self._joins:
+            self._joins.append(field_model)
+            if not self.query_builder._is_many_to_one(field.split(".", 1)[0], field_model):
+                self._multiplying.append(field_model)
+        return field_model, column
+
+    def _make_measure(self, name, measure):
+        if not isinstance(measure, dict):
+            raise ValidationError(f"Invalid measure: {name}")
+        op = measure.get("op")
+        if op not in AGGREGATE_OPERATORS:
+            raise ValidationError(f"Invalid aggregate operator: {op}")
+        field = measure.get("field")
+        if op == "count" and field is None:
+            return func.count(func.distinct(self.query_builder.model.id)) if len(self._joins) else func.count()
+        if field is None:
+            raise ValidationError(f"Missing field of measure: {name}")
+        field_model, column = self._resolve(field)
+        if op in ["sum", "avg", "count"] and len(self._multiplying) and self._multiplying != [field_model]:
+            raise ValidationError(f"Invalid measure: {name}, the rows of {field} are multiplied by one-to-many related models")
+        if op == "count":
+            return func.count(column)
+        if op == "count_distinct":
+            return func.count(func.distinct(column))
+        return getattr(func, op)(column)
+
+    def _apply_sort(self, query_, labels):
+        clauses = []
+        sorted_names = []
+        for field, desc, nulls in self.query_builder._parse_sort():
+            if field not in labels:
+                raise ValidationError(f"Invalid sort field: {field}")
+            clause = labels[field].desc() if desc else labels[field].asc()
+            if nulls == "first":
+                clause = clause.nulls_first()
+            elif nulls == "last":
+                clause = clause.nulls_last()
+            clauses.append(clause)
+            sorted_names.append(field)
+        # the groups as tie-breakers, for a deterministic order of the groups
+        clauses.extend(labels[name] for name in self.groups if name not in sorted_names)
+        return query_.order_by(*clauses) if len(clauses) else query_
@@ -0,0 +1,88 @@
+from sqlalchemy import column, func, literal, select, union_all
+from enacit4r_sql.models.query import ListResult
+
+
+def list_batch(session, requests: list) -> list:
+    """Count the rows and retrieve the requested page of several query builders, in few round trips:
+
+    * the counts are selected as scalar sub-queries of a single statement
+    * the pages of the same model and fields are combined with `UNION ALL`, each row holding the index of its
+      request and its position in the page
+
+    The builders which statements have parameters to be passed at execution time (statement cache) are executed on
+    their own.
+
+    Args:
+        session: The database session
+        requests (list): The query builders, or (query builder, fields) tuples
+
+    Returns:
+        list: The (ListResult, items) tuples, in the order of the requests; the items are model instances, or tuples of the fields values
+
+    Raises:
+        ValidationError: If the filter of a query builder applies to join models without a join mode
+    """
+    requests = [request if isinstance(request, tuple) else (request, None) for request in requests]
+    # the caller cannot add the joins of the filters
+    for query_builder, fields in requests:
+        query_builder._check_join_mode()
+    totals = _count(session, [query_builder for query_builder, fields in requests])
+    pages = [None] * len(requests)
+    groups = {}
+    for index, (query_builder, fields) in enumerate(requests):
+        start, end, query = query_builder.build_query(None, fields)
+        if len(query_builder.params):
+            pages[index] = _fetch(session, query, query_builder.params, fields)
+        else:
+            groups.setdefault((query_builder.model, tuple(fields or [])), []).append((index, query_builder, query))
+    for (model, fields), queries in groups.items():
+        if len(queries) == 1:
+            index, query_builder, query = queries[0]
+            pages[index] = _fetch(session, query, {}, fields)
+        else:
+            for index, items in _fetch_union(session, model, fields, queries).items():
+                pages[index] = items
+    results = []
+    for (query_builder, fields), total, items in zip(requests, totals, pages):
+        start, end = query_builder.range if len(query_builder.range) == 2 and query_builder.range[1] >= 0 else (0, total)
+        results.append((ListResult(total=total, skip=start, limit=end), items))
+    return results
+
+
+def _count(session, query_builders):
+    totals = [None] * len(query_builders)
+    combined = {}
+    for index, query_builder in enumerate(query_builders):
+        query = query_builder.build_count_query()
+        if len(query_builder.params):
+            totals[index] = session.execute(query, query_builder.params).scalar_one()
+        else:
+            combined[index] = query
+    if len(combined):
+        row = session.execute(select(*[query.scalar_subquery().label(f"count_{index}") for index, query in combined.items()])).one()
+        for index, total in zip(combined, row):
+            totals[index] = total
+    return totals
+
+
+def _fetch(session, query, params, fields):
+    result = session.execute(query, params)
+    return [tuple(row) for row in result.all()] if fields else result.scalars().all()
+
+
+def _fetch_union(session, model, fields, queries):
+    branches = []
+    for index, query_builder, query in queries:
+        # the order of the rows of a sub-query is lost by the union
+        position = func.row_number().over(order_by=query_builder._get_sort_clauses()).label("batch_position")
+        subquery = query.add_columns(position).subquery()
+        branches.append(select(literal(index).label("batch_index"), *subquery.c))
+    union = union_all(*branches).order_by(column("batch_index"), column("batch_position"))
+    pages = {index: [] for index, query_builder, query in queries}
+    if fields:
+        for row in session.execute(union).all():
+            pages[row[0]].append(tuple(row[1:-1]))
+    else:
+        for item, index in session.execute(select(model, column("batch_index")).from_statement(union)).all():
+            pages[index].append(item)
+    return pages
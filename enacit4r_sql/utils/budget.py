@@ -0,0 +1,140 @@
+import json
+import re
+
+# strings (with escapes) and structural characters, scalars are skipped
+_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|[\[\]{},:]|[^\s\[\]{},:"]+')
+
+LOGICAL_OPERATORS = ["$and", "$or"]
+
+
+class FilterBudget:
+    """Limits of the size and complexity of a filter, checked in a single pass before the filter is validated against
+    the schema or turned into SQL: payload bytes (raw JSON), depth, number of nodes (`$and`/`$or`, join keys and
+    field criteria), size of the lists of values (IN lists) and number of joins.
+    """
+
+    def __init__(self, max_bytes: int = 1048576, max_depth: int = 32, max_nodes: int = 10000, max_in_size: int = 100000, max_joins: int = 16):
+        """Initialize the budget.
+
+        Args:
+            max_bytes (int, optional): Maximum size of the raw JSON filter. Defaults to 1048576.
+            max_depth (int, optional): Maximum nesting of the objects and arrays. Defaults to 32.
+            max_nodes (int, optional): Maximum number of nodes. Defaults to 10000.
+            max_in_size (int, optional): Maximum number of values of a list. Defaults to 100000.
+            max_joins (int, optional): Maximum number of join keys. Defaults to 16.
+        """
+        self.max_bytes = max_bytes
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_in_size = max_in_size
+        self.max_joins = max_joins
+
+    def check(self, filter: dict | str, joinModels: dict = None) -> dict:
+        """Check a filter against the budget. A raw JSON filter is scanned without being parsed, and rejected
+        as soon as a limit is exceeded. The size of a parsed filter is the size of its JSON.
+
+        Args:
+            filter (dict | str): The filter, or its raw JSON
+            joinModels (dict, optional): Dictionary of join models, which keys are counted as joins. Defaults to None,
+                any `$` prefixed key (other than `$and`/`$or`) being counted as a join.
+
+        Returns:
+            dict: The bytes (of a raw filter), depth, nodes, number of list values, largest list size and joins of the filter,
+            and a cost estimate (nodes, plus 10 per join, plus 1 per 100 list values)
+
+        Raises:
+            ValidationError: If the filter exceeds the budget
+        """
+        stats = {"bytes": 0, "depth": 0, "nodes": 0, "in_values": 0, "max_in_size": 0, "joins": 0}
+        if isinstance(filter, (str, bytes)):
+            stats["bytes"] = len(filter if isinstance(filter, bytes) else filter.encode())
+            self._check_limit("bytes", stats["bytes"], self.max_bytes)
+            self._scan(filter.decode() if isinstance(filter, bytes) else filter, joinModels, stats)
+        elif filter:
+            # walked first, the depth being checked before the filter is serialized
+            self._walk(filter, "filter", 1, joinModels, stats)
+            stats["bytes"] = len(json.dumps(filter, default=str).encode())
+            self._check_limit("bytes", stats["bytes"], self.max_bytes)
+        stats["cost"] = stats["nodes"] + 10 * stats["joins"] + stats["in_values"] // 100
+        return stats
+
+    def _check_limit(self, name, value, limit):
+        if limit is not None and value > limit:
+            # imported here, the query module depends on this one
+            from enacit4r_sql.utils.query import ValidationError
+            raise ValidationError(f"Filter exceeds the {name} budget: {value} > {limit}")
+
+    def _count_node(self, key, joinModels, stats):
+        stats["nodes"] += 1
+        self._check_limit("nodes", stats["nodes"], self.max_nodes)
+        is_join = key in joinModels if joinModels is not None else key not in LOGICAL_OPERATORS and key.startswith("$")
+        if is_join:
+            stats["joins"] += 1
+            self._check_limit("joins", stats["joins"], self.max_joins)
+
+    def _count_list(self, size, stats):
+        stats["in_values"] += size
+        stats["max_in_size"] = max(stats["max_in_size"], size)
+        self._check_limit("IN list size", size, self.max_in_size)
+
+    def _enter(self, depth, stats):
+        stats["depth"] = max(stats["depth"], depth)
+        self._check_limit("depth", depth, self.max_depth)
+
+    def _walk(self, value, kind, depth, joinModels, stats):
+        # kind: "filter" (criteria by field), "logic" (list of filters), "condition" (operators) or "value"
+        self._enter(depth, stats)
+        if isinstance(value, dict):
+            for key, child in value.items():
+                child_kind = "value"
+                if kind == "filter":
+                    self._count_node(key, joinModels, stats)
+                    child_kind = "logic" if key in LOGICAL_OPERATORS else "filter" if key.startswith("$") else "condition"
+                if isinstance(child, (dict, list)):
+                    self._walk(child, child_kind, depth + 1, joinModels, stats)
+        elif isinstance(value, list):
+            if kind != "logic":
+                self._count_list(len(value), stats)
+            for child in value:
+                if isinstance(child, (dict, list)):
+                    self._walk(child, "filter" if kind == "logic" else "value", depth + 1, joinModels, stats)
+
+    def _scan(self, text, joinModels, stats):
+        # stack of [container, kind, pending key kind, element count]
+        stack = []
+        expect_key = False
+        for match in _TOKENS.finditer(text):
+            token = match.group()
+            top = stack[-1] if len(stack) else None
+            if token == "{" or token == "[":
+                # kind of the value, as in _walk
+                kind = "filter" if top is None else top[2] if top[0] == "{" else "filter" if top[1] == "logic" else "value"
+                if token == "[":
+                    kind = "logic" if kind == "logic" else "value"
+                elif kind == "logic":
+                    kind = "value"
+                if top is not None and top[0] == "[":
+                    top[3] += 1
+                stack.append([token, kind, "value", 0])
+                self._enter(len(stack), stats)
+                expect_key = token == "{"
+            elif token == "}" or token == "]":
+                if top is None:
+                    break
+                if token == "]" and top[1] != "logic":
+                    self._count_list(top[3], stats)
+                stack.pop()
+                expect_key = False
+            elif token == ",":
+                expect_key = top is not None and top[0] == "{"
+            elif token == ":":
+                expect_key = False
+            elif expect_key:
+                if top[1] == "filter":
+                    key = json.loads(token) if token.startswith('"') else token
+                    self._count_node(key, joinModels, stats)
+                    top[2] = "logic" if key in LOGICAL_OPERATORS else "filter" if key.startswith("$") else "condition"
+                else:
+                    top[2] = "value"
+            elif top is not None and top[0] == "[":
+                top[3] += 1
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class StatementCache:
+    """Bounded LRU cache of prebuilt SQL statements, keyed by the normalized shape of a query
+    (model, filter fields and operators, sort and fields), literal values being stripped.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        """Initialize the cache.
+
+        Args:
+            maxsize (int, optional): Maximum number of statements to keep. Defaults to 128.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        """Get the statement stored for the key and mark it as recently used.
+
+        Args:
+            key (tuple): The query shape key
+
+        Returns:
+            The cached statement, None if not found
+        """
+        with self._lock:
+            statement = self._entries.get(key)
+            if statement is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return statement
+
+    def put(self, key, statement):
+        """Store a statement, evicting the least recently used one if the cache is full.
+
+        Args:
+            key (tuple): The query shape key
+            statement: The statement to store
+        """
+        with self._lock:
+            self._entries[key] = statement
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all the statements and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict:
+        """Get the cache counters.
+
+        Returns:
+            dict: The hits, misses, evictions, current size and max size of the cache
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,55 @@
+import json
+from sqlalchemy import text
+from enacit4r_sql.utils.explain import Explain
+from enacit4r_sql.utils.query import QueryBuilder, ValidationError
+
+COUNT_STRATEGIES = ["exact", "capped", "estimate"]
+
+
+def count(session, query_builder: QueryBuilder, strategy: str = "exact", cap: int = 1000) -> tuple:
+    """Count the rows that match the filter of the query builder, using the requested strategy:
+
+    * `exact`: exact count of the distinct ids
+    * `capped`: exact count up to cap, cap and an estimate flag when there are more rows
+    * `estimate`: planner row estimate (PostgreSQL only), from `pg_class.reltuples` when there is no filter.
+      Falls back to the exact count on other databases or when the table has no statistics.
+
+    Args:
+        session: The database session
+        query_builder (QueryBuilder): The query builder
+        strategy (str, optional): The count strategy. Defaults to "exact".
+        cap (int, optional): The maximum number of rows to count with the capped strategy. Defaults to 1000.
+
+    Returns:
+        tuple: A tuple containing the count, whether it is an estimate, and the strategy that was applied.
+
+    Raises:
+        ValidationError: If the strategy is not supported, or if the filter applies to join models without a join mode
+    """
+    if strategy not in COUNT_STRATEGIES:
+        raise ValidationError(f"Invalid count strategy: {strategy}")
+    query_builder._check_join_mode()
+    connection = session.connection()
+    if strategy == "capped":
+        total = connection.execute(query_builder.build_count_query(cap=cap), query_builder.params).scalar_one()
+        return min(total, cap), total > cap, strategy
+    if strategy == "estimate" and connection.dialect.name == "postgresql":
+        total = _estimate(connection, query_builder)
+        if total is not None:
+            return total, True, strategy
+    total = connection.execute(query_builder.build_count_query(), query_builder.params).scalar_one()
+    return total, False, "exact"
+
+
+def _estimate(connection, query_builder: QueryBuilder):
+    if not len(query_builder.filter):
+        table = query_builder.model.__table__
+        name = f"{table.schema}.{table.name}" if table.schema else table.name
+        reltuples = connection.execute(text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:name)"),
+                                       {"name": name}).scalar_one_or_none()
+        # reltuples is -1 (or 0 on older versions) when the table was never analyzed
+        return int(reltuples) if reltuples is not None and reltuples > 0 else None
+    plan = connection.execute(Explain(query_builder.build_ids_query()), query_builder.params).scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,36 @@
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.expression import ClauseElement
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN statement of a query: `EXPLAIN (FORMAT JSON)` on PostgreSQL, `EXPLAIN QUERY PLAN` on SQLite."""
+
+    inherit_cache = False
+
+    def __init__(self, statement, analyze: bool = False):
+        """Initialize the statement.
+
+        Args:
+            statement: The query to explain
+            analyze (bool, optional): Whether the query is executed to report the actual rows, timings and buffers
+                (`EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)`, PostgreSQL only). Defaults to False.
+        """
+        self.statement = statement
+        self.analyze = analyze
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain_postgresql(element, compiler, **kw):
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if element.analyze else "FORMAT JSON"
+    return f"EXPLAIN ({options}) " + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, "sqlite")
+def _compile_explain_sqlite(element, compiler, **kw):
+    return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kw)
@@ -0,0 +1,222 @@
+import csv
+import io
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from enacit4r_sql.utils.query import QueryBuilder, ValidationError
+
+PARTITION_METHODS = ["minmax", "quantiles"]
+
+# end of the batches of a partition
+_DONE = object()
+
+
+def stream(session, query_builder: QueryBuilder, fields: list = None, batch_size: int = 1000):
+    """Stream the rows that match the filter in batches, using a server-side cursor, so that the memory
+    usage does not depend on the size of the result set.
+
+    Args:
+        session: The database session
+        query_builder (QueryBuilder): The query builder
+        fields (list, optional): List of fields to retrieve. Defaults to None.
+        batch_size (int, optional): The number of rows per batch. Defaults to 1000.
+
+    Yields:
+        list: A batch of items (model instances, or rows of the fields values)
+
+    Raises:
+        ValidationError: If the filter applies to join models without a join mode
+    """
+    # the caller cannot add the joins of the filter
+    query_builder._check_join_mode()
+    start, end, query = query_builder.build_query(None, fields)
+    result = session.execute(query.execution_options(yield_per=batch_size), query_builder.params)
+    if not fields:
+        result = result.scalars()
+    for batch in result.partitions():
+        yield batch
+        if not fields:
+            # release the loaded instances from the session
+            for item in batch:
+                session.expunge(item)
+
+
+def partition_ranges(session, query_builder: QueryBuilder, partitions: int, method: str = "minmax") -> list:
+    """Split the rows that match the filter into disjoint ranges of primary keys:
+
+    * `minmax`: ranges of equal width between the min and max ids (integer ids), cheap but unbalanced when ids are sparse
+    * `quantiles`: ranges of equal number of rows (`ntile` over the ids), balanced but the ids are scanned
+
+    Args:
+        session: The database session
+        query_builder (QueryBuilder): The query builder
+        partitions (int): The number of ranges
+        method (str, optional): The split method. Defaults to "minmax".
+
+    Returns:
+        list: The (low, high) ranges, low inclusive and high exclusive, None for unbounded
+
+    Raises:
+        ValidationError: If the method is not supported, or if the filter applies to join models without a join mode
+    """
+    if method not in PARTITION_METHODS:
+        raise ValidationError(f"Invalid partition method: {method}")
+    query_builder._check_join_mode()
+    ids = query_builder.build_ids_query().subquery()
+    if method == "minmax":
+        low, high = session.execute(select(func.min(ids.c.id), func.max(ids.c.id)), query_builder.params).one()
+        if low is None:
+            return [(None, None)]
+        width = max(1, -(-(high - low + 1) // partitions))
+        bounds = list(range(low, high + 1, width))[1:]
+    else:
+        tiles = select(ids.c.id, func.ntile(partitions).over(order_by=ids.c.id).label("tile")).subquery()
+        bounds = session.execute(select(func.min(tiles.c.id)).group_by(tiles.c.tile).order_by(tiles.c.tile), query_builder.params).scalars().all()[1:]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def stream_parallel(engine, query_builder: QueryBuilder, fields: list = None, batch_size: int = 1000, partitions: int = 4, workers: int = 4,
+                    ordered: bool = False, method: str = "minmax", max_batches: int = 4):
+    """Stream the rows that match the filter in batches, the primary key ranges (see `partition_ranges`) being scanned
+    concurrently by a pool of threads, each on its own connection. The memory usage is bounded: a scan waits while
+    `max_batches` of its batches are not consumed.
+
+    Args:
+        engine: The database engine
+        query_builder (QueryBuilder): The query builder
+        fields (list, optional): List of fields to retrieve. Defaults to None.
+        batch_size (int, optional): The number of rows per batch. Defaults to 1000.
+        partitions (int, optional): The number of primary key ranges. Defaults to 4.
+        workers (int, optional): The number of concurrent scans. Defaults to 4.
+        ordered (bool, optional): Whether the rows are streamed in primary key order, otherwise as soon as a batch is read
+            (the sort of the query builder is ignored). Defaults to False.
+        method (str, optional): The split method, see `partition_ranges`. Defaults to "minmax".
+        max_batches (int, optional): The number of batches read ahead, per scan. Defaults to 4.
+
+    Yields:
+        list: A batch of items (model instances, or rows of the fields values)
+
+    Raises:
+        ValidationError: If the query builder has a range, the method is not supported, or the filter applies to join models without a join mode
+    """
+    if len(query_builder.range) == 2 and query_builder.range[1] >= 0:
+        raise ValidationError("A ranged query cannot be partitioned")
+    with Session(engine) as session:
+        ranges = partition_ranges(session, query_builder, partitions, method)
+    start, end, query = query_builder.build_query(None, fields)
+    query = query.order_by(None)
+    if ordered:
+        query = query.order_by(query_builder.model.id)
+    params = dict(query_builder.params)
+    stop = threading.Event()
+    # one queue per scan when ordered, to consume the ranges in order
+    queues = [queue.Queue(max_batches) for _ in ranges] if ordered else [queue.Queue(max_batches * len(ranges))] * len(ranges)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (low, high), batches in zip(ranges, queues):
+            executor.submit(_scan, engine, query_builder.model, query, params, low, high, fields, batch_size, batches, stop)
+        try:
+            done = 0
+            index = 0
+            while done < len(ranges):
+                batch = queues[index].get()
+                if batch is _DONE:
+                    done += 1
+                    index = index + 1 if ordered else index
+                elif isinstance(batch, Exception):
+                    raise batch
+                else:
+                    yield batch
+        finally:
+            # release the scans that wait for the consumer, and cancel those not started
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _scan(engine, model, query, params, low, high, fields, batch_size, batches, stop):
+    if stop.is_set():
+        return
+    try:
+        if low is not None:
+            query = query.where(model.id >= low)
+        if high is not None:
+            query = query.where(model.id < high)
+        with Session(engine) as session:
+            result = session.execute(query.execution_options(yield_per=batch_size), params)
+            if not fields:
+                result = result.scalars()
+            for batch in result.partitions():
+                if not fields:
+                    for item in batch:
+                        session.expunge(item)
+                if not _put(batches, batch, stop):
+                    return
+    except Exception as e:
+        _put(batches, e, stop)
+    _put(batches, _DONE, stop)
+
+
+def _put(batches, item, stop):
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def as_dict(item) -> dict:
+    """Get the values of an item as a dictionary
+
+    Args:
+        item: A model instance, or a row of the fields values
+
+    Returns:
+        dict: The values by field name
+    """
+    if hasattr(item, "_asdict"):
+        return item._asdict()
+    return item.model_dump()
+
+
+def to_ndjson(batches):
+    """Serialize the batches of items into newline-delimited JSON, incrementally.
+
+    Args:
+        batches (iterable): The batches of items, see `stream`
+
+    Yields:
+        str: The JSON lines of a batch
+    """
+    for batch in batches:
+        yield "".join(json.dumps(as_dict(item), default=str) + "\n" for item in batch)
+
+
+def to_csv(batches, columns: list = None):
+    """Serialize the batches of items into CSV, incrementally.
+
+    Args:
+        batches (iterable): The batches of items, see `stream`
+        columns (list, optional): The columns to write. Defaults to None, the fields of the first item.
+
+    Yields:
+        str: The CSV header, then the CSV lines of a batch
+    """
+    buffer = io.StringIO()
+    writer = None
+    if columns:
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+    for batch in batches:
+        for item in batch:
+            values = as_dict(item)
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(values.keys()), extrasaction="ignore")
+                writer.writeheader()
+            writer.writerow(values)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
@@ -0,0 +1,54 @@
+IN_LIST_STRATEGIES = ["expanding", "array", "unnest", "chunked"]
+
+
+class InListPolicy:
+    """Size-aware strategy to filter a column on a list of values (list value, `$in` and `$nin` operators):
+
+    * `expanding`: `column IN (:v1, :v2, ...)`, one bind parameter per value, for small lists
+    * `array` (PostgreSQL): `column = ANY(:values)`, the list is bound as a single array parameter
+    * `unnest` (PostgreSQL): `column IN (SELECT unnest(:values))`, for very large lists, which the planner can hash
+    * `chunked` (other databases): `column IN (...) OR column IN (...)`, lists of at most chunk size values
+    """
+
+    def __init__(self, dialect: str = None, array_threshold: int = 100, unnest_threshold: int = 10000, chunk_size: int = None):
+        """Initialize the policy.
+
+        Args:
+            dialect (str, optional): The database dialect name, e.g. "postgresql". Defaults to None.
+            array_threshold (int, optional): Minimum list size to bind as an array (PostgreSQL). Defaults to 100.
+            unnest_threshold (int, optional): Minimum list size to unnest as a set (PostgreSQL). Defaults to 10000.
+            chunk_size (int, optional): Maximum list size of an IN clause, on other databases. Defaults to None (no chunks).
+        """
+        self.dialect = dialect
+        self.array_threshold = array_threshold
+        self.unnest_threshold = unnest_threshold
+        self.chunk_size = chunk_size
+
+    def choose(self, size: int) -> str:
+        """Choose the strategy for a list of values.
+
+        Args:
+            size (int): The number of values
+
+        Returns:
+            str: The strategy name
+        """
+        if self.dialect == "postgresql":
+            if size >= self.unnest_threshold:
+                return "unnest"
+            if size >= self.array_threshold:
+                return "array"
+        elif self.chunk_size is not None and size > self.chunk_size:
+            return "chunked"
+        return "expanding"
+
+    def chunks(self, values: list) -> list:
+        """Split a list of values into chunks of at most chunk size values.
+
+        Args:
+            values (list): The values
+
+        Returns:
+            list: The lists of values
+        """
+        return [values[i:i + self.chunk_size] for i in range(0, len(values), self.chunk_size)]
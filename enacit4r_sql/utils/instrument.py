@@ -0,0 +1,236 @@
+import time
+from bisect import bisect_left
+from functools import wraps
+from threading import Lock
+
+# the registered listeners, see add_listener
+_listeners = []
+
+DEFAULT_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+
+
+def add_listener(listener):
+    """Register a listener of the query phases. A listener is called after each phase with the arguments:
+
+    * phase (str): `validate`, `construct`, `build_query`, `build_count_query`, `build_page_query`, `build_keyset_query`,
+      `build_ids_query`, or `compile` and `execute` for the engines that are instrumented with `instrument_engine`
+    * table (str): The table of the queried model, None if unknown
+    * start (float): The start of the phase, from `time.perf_counter`
+    * duration (float): The duration of the phase, in seconds
+    * stats (dict): The filter complexity, see `filter_stats`, None for the phases that are not related to a filter
+
+    When no listener is registered, the phases are not timed.
+
+    Args:
+        listener (callable): The listener
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    """Unregister a listener of the query phases.
+
+    Args:
+        listener (callable): The listener
+    """
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def filter_stats(filter: dict, joinModels: dict = {}) -> dict:
+    """Get the complexity of a filter.
+
+    Args:
+        filter (dict): Filter parameters
+        joinModels (dict, optional): Dictionary of join models. Defaults to {}.
+
+    Returns:
+        dict: The number of nodes (`$and`/`$or` and criteria), the depth, the number of joins, the sizes of the IN lists
+    """
+    stats = {"nodes": 0, "depth": 0, "joins": 0, "in_sizes": []}
+    _walk(filter or {}, joinModels, 1, stats)
+    return stats
+
+
+def _walk(filter, joinModels, depth, stats):
+    stats["depth"] = max(stats["depth"], depth)
+    for field, value in filter.items():
+        stats["nodes"] += 1
+        if field == "$and" or field == "$or":
+            for sub_filter in value:
+                _walk(sub_filter, joinModels, depth + 1, stats)
+        elif field in joinModels:
+            stats["joins"] += 1
+            _walk(value, joinModels, depth + 1, stats)
+        elif isinstance(value, list):
+            stats["in_sizes"].append(len(value))
+        elif isinstance(value, dict):
+            for op in ["$in", "$nin"]:
+                if isinstance(value.get(op), list):
+                    stats["in_sizes"].append(len(value[op]))
+
+
+def emit(phase: str, table: str, start: float, duration: float, stats: dict = None):
+    """Notify the listeners of a phase.
+
+    Args:
+        phase (str): The phase
+        table (str): The table of the queried model
+        start (float): The start of the phase
+        duration (float): The duration of the phase, in seconds
+        stats (dict, optional): The filter complexity. Defaults to None.
+    """
+    for listener in list(_listeners):
+        listener(phase, table, start, duration, stats)
+
+
+def instrumented(phase: str):
+    """Decorator of the QueryBuilder methods that times them, when a listener is registered.
+
+    Args:
+        phase (str): The phase
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not _listeners:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            result = method(self, *args, **kwargs)
+            duration = time.perf_counter() - start
+            emit(phase, self.model.__table__.name, start, duration, filter_stats(self.filter, self.joinModels))
+            return result
+        return wrapper
+    return decorator
+
+
+def instrument_engine(engine):
+    """Time the statement compilation and the database execution of an engine, when a listener is registered.
+    The compilation is measured from the start of the execution to the cursor execution, hence includes
+    the connection setup.
+
+    Args:
+        engine: The engine, its sync engine for an async engine
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_execute")
+    def before_execute(conn, clauseelement, multiparams, params, execution_options):
+        if _listeners:
+            conn.info.setdefault("query_timings", []).append((time.perf_counter(), _get_table(clauseelement)))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timings = conn.info.get("query_timings")
+        if _listeners and timings:
+            start, table = timings[-1]
+            now = time.perf_counter()
+            emit("compile", table, start, now - start)
+            timings[-1] = (now, table)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timings = conn.info.get("query_timings")
+        if timings:
+            start, table = timings.pop()
+            if _listeners:
+                emit("execute", table, start, time.perf_counter() - start)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # the timing of a failed statement is dropped, not to be left on the pooled connection
+        conn = exception_context.connection
+        timings = conn.info.get("query_timings") if conn is not None else None
+        if timings:
+            timings.pop()
+
+
+def _get_table(clauseelement):
+    froms = clauseelement.get_final_froms() if hasattr(clauseelement, "get_final_froms") else []
+    return getattr(froms[0], "name", None) if len(froms) else None
+
+
+class OpenTelemetryListener:
+    """Listener that records the phases as OpenTelemetry spans, with the filter complexity as attributes.
+    """
+
+    def __init__(self, tracer):
+        """Initialize the listener.
+
+        Args:
+            tracer: The OpenTelemetry tracer, e.g. `opentelemetry.trace.get_tracer(__name__)`
+        """
+        self.tracer = tracer
+        # offset between the perf_counter and the epoch, in nanoseconds
+        self._offset = time.time_ns() - int(time.perf_counter() * 1e9)
+
+    def __call__(self, phase, table, start, duration, stats):
+        attributes = {"db.sql.table": table} if table else {}
+        if stats:
+            attributes.update({"filter.nodes": stats["nodes"], "filter.depth": stats["depth"], "filter.joins": stats["joins"],
+                               "filter.in_sizes": stats["in_sizes"]})
+        start_time = self._offset + int(start * 1e9)
+        span = self.tracer.start_span(f"query.{phase}", start_time=start_time, attributes=attributes)
+        span.end(end_time=start_time + int(duration * 1e9))
+
+
+class PrometheusAggregator:
+    """Listener that aggregates the phase durations and the filter node counts into histograms per table and phase,
+    rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets: list = DEFAULT_BUCKETS, prefix: str = "enacit4r_sql"):
+        """Initialize the aggregator.
+
+        Args:
+            buckets (list, optional): The upper bounds of the duration buckets, in seconds. Defaults to DEFAULT_BUCKETS.
+            prefix (str, optional): The prefix of the metric names. Defaults to "enacit4r_sql".
+        """
+        self.buckets = sorted(buckets)
+        self.node_buckets = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+        self.prefix = prefix
+        self._durations = {}
+        self._nodes = {}
+        self._lock = Lock()
+
+    def __call__(self, phase, table, start, duration, stats):
+        labels = (table or "", phase)
+        with self._lock:
+            self._observe(self._durations, self.buckets, labels, duration)
+            if stats:
+                self._observe(self._nodes, self.node_buckets, labels, stats["nodes"])
+
+    def _observe(self, histograms, buckets, labels, value):
+        counts, total = histograms.get(labels, ([0] * (len(buckets) + 1), 0))
+        counts[bisect_left(buckets, value)] += 1
+        histograms[labels] = (counts, total + value)
+
+    def render(self) -> str:
+        """Get the histograms in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics
+        """
+        with self._lock:
+            lines = self._render(f"{self.prefix}_phase_duration_seconds", "Duration of the query phases", self._durations, self.buckets)
+            lines += self._render(f"{self.prefix}_filter_nodes", "Number of nodes of the query filters", self._nodes, self.node_buckets)
+        return "\n".join(lines) + "\n"
+
+    def _render(self, name, help, histograms, buckets):
+        lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+        for (table, phase), (counts, total) in sorted(histograms.items()):
+            labels = f'table="{table}",phase="{phase}"'
+            cumulative = 0
+            for bound, count in zip(buckets + ["+Inf"], counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {total}")
+            lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return lines
+
+    def clear(self):
+        """Reset the histograms."""
+        with self._lock:
+            self._durations.clear()
+            self._nodes.clear()
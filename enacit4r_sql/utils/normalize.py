@@ -0,0 +1,176 @@
+import json
+
+# nodes of the filter tree: ("and", [nodes]), ("or", [nodes]), ("pred", field, condition), ("join", key, node)
+TRUE = ("true",)
+FALSE = ("false",)
+
+# an always false filter, as filters have no boolean literal
+FALSE_FILTER = {"id": {"$in": []}}
+
+
+def normalize_filter(filter: dict, joinModels: dict = {}) -> dict:
+    """Simplify a filter into an equivalent canonical form: nested `$and`/`$or` are flattened, single child
+    `$and`/`$or` are unwrapped, duplicate criteria are removed, equalities on the same field are merged
+    into a list (IN) when combined with `$or` and intersected when combined with `$and`, always false or
+    always true criteria are folded and the criteria are sorted. Two filters that differ only by these
+    aspects have the same canonical form.
+
+    Args:
+        filter (dict): Filter parameters
+        joinModels (dict, optional): Dictionary of join models. Defaults to {}.
+
+    Returns:
+        dict: The canonical filter
+    """
+    return _as_filter(_simplify(_parse(filter or {}, joinModels)))
+
+
+def _parse(filter, joinModels, root=True):
+    children = []
+    for field, value in filter.items():
+        if field == "$and":
+            children.append(("and", [_parse(sub_filter, joinModels, False) for sub_filter in value]))
+        elif field == "$or":
+            children.append(("or", [_parse(sub_filter, joinModels, False) for sub_filter in value]))
+        elif root and field in joinModels:
+            # join models are applied by the query builder at the root of a filter only
+            children.append(("join", field, _parse(value, joinModels)))
+        else:
+            children.append(("pred", field, value))
+    return ("and", children)
+
+
+def _simplify(node):
+    kind = node[0]
+    if kind == "pred":
+        return _simplify_pred(node)
+    if kind == "join":
+        child = _simplify(node[2])
+        return FALSE if child == FALSE else ("join", node[1], child)
+    absorbing, neutral = (FALSE, TRUE) if kind == "and" else (TRUE, FALSE)
+    children = []
+    for child in [_simplify(child) for child in node[1]]:
+        if child[0] == kind:
+            children.extend(child[1])
+        else:
+            children.append(child)
+    if absorbing in children:
+        return absorbing
+    children = _merge_equalities(kind, [child for child in children if child != neutral])
+    if absorbing in children:
+        return absorbing
+    if kind == "or" and _has_exists_tautology(children):
+        return TRUE
+    unique = {}
+    for child in children:
+        unique.setdefault(_key(child), child)
+    children = [unique[key] for key in sorted(unique)]
+    if not len(children):
+        return neutral
+    if len(children) == 1:
+        return children[0]
+    return (kind, children)
+
+
+def _simplify_pred(node):
+    field, condition = node[1], node[2]
+    if isinstance(condition, dict) and len(condition) == 1:
+        op, value = next(iter(condition.items()))
+        if op == "$eq" and _is_scalar(value):
+            condition = value
+        elif op == "$in" and isinstance(value, list):
+            if not len(value):
+                return FALSE
+            if None not in value:
+                # unlike the list value, $in does not match null
+                condition = value
+        elif op == "$nin" and isinstance(value, list) and not len(value):
+            return TRUE
+    if isinstance(condition, list):
+        if not len(condition):
+            return FALSE
+        if len(condition) == 1 and _is_scalar(condition[0]):
+            condition = condition[0]
+    return ("pred", field, condition)
+
+
+def _is_scalar(value):
+    # booleans are left aside, as they would be merged with integers in sets
+    return value is None or (isinstance(value, (str, int, float)) and not isinstance(value, bool))
+
+
+def _equality_values(node):
+    if node[0] != "pred":
+        return None
+    condition = node[2]
+    if _is_scalar(condition):
+        return [condition]
+    if isinstance(condition, list) and all(_is_scalar(value) for value in condition):
+        return condition
+    return None
+
+
+def _make_equality(field, values):
+    values = sorted(set(values), key=lambda value: (value is None, type(value).__name__, value if value is not None else 0))
+    if not len(values):
+        return FALSE
+    return ("pred", field, values[0] if len(values) == 1 else values)
+
+
+def _merge_equalities(kind, children):
+    # or: x = a OR x IN (b, c) -> x IN (a, b, c); and: x IN (a, b) AND x IN (b, c) -> x = b
+    merged = {}
+    result = []
+    for child in children:
+        values = _equality_values(child)
+        if values is None:
+            result.append(child)
+            continue
+        field = child[1]
+        if field not in merged:
+            merged[field] = set(values)
+            result.append(field)
+        elif kind == "or":
+            merged[field] |= set(values)
+        else:
+            merged[field] &= set(values)
+    return [_make_equality(child, merged[child]) if isinstance(child, str) else child for child in result]
+
+
+def _has_exists_tautology(children):
+    exists = {}
+    for child in children:
+        if child[0] == "pred" and isinstance(child[2], dict) and len(child[2]) == 1 and "$exists" in child[2]:
+            exists.setdefault(child[1], set()).add(bool(child[2]["$exists"]))
+    return any(len(values) == 2 for values in exists.values())
+
+
+def _key(node):
+    return json.dumps(_as_dict(node), sort_keys=True, default=str)
+
+
+def _as_dict(node):
+    kind = node[0]
+    if kind == "pred":
+        return {node[1]: node[2]}
+    if kind == "join":
+        return {node[1]: _as_filter(node[2])}
+    return {f"${kind}": [_as_dict(child) for child in node[1]]}
+
+
+def _as_filter(node):
+    if node == TRUE:
+        return {}
+    if node == FALSE:
+        return dict(FALSE_FILTER)
+    children = node[1] if node[0] == "and" else [node]
+    criteria = [_as_dict(child) for child in children if child[0] != "join"]
+    filter = {}
+    if len(criteria) == 1:
+        filter.update(criteria[0])
+    elif len(criteria) > 1:
+        filter["$and"] = criteria
+    for child in children:
+        if child[0] == "join":
+            filter[child[1]] = _as_filter(child[2])
+    return filter
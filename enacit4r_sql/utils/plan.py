@@ -0,0 +1,201 @@
+import json
+import random
+import re
+import time
+from collections import deque
+from enacit4r_sql.models.query import PlanIssue, PlanSummary
+from enacit4r_sql.utils.explain import Explain
+from enacit4r_sql.utils.query import QueryBuilder, ValidationError
+
+PLAN_KINDS = ["query", "count"]
+
+
+def explain(session, query_builder: QueryBuilder, kind: str = "query", fields: list = None, analyze: bool = False, min_rows: int = 10000) -> PlanSummary:
+    """Explain the query of a query builder and summarize its plan, see `analyze_plan`.
+
+    Args:
+        session: The database session
+        query_builder (QueryBuilder): The query builder
+        kind (str, optional): The query to explain, "query" (see `build_query`) or "count" (see `build_count_query`). Defaults to "query".
+        fields (list, optional): List of fields to retrieve. Defaults to None.
+        analyze (bool, optional): Whether the query is executed to report the actual rows (PostgreSQL only). Defaults to False.
+        min_rows (int, optional): Number of rows above which a plan node is reported. Defaults to 10000.
+
+    Returns:
+        PlanSummary: The plan summary
+
+    Raises:
+        ValidationError: If the kind is not supported
+    """
+    query = _build(query_builder, kind, fields)
+    connection = session.connection()
+    result = connection.execute(Explain(query, analyze), query_builder.params)
+    if connection.dialect.name == "postgresql":
+        plan = result.scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+    else:
+        plan = [tuple(row) for row in result.all()]
+    return analyze_plan(plan, query_builder, connection.dialect.name, kind, min_rows)
+
+
+def analyze_plan(plan, query_builder: QueryBuilder, dialect: str, kind: str = "query", min_rows: int = 10000) -> PlanSummary:
+    """Summarize the plan of a query into the issues that make it slow, each linked to the filter criteria
+    (field and operator) on the relation:
+
+    * `seq_scan`: sequential scan of a large relation (or any scan on SQLite, which does not report rows)
+    * `rows_removed`: many rows read then removed by a filter, which an index would avoid
+    * `sort_spill`: sort spilled to disk (PostgreSQL), or sort in a temporary B-tree (SQLite)
+    * `nested_loop`: inner side of a nested loop executed many times, typically the join of a join model
+
+    Args:
+        plan: The plan, JSON plan on PostgreSQL, rows of `EXPLAIN QUERY PLAN` on SQLite
+        query_builder (QueryBuilder): The query builder of the explained query
+        dialect (str): The database dialect name
+        kind (str, optional): The explained query, "query" or "count". Defaults to "query".
+        min_rows (int, optional): Number of rows above which a plan node is reported. Defaults to 10000.
+
+    Returns:
+        PlanSummary: The plan summary
+    """
+    criteria = _get_criteria(query_builder, query_builder.model, query_builder.filter)
+    issues = []
+    if dialect == "postgresql":
+        _walk_postgresql(plan[0]["Plan"], criteria, min_rows, issues)
+    else:
+        _walk_sqlite(plan, criteria, issues)
+    return PlanSummary(dialect=dialect, kind=kind, filter=query_builder.filter, issues=issues, plan=plan)
+
+
+class PlanSampler:
+    """Executes the queries of query builders and explains the ones slower than a threshold, to collect the summaries
+    of the slow query plans with their originating filters.
+    """
+
+    def __init__(self, threshold: float, sample_rate: float = 1.0, analyze: bool = False, maxlen: int = 100, callback=None):
+        """Initialize the sampler.
+
+        Args:
+            threshold (float): The duration above which a query is explained, in seconds
+            sample_rate (float, optional): The proportion of the slow queries that are explained. Defaults to 1.0.
+            analyze (bool, optional): Whether the slow queries are executed again to report the actual rows (PostgreSQL only). Defaults to False.
+            maxlen (int, optional): The number of latest summaries to keep in `samples`. Defaults to 100.
+            callback (callable, optional): Function called with each PlanSummary, e.g. to log it. Defaults to None.
+        """
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.analyze = analyze
+        self.callback = callback
+        self.samples = deque(maxlen=maxlen)
+
+    def execute(self, session, query_builder: QueryBuilder, kind: str = "query", fields: list = None):
+        """Execute the query of a query builder, and explain it if it is slow.
+
+        Args:
+            session: The database session
+            query_builder (QueryBuilder): The query builder
+            kind (str, optional): The query to execute, "query" or "count". Defaults to "query".
+            fields (list, optional): List of fields to retrieve. Defaults to None.
+
+        Returns:
+            The count, or the items (model instances, or rows of the fields values)
+        """
+        query = _build(query_builder, kind, fields)
+        start = time.perf_counter()
+        result = session.execute(query, query_builder.params)
+        if kind == "count":
+            result = result.scalar_one()
+        else:
+            result = result.all() if fields else result.scalars().all()
+        duration = time.perf_counter() - start
+        if duration >= self.threshold and random.random() < self.sample_rate:
+            summary = explain(session, query_builder, kind, fields, self.analyze)
+            summary.duration = duration
+            self.samples.append(summary)
+            if self.callback is not None:
+                self.callback(summary)
+        return result
+
+
+def _build(query_builder, kind, fields):
+    if kind not in PLAN_KINDS:
+        raise ValidationError(f"Invalid query kind: {kind}")
+    if kind == "count":
+        return query_builder.build_count_query()
+    start, end, query = query_builder.build_query(None, fields)
+    return query
+
+
+def _get_criteria(query_builder, model, filter):
+    # (table, field, operator) of the filter criteria
+    criteria = []
+    for field, value in filter.items():
+        if field == "$and" or field == "$or":
+            for sub_filter in value:
+                criteria.extend(_get_criteria(query_builder, model, sub_filter))
+        elif field in query_builder.joinModels:
+            criteria.extend(_get_criteria(query_builder, query_builder.joinModels[field], value))
+        else:
+            operators = list(value.keys()) if isinstance(value, dict) else ["$in"] if isinstance(value, list) else ["$eq"]
+            criteria.extend((model.__table__.name, field, operator) for operator in operators)
+    return criteria
+
+
+def _link(criteria, relation, condition=None):
+    # the criteria on the relation, restricted to the fields of the plan node condition if any
+    linked = [(field, operator) for table, field, operator in criteria if table == relation]
+    if condition:
+        mentioned = [(field, operator) for field, operator in linked if re.search(rf"\b{re.escape(field)}\b", condition)]
+        linked = mentioned or linked
+    return list(dict.fromkeys(f"{field} {operator}" for field, operator in linked))
+
+
+def _find_relation(node):
+    if "Relation Name" in node:
+        return node["Relation Name"]
+    for child in node.get("Plans", []):
+        relation = _find_relation(child)
+        if relation is not None:
+            return relation
+    return None
+
+
+def _walk_postgresql(node, criteria, min_rows, issues):
+    node_type = node.get("Node Type")
+    relation = node.get("Relation Name")
+    loops = node.get("Actual Loops", 1)
+    rows = node.get("Actual Rows", node.get("Plan Rows", 0)) * loops
+    removed = node.get("Rows Removed by Filter", 0) * loops
+    condition = node.get("Filter")
+    if node_type == "Seq Scan" and rows + removed >= min_rows:
+        issues.append(PlanIssue(kind="seq_scan", relation=relation, rows=int(rows + removed), criteria=_link(criteria, relation, condition),
+                                message=f"sequential scan of {int(rows + removed)} rows of {relation}"))
+    if removed >= min_rows:
+        issues.append(PlanIssue(kind="rows_removed", relation=relation, rows=int(removed), criteria=_link(criteria, relation, condition),
+                                message=f"{int(removed)} rows of {relation} removed by the filter {condition}"))
+    if node_type in ["Sort", "Incremental Sort"] and (node.get("Sort Space Type") == "Disk" or "external" in node.get("Sort Method", "")):
+        relation = _find_relation(node)
+        issues.append(PlanIssue(kind="sort_spill", relation=relation, rows=int(rows), criteria=[],
+                                message=f"sort spilled to disk ({node.get('Sort Space Used')} kB), sort key {', '.join(node.get('Sort Key', []))}"))
+    if node_type == "Nested Loop" and len(node.get("Plans", [])) == 2:
+        outer, inner = node["Plans"]
+        executions = inner.get("Actual Loops", outer.get("Plan Rows", 0))
+        if executions >= min_rows:
+            relation = _find_relation(inner)
+            issues.append(PlanIssue(kind="nested_loop", relation=relation, rows=int(executions), criteria=_link(criteria, relation),
+                                    message=f"inner side on {relation} executed {int(executions)} times"))
+    for child in node.get("Plans", []):
+        _walk_postgresql(child, criteria, min_rows, issues)
+
+
+def _walk_sqlite(rows, criteria, issues):
+    for row in rows:
+        detail = row[-1]
+        match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+        if match and "USING" not in detail:
+            relation = match.group(1)
+            issues.append(PlanIssue(kind="seq_scan", relation=relation, rows=None, criteria=_link(criteria, relation),
+                                    message=f"full scan of {relation}"))
+        if detail.startswith("USE TEMP B-TREE FOR ORDER BY"):
+            issues.append(PlanIssue(kind="sort_spill", relation=None, rows=None, criteria=[],
+                                    message="sort in a temporary B-tree, no index provides the order"))
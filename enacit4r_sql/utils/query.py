@@ -1,8 +1,29 @@
 from sqlmodel import SQLModel, select
-from sqlalchemy import func, or_, and_, cast, String, false, true
+from sqlalchemy import func, or_, and_, cast, String, false, true, bindparam, tuple_, inspect, literal, literal_column, any_, all_, union_all, JSON
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.orm import load_only, defer, selectinload
+from sqlalchemy.sql.util import join_condition, ClauseAdapter
+from sqlalchemy.sql.elements import BindParameter
 import json
+import base64
+import time
+from datetime import date, datetime
+from functools import cache
 from importlib import resources
-from jsonschema import validate
+from jsonschema.validators import validator_for
+from enacit4r_sql.utils.cache import StatementCache
+from enacit4r_sql.utils.inlist import InListPolicy
+from enacit4r_sql.models.query import ListResult
+from enacit4r_sql.utils.normalize import normalize_filter
+from enacit4r_sql.utils.search import TextSearch, escape_like, LIKE_ESCAPE
+from enacit4r_sql.utils.budget import FilterBudget
+from enacit4r_sql.utils import instrument
+from enacit4r_sql.utils.instrument import instrumented
+
+try:
+    import fastjsonschema
+except ImportError:  # pragma: no cover - optional dependency
+    fastjsonschema = None
 
 class ValidationError(Exception):
     """Exception raised for errors in the input parameters."""
@@ -32,7 +53,92 @@ def paramAsArray(param: str):
     return json.loads(param) if param else []
 
 
-def validate_params(filter: dict | str, sort: list | str, range: list | str, fields: list | str = []) -> dict:
+def _encode_cursor_value(value):
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cursor value of type {type(value).__name__} is not supported")
+
+
+def _decode_cursor_value(value):
+    if "$datetime" in value:
+        return datetime.fromisoformat(value["$datetime"])
+    if "$date" in value:
+        return date.fromisoformat(value["$date"])
+    return value
+
+
+def encode_cursor(values: list) -> str:
+    """Encode the sort key values of a row into an opaque cursor
+
+    Args:
+        values (list): The sort key values
+
+    Returns:
+        str: The URL-safe cursor
+    """
+    data = json.dumps(values, default=_encode_cursor_value, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list:
+    """Decode an opaque cursor into the sort key values it holds
+
+    Args:
+        cursor (str): The cursor
+
+    Returns:
+        list: The sort key values
+
+    Raises:
+        ValidationError: If the cursor is not valid
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()), object_hook=_decode_cursor_value)
+    except Exception as e:
+        raise ValidationError(f"Invalid cursor: {e}")
+    if not isinstance(values, list):
+        raise ValidationError("Invalid cursor: not a list of values")
+    return values
+
+
+def load_schema() -> dict:
+    """Load the query JSON schema shipped with the package
+
+    Returns:
+        dict: The query JSON schema
+    """
+    package_name = "enacit4r_sql.schemas"
+    resource_name = "query-schema.json"
+    with resources.files(package_name).joinpath(resource_name).open("r") as json_file:
+        return json.load(json_file)
+
+
+@cache
+def get_validator():
+    """Get the query parameters validator, built on first call and reused afterwards.
+
+    When the optional `fastjsonschema` package is installed, the schema is compiled into
+    generated Python code, otherwise the `jsonschema` validator class matching the schema
+    draft is instantiated once. Both are stateless and safe to share across threads.
+
+    Returns:
+        callable: A function that takes the parameters to validate and raises on error
+    """
+    schema = load_schema()
+    if fastjsonschema is not None:
+        return fastjsonschema.compile(schema)
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema).validate
+
+
+# limits of the filters checked by validate_params
+DEFAULT_BUDGET = FilterBudget()
+
+
+def validate_params(filter: dict | str, sort: list | str, range: list | str, fields: list | str = [], budget: FilterBudget = DEFAULT_BUDGET, joinModels: dict = None) -> dict:
     """Validate filter, sort and range parameters against a JSON schema.
     
     Args:
@@ -40,17 +146,31 @@ def validate_params(filter: dict | str, sort: list | str, range: list | str, fie
         sort (list | str): Sort parameters
         range (list | str): Range parameters
         fields (list | str): Fields to retrieve
+        budget (FilterBudget, optional): Limits of the filter size and complexity, checked before the filter is parsed
+            and validated. Defaults to DEFAULT_BUDGET, None for no limits.
+        joinModels (dict, optional): Dictionary of join models, which keys are counted as joins by the budget. Defaults to None,
+            any `$` prefixed key being counted as a join.
     
     Returns:
-        dict: The validated parameters as a dictionary
+        dict: The validated parameters as a dictionary, with the filter size and complexity (see `FilterBudget.check`,
+        e.g. its cost estimate to be logged) in `budget`, None if there is no budget
     
     Raises:
-        ValidationError: If the parameters are not valid
+        ValidationError: If the parameters are not valid, or the filter exceeds the budget
     """
-    package_name = "enacit4r_sql.schemas"
-    resource_name = "query-schema.json"
-    with resources.open_text(package_name, resource_name) as json_file:
-        schema = json.load(json_file)
+    if instrument._listeners:
+        start = time.perf_counter()
+        validated = _validate_params(filter, sort, range, fields, budget, joinModels)
+        stats = instrument.filter_stats(validated["filter"], joinModels or {})
+        if validated["budget"] is not None:
+            stats["cost"] = validated["budget"]["cost"]
+        instrument.emit("validate", None, start, time.perf_counter() - start, stats)
+        return validated
+    return _validate_params(filter, sort, range, fields, budget, joinModels)
+
+
+def _validate_params(filter, sort, range, fields, budget, joinModels):
+    budget_stats = budget.check(filter, joinModels) if budget is not None else None
     to_validate = {
         "filter": filter if isinstance(filter, dict) else paramAsDict(filter),
         "sort": sort if isinstance(sort, list) else paramAsArray(sort),
@@ -58,17 +178,28 @@ def validate_params(filter: dict | str, sort: list | str, range: list | str, fie
         "fields": fields if isinstance(fields, list) else paramAsArray(fields),
     }
     try:
-        validate(instance=to_validate, schema=schema)
+        get_validator()(to_validate)
     except Exception as e:
         raise ValidationError(f"Invalid query parameters: {e}")
-    return to_validate
+    return {**to_validate, "budget": budget_stats}
+
+
+JOIN_MODES = ["join", "exists"]
+
+ANCHORED_OPERATORS = ["$startswith", "$istartswith", "$endswith"]
+
+LOAD_OPTIONS = {"load_only": load_only, "defer": defer, "selectinload": selectinload}
 
 
 class QueryBuilder:
     """Helper class to generate SQL queries based on filter, sort and range parameters, based on a provided model. Limited support for join queries.
     """
 
-    def __init__(self, model: SQLModel, filter: dict, sort: list, range: list, joinModels: dict = {}, validate: bool = False):
+    # PostgreSQL text search configuration of the $search operator
+    searchConfig = "simple"
+
+    @instrumented("construct")
+    def __init__(self, model: SQLModel, filter: dict, sort: list, range: list, joinModels: dict = {}, validate: bool = False, cache: StatementCache = None, joinMode: str = None, normalize: bool = False, inListPolicy: InListPolicy = None, loadOptions: dict = None):
         """Initialize the QueryBuilder object with the provided parameters.
         
         Args:
@@ -78,25 +209,76 @@ class QueryBuilder:
             range (list): Range parameters
             joinModels (dict, optional): Dictionary of join models. Defaults to {}.
             validate (bool, optional): Whether to validate the parameters. Defaults to False.
+            cache (StatementCache, optional): Cache of statements keyed by the filter shape, to be shared across builders. Defaults to None.
+            joinMode (str, optional): How filters on join models are applied: "join" for an inner join (on the relationship or the foreign key), the rows being selected by the matching ids,
+                "exists" for a correlated EXISTS sub-query that does not multiply rows. Defaults to None, the join is then to be added by the caller.
+            normalize (bool, optional): Whether to simplify the filter into its canonical form, see `normalize_filter`. Defaults to False.
+            inListPolicy (InListPolicy, optional): Size-aware strategy to filter on lists of values, the strategy applied to each field
+                is reported in `inListStrategies`. Defaults to None (IN clause with one parameter per value).
+            loadOptions (dict, optional): Loader options of the queried entities (when no fields are specified), by loader: `load_only` and `defer`
+                of fields, `selectinload` of relationships, e.g. `{"defer": ["institutions"], "selectinload": ["authors"]}`. Defaults to None.
+
+        Raises:
+            ValidationError: If the parameters, the join mode or the load options are not valid
         """
         if validate:
-            validate_params(filter, sort, range)
+            validate_params(filter, sort, range, joinModels=joinModels)
+        if joinMode is not None and joinMode not in JOIN_MODES:
+            raise ValidationError(f"Invalid join mode: {joinMode}")
         self.model = model
-        self.filter = filter
+        self.filter = normalize_filter(filter, joinModels) if normalize else filter
         self.sort = sort
         self.range = range
         self.joinModels = joinModels
+        self.joinMode = joinMode
+        self.cache = cache
+        self.params = {}
+        self.inListPolicy = inListPolicy
+        self.inListStrategies = {}
+        self._inParams = {}
+        self.loadOptions = loadOptions or {}
+        self._loadOptions = self._make_load_options(loadOptions)
 
-    def build_count_query(self):
-        """Count the number of rows that match the filter.
+    @instrumented("build_count_query")
+    def build_count_query(self, cap: int = None):
+        """Count the number of rows that match the filter. When a cache is used, the statement
+        is shared and its parameter values are set in `params`, to be passed at execution time.
+
+        Args:
+            cap (int, optional): Stop counting after cap + 1 rows, a count above cap meaning "more than cap". Defaults to None (exact count).
 
         Returns:
             int: The total count of rows that match the filter.
         """
-        return self._apply_filter(select(func.count(func.distinct(self.model.id))))
+        def build(filter):
+            if cap is None:
+                # rows are not multiplied by EXISTS sub-queries
+                count = func.count(self.model.id) if self.joinMode == "exists" else func.count(func.distinct(self.model.id))
+                return self._apply_model_filter(select(count), self.model, filter)
+            ids = self._apply_model_filter(select(self.model.id).distinct(), self.model, filter).limit(cap + 1).subquery()
+            return select(func.count()).select_from(ids)
+
+        if self.cache is not None:
+            return self._build_cached(("count", cap), build)
+        return build(self.filter)
 
+    @instrumented("build_ids_query")
+    def build_ids_query(self):
+        """Build a query that retrieves the distinct ids of the rows that match the filter.
+
+        Returns:
+            The query object.
+        """
+        if self.cache is not None:
+            return self._build_cached(("ids",),
+                lambda filter: self._apply_model_filter(select(self.model.id).distinct(), self.model, filter))
+        return self._apply_filter(select(self.model.id).distinct())
+
+    @instrumented("build_query")
     def build_query(self, total_count, fields=None):
         """Build a query that retrieves rows that match the filter, sorted and ranged as specified.
+        When a cache is used, the statement is shared and its parameter values are set in `params`,
+        to be passed at execution time.
         
         Args:
             total_count (int): Total number of rows that match the filter.
@@ -105,17 +287,388 @@ class QueryBuilder:
         Returns:
             tuple: A tuple containing the start index, end index and the query object.
         """
-        _query = select(self.model)
-        if fields and len(fields):
-            columns = [getattr(self.model, field) for field in fields]
-            _query = select(*columns)
-        query_ = self._apply_filter(_query)
-        query_ = self._apply_sort(query_)
+        if self.cache is not None:
+            query_ = self._build_cached(("query", tuple(self._parse_sort()), tuple(fields or [])),
+                lambda filter: self._apply_sort(self._apply_join_filter(self._select(fields), filter)))
+        else:
+            query_ = self._apply_join_filter(self._select(fields), self.filter)
+            query_ = self._apply_sort(query_)
         return self._apply_range(query_, total_count)
 
+    @instrumented("build_page_query")
+    def build_page_query(self, fields=None):
+        """Build a query that retrieves the rows that match the filter, sorted and ranged as specified, each row
+        holding the total count of matching rows in an extra `total_count` column (`count(*) OVER ()`), so that
+        a page and the total are obtained in a single round trip, see `make_list_result`. When the filter applies
+        to joined models, matching ids are first selected as distinct in a CTE.
+
+        Args:
+            fields (list, optional): List of fields to retrieve. Defaults to None.
+
+        Returns:
+            tuple: A tuple containing the start index, end index and the query object.
+
+        Raises:
+            ValidationError: If the filter applies to join models without a join mode
+        """
+        self._check_join_mode()
+        joined = self.joinMode != "exists" and self._has_join()
+
+        def build(filter):
+            total = func.count().over().label("total_count")
+            if joined:
+                ids = self._apply_model_filter(select(self.model.id).distinct(), self.model, filter).cte("filtered_ids")
+                query_ = self._select(fields, total, filtered=False).where(self.model.id.in_(select(ids.c.id)))
+            else:
+                query_ = self._apply_model_filter(self._select(fields, total), self.model, filter)
+            return self._apply_sort(query_)
+
+        if self.cache is not None:
+            query_ = self._build_cached(("page", tuple(self._parse_sort()), tuple(fields or []), joined), build)
+        else:
+            query_ = build(self.filter)
+        return self._apply_range(query_, None)
+
+    def make_list_result(self, rows: list, total_count: int = None):
+        """Split the rows retrieved with the page query into the list result and the items.
+
+        Args:
+            rows (list): The rows retrieved with the query built by `build_page_query`
+            total_count (int, optional): The total count, required only when the page is empty and does not start at 0 (the total cannot be read from the rows). Defaults to None.
+
+        Returns:
+            tuple: A tuple containing the ListResult and the items (model instances, or tuples of the fields values).
+
+        Raises:
+            ValueError: If the total count cannot be determined
+        """
+        start, end = self.range if len(self.range) == 2 and self.range[1] >= 0 else (0, None)
+        if len(rows):
+            total_count = rows[0][-1]
+        elif start == 0:
+            total_count = 0
+        elif total_count is None:
+            raise ValueError("Total count is unknown when the page is out of range, use the count query")
+        if end is None:
+            end = total_count
+        items = [row[0] if len(row) == 2 and isinstance(row[0], self.model) else tuple(row[:-1]) for row in rows]
+        return ListResult(total=total_count, skip=start, limit=end), items
+
+    @instrumented("build_facets_query")
+    def build_facets_query(self, facets: list, exclude_own: bool = False):
+        """Build a query that counts the rows that match the filter per value of each facet field, in a single statement:
+        the distinct ids of the matching rows are selected in a CTE, then grouped by each facet field in a `UNION ALL`.
+        The elements of JSON and ARRAY fields (e.g. filtered with `$contains`) are counted one by one (PostgreSQL only).
+        The rows are (facet, value, count) tuples, with values cast to strings, see `make_facets`.
+
+        Args:
+            facets (list): The fields to count by
+            exclude_own (bool, optional): Whether the criteria on a facet field are ignored when counting by that field
+                (top-level and `$and` criteria only), so that the other values of the facet remain selectable. Defaults to False.
+
+        Returns:
+            The query object.
+
+        Raises:
+            ValidationError: If a facet is not a field of the model, or if the filter applies to join models without a join mode
+        """
+        self._check_join_mode()
+        ctes = {}
+        branches = []
+        for facet in facets:
+            column = self._get_facet_column(facet)
+            filter = self._exclude_field(self.filter, facet) if exclude_own else self.filter
+            key = json.dumps(filter, sort_keys=True, default=str)
+            if key not in ctes:
+                ctes[key] = self._apply_model_filter(select(self.model.id).distinct(), self.model, filter).cte(f"facet_ids_{len(ctes)}")
+            if isinstance(column.type, (JSON, ARRAY)):
+                name = "unnest" if isinstance(column.type, ARRAY) else "jsonb_array_elements_text" if isinstance(column.type, JSONB) else "json_array_elements_text"
+                value = cast(getattr(func, name)(column).column_valued(f"{facet}_value"), String)
+            else:
+                value = cast(column, String)
+            branches.append(select(literal(facet).label("facet"), value.label("value"), func.count(func.distinct(self.model.id)).label("count"))
+                            .where(self.model.id.in_(select(ctes[key].c.id))).group_by(value))
+        return union_all(*branches)
+
+    def make_facets(self, rows: list) -> dict:
+        """Get the counts per value of each facet from the rows retrieved with the facets query.
+
+        Args:
+            rows (list): The rows retrieved with the query built by `build_facets_query`
+
+        Returns:
+            dict: The counts by value (converted back to numbers for numeric fields), by facet, the most frequent values first
+        """
+        facets = {}
+        for facet, value, count in sorted(rows, key=lambda row: -row[2]):
+            python_type = self._get_python_type(getattr(self.model, facet))
+            if value is not None and python_type in (int, float):
+                value = python_type(value)
+            facets.setdefault(facet, {})[value] = count
+        return facets
+
+    @instrumented("build_keyset_query")
+    def build_keyset_query(self, cursor: str = None, fields=None):
+        """Build a query that retrieves the page of rows following the cursor position (keyset pagination).
+        Instead of an offset, rows are sought with a predicate on the sort field and the id, used as a tie-breaker,
+        so that the cost of a page does not depend on its depth. The range only defines the page size. One extra row
+        is requested to tell whether there is a next page, see `keyset_page`.
+
+        Args:
+            cursor (str, optional): The cursor of the previous page. Defaults to None, for the first page.
+            fields (list, optional): List of fields to retrieve, the sort field and the id are added if missing. Defaults to None.
+
+        Returns:
+            The query object.
+
+        Raises:
+            ValidationError: If the sort is not supported (nullable field, nulls ordering, mixed directions), or the cursor is not valid
+        """
+        keys, desc = self._get_keyset()
+        positions = decode_cursor(cursor) if cursor else None
+        if positions is not None and len(positions) != len(keys):
+            raise ValidationError("Invalid cursor: sort key mismatch")
+        if fields and len(fields):
+            fields = list(fields) + [key.key for key in keys if key.key not in fields]
+
+        def build(filter, values):
+            query_ = self._apply_join_filter(self._select(fields), filter)
+            if values is not None:
+                query_ = query_.where(tuple_(*keys) < tuple_(*values) if desc else tuple_(*keys) > tuple_(*values))
+            return query_.order_by(*[key.desc() if desc else key for key in keys])
+
+        if self.cache is not None:
+            params = None if positions is None else [bindparam(f"k_{i}", type_=key.type) for i, key in enumerate(keys)]
+            query_ = self._build_cached(("keyset", tuple(self._parse_sort()), tuple(fields or []), positions is not None),
+                lambda filter: build(filter, params))
+            if positions is not None:
+                self.params.update({f"k_{i}": value for i, value in enumerate(positions)})
+        else:
+            query_ = build(self.filter, positions)
+        # the page size is not part of the cached statement
+        limit = self._get_page_size()
+        return query_ if limit is None else query_.limit(limit + 1)
+
+    def keyset_page(self, rows: list):
+        """Split the rows retrieved with the keyset query into the page and the cursor of the next page.
+
+        Args:
+            rows (list): The rows retrieved with the query built by `build_keyset_query`
+
+        Returns:
+            tuple: A tuple containing the page rows and the next page cursor, None if this is the last page.
+        """
+        limit = self._get_page_size()
+        if limit is None or len(rows) <= limit:
+            return rows, None
+        page = rows[:limit]
+        keys, _ = self._get_keyset()
+        return page, encode_cursor([getattr(page[-1], key.key) for key in keys])
+
+    def add_in_param(self, name: str, strategy: str = "expanding"):
+        """Declare a bind parameter that holds a list of values, to be used as the value of a `$in`/`$nin` operator
+        of the filter, e.g. a placeholder of a filter template.
+
+        Args:
+            name (str): The name of the bind parameter
+            strategy (str, optional): How the list is bound: "expanding", one parameter per value, or "array", a single
+                array parameter (PostgreSQL). Defaults to "expanding".
+
+        Raises:
+            ValidationError: If the strategy is not supported
+        """
+        if strategy not in ["expanding", "array"]:
+            raise ValidationError(f"Invalid list parameter strategy: {strategy}")
+        self._inParams[name] = strategy
+
+    def _get_keyset(self):
+        sort = self._parse_sort()
+        if any(nulls is not None or "." in field for field, _, nulls in sort) or len(set(desc for _, desc, _ in sort)) > 1:
+            raise ValidationError("Keyset pagination requires sort fields of the model, in the same direction and without nulls ordering")
+        keys = [getattr(self.model, field) for field, _, _ in sort]
+        # a NULL value of the cursor would never compare as lower or greater, and the pages would stop early
+        nullable = [key.key for key in keys if key.nullable]
+        if len(nullable):
+            raise ValidationError(f"Keyset pagination requires sort fields that are not nullable: {', '.join(nullable)}")
+        if "id" not in [field for field, _, _ in sort]:
+            keys.append(self.model.id)
+        return keys, len(sort) > 0 and sort[0][1]
+
+    def _get_page_size(self):
+        if len(self.range) == 2 and self.range[1] >= 0:
+            return self.range[1] - self.range[0] + 1
+        return None
+
+    def _select(self, fields, *extra_columns, filtered=True):
+        # filtered: whether the filter is applied to the select, hence the joins of the filter
+        if fields and len(fields):
+            # the caller joins the join models of the filter when there is no join mode
+            joined = [self.joinModels[key] for key in self.filter if key in self.joinModels] if filtered and self.joinMode is None else []
+            columns = []
+            joins = []
+            for field in fields:
+                model, column = self._resolve_field(field)
+                if model is self.model:
+                    columns.append(column)
+                else:
+                    if not self._is_many_to_one(field.split(".", 1)[0], model):
+                        # one-to-many related rows would multiply the rows
+                        raise ValidationError(f"Invalid field: {field}, only fields of many-to-one related models can be retrieved")
+                    columns.append(column.label(field))
+                    if model not in joined and model not in joins:
+                        joins.append(model)
+            query_ = select(*columns, *extra_columns)
+            if len(joins):
+                # related fields are null when there is no related row
+                query_ = query_.select_from(self.model)
+                for model in joins:
+                    query_ = query_.outerjoin(model, self._get_join_condition(self.model, model))
+            return query_
+        query_ = select(self.model, *extra_columns)
+        return query_.options(*self._loadOptions) if len(self._loadOptions) else query_
+
+    def _resolve_field(self, field):
+        # "field", "$joinModel.field" or "relationship.field"
+        if "." not in field:
+            return self.model, getattr(self.model, field)
+        key, name = field.split(".", 1)
+        relationships = inspect(self.model).relationships
+        if key in self.joinModels:
+            model = self.joinModels[key]
+        elif key in relationships:
+            model = relationships[key].mapper.class_
+        else:
+            raise ValidationError(f"Invalid field: {field}")
+        if name not in model.__table__.columns:
+            raise ValidationError(f"Invalid field: {field}")
+        return model, getattr(model, name)
+
+    def _is_many_to_one(self, key, model):
+        # relationship by name, or to the join model, otherwise the foreign key of the model to the join model
+        relationships = inspect(self.model).relationships
+        if key in relationships:
+            return not relationships[key].uselist
+        for relationship in relationships:
+            if relationship.mapper.class_ is model:
+                return not relationship.uselist
+        return any(foreign_key.references(model.__table__) for foreign_key in self.model.__table__.foreign_keys)
+
+    def _make_load_options(self, loadOptions):
+        options = []
+        relationships = inspect(self.model).relationships
+        for loader, names in (loadOptions or {}).items():
+            if loader not in LOAD_OPTIONS:
+                raise ValidationError(f"Invalid load option: {loader}")
+            for name in names:
+                if name not in (relationships if loader == "selectinload" else self.model.__table__.columns):
+                    raise ValidationError(f"Invalid {loader} field: {name}")
+            attributes = [getattr(self.model, name) for name in names]
+            if loader == "load_only":
+                options.append(load_only(*attributes))
+            else:
+                options.extend(LOAD_OPTIONS[loader](attribute) for attribute in attributes)
+        return options
+
     def _apply_filter(self, query_):
         return self._apply_model_filter(query_, self.model, self.filter)
 
+    def _build_cached(self, kind, build):
+        # the shape key is computed while the values are collected; the filter is turned into
+        # a template with bind parameters, and the statement built, only on a cache miss.
+        # The statement is returned unbound, values are to be passed at execution time.
+        values = {}
+        shape = self._parameterize_filter(self.filter, values)
+        key = kind + (self.model, tuple(self.joinModels.items()), self.joinMode, shape,
+                      tuple((loader, tuple(names)) for loader, names in sorted(self.loadOptions.items())))
+        statement = self.cache.get(key)
+        if statement is None:
+            statement = build(self._parameterize_filter(self.filter, {}, template=True))
+            self.cache.put(key, statement)
+        self.params = values
+        return statement
+
+    def _parameterize_filter(self, filter, values, template=False, model=None):
+        """Walk the filter to collect the literal values as named parameters, and the strategies of the lists of values
+        (see `inListStrategies`), as the statement is not built when it is found in the cache.
+
+        Args:
+            filter (dict): Filter parameters
+            values (dict): Collected parameter values, by name
+            template (bool, optional): Whether to return the filter with values replaced by bind parameters instead of its shape. Defaults to False.
+            model (SQLModel, optional): The model of the filter fields. Defaults to None, the queried model.
+
+        Returns:
+            tuple | dict: The hashable shape of the filter, or the filter template
+        """
+        result = {} if template else []
+        for field, value in filter.items():
+            if field == "$and" or field == "$or":
+                item = [self._parameterize_filter(sub_filter, values, template, model) for sub_filter in value]
+                item = item if template else tuple(item)
+            elif field in self.joinModels:
+                item = self._parameterize_filter(value, values, template, self.joinModels[field])
+            else:
+                item = self._parameterize_value(value, values, template, f"{(model or self.model).__name__}.{field}")
+            if template:
+                result[field] = item
+            else:
+                result.append((field, item))
+        return result if template else tuple(result)
+
+    def _parameterize_value(self, value, values, template, name):
+        if value is None:
+            return None
+        if isinstance(value, list):
+            if len(value) == 1 and value[0] is None:
+                return value if template else ("[None]",)
+            if None in value:
+                param = self._make_in_param(values, [v for v in value if v is not None], template, "[None,*]", name)
+                return [None, param] if template else param
+            return self._make_in_param(values, value, template, "[*]", name)
+        if isinstance(value, dict):
+            result = {} if template else []
+            for op, op_value in value.items():
+                if op == "$exists" or op_value is None:
+                    item = op_value if template else (op, op_value)
+                elif op == "$like" or op == "$ilike":
+                    item = self._make_param(values, self._like_pattern(op_value), template, op)
+                elif op in ANCHORED_OPERATORS:
+                    item = self._make_param(values, self._anchored_pattern(op, op_value), template, op)
+                elif op == "$in" or op == "$nin":
+                    item = self._make_in_param(values, op_value, template, op, name)
+                else:
+                    item = self._make_param(values, op_value, template, op)
+                if template:
+                    result[op] = item
+                else:
+                    result.append(item)
+            return result if template else tuple(result)
+        return self._make_param(values, value, template, "=")
+
+    def _make_param(self, values, value, template, token, expanding=False):
+        name = f"p_{len(values)}"
+        values[name] = value
+        return bindparam(name, expanding=expanding) if template else token
+
+    def _make_in_param(self, values, value, template, token, name):
+        # the strategy depends on the list size, hence is part of the shape
+        strategy = self._get_in_strategy(value)
+        self.inListStrategies[name] = strategy
+        if strategy == "chunked":
+            params = [self._make_param(values, chunk, template, token, True) for chunk in self.inListPolicy.chunks(value)]
+            return tuple(params) if template else (token, strategy, len(params))
+        param = self._make_param(values, value, template, (token, strategy), strategy == "expanding")
+        if template:
+            self.add_in_param(param.key, strategy)
+        return param
+
+    def _like_pattern(self, value):
+        return f"%{value}%"
+
+    def _anchored_pattern(self, op, value):
+        value = escape_like(value)
+        return f"%{value}" if op == "$endswith" else f"{value}%"
+
     def _apply_model_filter(self, query_, model, filter):
         if len(filter):
             for field, value in filter.items():
@@ -129,13 +682,67 @@ class QueryBuilder:
                         query_ = query_.where(clause)
                 elif field in self.joinModels:
                     joinModel = self.joinModels[field]
-                    query_ = self._apply_model_filter(query_, joinModel, value)
+                    if self.joinMode == "exists":
+                        # correlated to the model only, the join model may also be outer joined for its fields
+                        subquery = select(literal_column("1")).select_from(joinModel).where(self._get_join_condition(model, joinModel)).correlate(model)
+                        query_ = query_.where(self._apply_model_filter(subquery, joinModel, value).exists())
+                    else:
+                        if self.joinMode == "join":
+                            query_ = query_.join(joinModel, self._get_join_condition(model, joinModel))
+                        query_ = self._apply_model_filter(query_, joinModel, value)
                 else:
                     clause = self._make_column_filter(model, field, value)
                     if clause is not None:
                         query_ = query_.where(clause)
         return query_
 
+    def _get_facet_column(self, facet):
+        if facet not in self.model.__table__.columns:
+            raise ValidationError(f"Invalid facet: {facet}")
+        return getattr(self.model, facet)
+
+    def _get_python_type(self, column):
+        if isinstance(column.type, (JSON, ARRAY)):
+            return None
+        try:
+            return column.type.python_type
+        except NotImplementedError:
+            return None
+
+    def _exclude_field(self, filter, field):
+        excluded = {}
+        for key, value in filter.items():
+            if key == "$and":
+                value = [sub_filter for sub_filter in [self._exclude_field(sub_filter, field) for sub_filter in value] if len(sub_filter)]
+                if len(value):
+                    excluded[key] = value
+            elif key != field:
+                excluded[key] = value
+        return excluded
+
+    def _get_join_condition(self, model, joinModel):
+        # relationship join condition if any, otherwise derived from the foreign keys
+        for relationship in inspect(model).relationships:
+            if relationship.mapper.class_ is joinModel:
+                return relationship.primaryjoin
+        return join_condition(model.__table__, joinModel.__table__)
+
+    def _has_join(self):
+        return any(field in self.joinModels for field in self.filter)
+
+    def _check_join_mode(self):
+        # the caller cannot add the joins of the filter to a sub-query, which would be a cartesian product
+        if self.joinMode is None and self._has_join():
+            raise ValidationError("A join mode is required to filter on join models")
+
+    def _apply_join_filter(self, query_, filter):
+        # joined rows are multiplied by one-to-many relationships: the matching ids are selected in a sub-query,
+        # rather than distinct rows, which would not allow to order by expressions that are not selected
+        if self.joinMode == "join" and self._has_join():
+            ids = self._apply_model_filter(select(self.model.id), self.model, filter)
+            return query_.where(self.model.id.in_(ids))
+        return self._apply_model_filter(query_, self.model, filter)
+
     def _make_and_filter(self, model, value):
         and_clauses = []
         for sub_filter in value:
@@ -178,21 +785,54 @@ class QueryBuilder:
                 clause = self._make_filter_value(field, column, value[0])
             elif None in value:
                 noNoneValues = [v for v in value if v is not None]
-                clause = (or_(column.is_(None), column.in_(noNoneValues)))
+                if len(noNoneValues) == 1 and self._is_in_param(noNoneValues[0]):
+                    noNoneValues = noNoneValues[0]
+                clause = (or_(column.is_(None), self._make_in_filter(column, noNoneValues)))
             else:
-                clause = (column.in_(value))
+                clause = self._make_in_filter(column, value)
+        elif self._is_in_param(value):
+            clause = self._make_in_filter(column, value)
         else:
             clause = self._make_filter_value(field, column, value)
         return clause
 
+    def _is_in_param(self, value):
+        # list values of a cached template
+        return isinstance(value, tuple) or (isinstance(value, BindParameter) and value.key in self._inParams)
+
+    def _get_in_strategy(self, values):
+        if isinstance(values, tuple):
+            return "chunked"
+        if isinstance(values, BindParameter):
+            return self._inParams[values.key]
+        return "expanding" if self.inListPolicy is None else self.inListPolicy.choose(len(values))
+
+    def _make_in_filter(self, column, values, negate=False):
+        strategy = self._get_in_strategy(values)
+        self.inListStrategies[str(column)] = strategy
+        if strategy == "chunked":
+            chunks = values if isinstance(values, tuple) else self.inListPolicy.chunks(values)
+            if negate:
+                return and_(*[column.notin_(chunk) for chunk in chunks])
+            return or_(*[column.in_(chunk) for chunk in chunks])
+        if strategy == "expanding":
+            return column.notin_(values) if negate else column.in_(values)
+        # single array parameter
+        key = values.key if isinstance(values, BindParameter) else None
+        param = bindparam(key, None if key else values, type_=ARRAY(column.type))
+        if strategy == "unnest":
+            subquery = select(func.unnest(param))
+            return column.notin_(subquery) if negate else column.in_(subquery)
+        return column != all_(param) if negate else column == any_(param)
+
     def _make_filter_value(self, field, column, value):
         clause = None
-        if field == "id" or isinstance(value, int):
+        if isinstance(value, dict):
+            clause = self._make_filter_object(field, column, value)
+        elif field == "id" or isinstance(value, int):
             clause = (column == value)
         elif value is None:
             clause = (column.is_(None))
-        elif isinstance(value, dict):
-            clause = self._make_filter_object(field, column, value)
         else:
             clause = column == value
         return clause
@@ -220,9 +860,9 @@ class QueryBuilder:
             clause = column < value['$lt']
 
         if '$in' in value:
-            clause = column.in_(value['$in'])
+            clause = self._make_in_filter(column, value['$in'])
         if '$nin' in value:
-            clause = column.notin_(value['$nin'])
+            clause = self._make_in_filter(column, value['$nin'], negate=True)
 
         if '$eq' in value:
             clause = column == value['$eq']
@@ -230,27 +870,86 @@ class QueryBuilder:
             clause = column != value['$ne']
 
         if '$like' in value:
-            clause = column.like(f"%{value['$like']}%")
+            clause = column.like(self._make_like_value(value['$like']))
         if '$ilike' in value:
-            clause = column.ilike(f"%{value['$ilike']}%")
+            clause = column.ilike(self._make_like_value(value['$ilike']))
         if '$contains' in value:
             clause = column.contains(value['$contains'])
 
+        if '$startswith' in value:
+            clause = column.like(self._make_anchored_value('$startswith', value['$startswith']), escape=LIKE_ESCAPE)
+        if '$istartswith' in value:
+            # lower() rather than ILIKE, which cannot use the lower(column) text_pattern_ops index
+            pattern = self._make_anchored_value('$istartswith', value['$istartswith'])
+            if not isinstance(pattern, BindParameter):
+                pattern = bindparam(column.key, pattern, type_=column.type, unique=True)
+            clause = func.lower(column).like(func.lower(pattern), escape=LIKE_ESCAPE)
+        if '$endswith' in value:
+            clause = column.like(self._make_anchored_value('$endswith', value['$endswith']), escape=LIKE_ESCAPE)
+        if '$search' in value:
+            clause = TextSearch(column, value['$search'], self.searchConfig)
+
         return clause
 
+    def _make_like_value(self, value):
+        # bind parameters of a cached template already hold the pattern
+        return value if isinstance(value, BindParameter) else self._like_pattern(value)
+
+    def _make_anchored_value(self, op, value):
+        return value if isinstance(value, BindParameter) else self._anchored_pattern(op, value)
+
+    def _parse_sort(self):
+        """Parse the sort parameters: a field and a direction (legacy), or a list of [field, direction, nulls]
+        specifications. Fields of the join models are prefixed by the join key, e.g. "$author.name".
+
+        Returns:
+            list: A list of (field, descending, nulls) tuples
+        """
+        if not len(self.sort):
+            return []
+        specs = [self.sort] if isinstance(self.sort[0], str) else self.sort
+        sort = []
+        for spec in specs:
+            field = spec[0]
+            desc = len(spec) > 1 and spec[1] is not None and spec[1].lower() == "desc"
+            nulls = spec[2].lower() if len(spec) > 2 and spec[2] is not None else None
+            sort.append((field, desc, nulls))
+        return sort
+
+    def _get_sort_column(self, field, desc):
+        if "." in field:
+            joinKey, joinField = field.split(".", 1)
+            if joinKey in self.joinModels:
+                # correlated sub-query, which does not multiply rows: the first value in the sort direction. The join
+                # model is aliased, not to be correlated to the join model of the filter, if any
+                joinModel = self.joinModels[joinKey]
+                alias = joinModel.__table__.alias()
+                condition = ClauseAdapter(alias).traverse(self._get_join_condition(self.model, joinModel))
+                aggregate = func.max(alias.c[joinField]) if desc else func.min(alias.c[joinField])
+                return select(aggregate).where(condition).correlate(self.model).scalar_subquery()
+        return getattr(self.model, field)
+
     def _apply_sort(self, query_):
-        if len(self.sort) == 2:
-            sort_field, sort_order = self.sort
-            attr = getattr(self.model, sort_field)
-            if sort_order and sort_order.lower() == "desc":
-                query_ = query_.order_by(attr.desc())
-            else:
-                query_ = query_.order_by(attr)
-        elif len(self.sort) == 1:
-            sort_field = self.sort[0]
-            attr = getattr(self.model, sort_field)
-            query_ = query_.order_by(attr)
-        return query_
+        clauses = self._get_sort_clauses()
+        return query_.order_by(*clauses) if len(clauses) else query_
+
+    def _get_sort_clauses(self):
+        sort = self._parse_sort()
+        if not len(sort):
+            return []
+        clauses = []
+        for field, desc, nulls in sort:
+            clause = self._get_sort_column(field, desc)
+            clause = clause.desc() if desc else clause.asc() if nulls else clause
+            if nulls == "first":
+                clause = clause.nulls_first()
+            elif nulls == "last":
+                clause = clause.nulls_last()
+            clauses.append(clause)
+        # unique tie-breaker, for a deterministic order of the rows
+        if "id" not in [field for field, _, _ in sort]:
+            clauses.append(self.model.id.desc() if sort[0][1] else self.model.id)
+        return clauses
 
     def _apply_range(self, query_, total_count):
         if len(self.range) == 2 and self.range[1] >= 0:
@@ -0,0 +1,181 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+ROUTING_STRATEGIES = ["round_robin", "least_outstanding"]
+
+
+class _EngineStats:
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0
+        self.total_duration = 0.0
+
+    def as_dict(self, now):
+        pool = getattr(self.engine, "sync_engine", self.engine).pool
+        return {
+            "url": self.engine.url.render_as_string(hide_password=True),
+            "healthy": self.ejected_until <= now,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "mean_duration": self.total_duration / self.requests if self.requests else None,
+            "pool": {name: getattr(pool, name)() for name in ["size", "checkedin", "checkedout", "overflow"] if hasattr(pool, name)},
+        }
+
+
+class ReplicaRouter:
+    """Routes the read queries to replica engines, and the reads that follow a write to the primary engine
+    (read-your-writes). Replicas are balanced round-robin or on the least outstanding queries; a replica that
+    fails several times in a row is ejected for a while. When no replica is available, reads go to the primary.
+    Engines can be sync or async engines.
+    """
+
+    def __init__(self, primary, replicas: list, strategy: str = "round_robin", sticky_seconds: float = 5.0, max_failures: int = 3, eject_seconds: float = 30.0):
+        """Initialize the router.
+
+        Args:
+            primary: The primary engine
+            replicas (list): The replica engines
+            strategy (str, optional): The balancing strategy, "round_robin" or "least_outstanding". Defaults to "round_robin".
+            sticky_seconds (float, optional): Duration after a write during which the reads go to the primary. Defaults to 5.0.
+            max_failures (int, optional): Number of consecutive connection failures (operational and interface errors, timeouts) after which a replica is ejected. Defaults to 3.
+            eject_seconds (float, optional): Duration of the ejection of a replica. Defaults to 30.0.
+
+        Raises:
+            ValueError: If the strategy is not supported
+        """
+        if strategy not in ROUTING_STRATEGIES:
+            raise ValueError(f"Invalid routing strategy: {strategy}")
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.strategy = strategy
+        self.sticky_seconds = sticky_seconds
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self._stats = {id(engine): _EngineStats(engine) for engine in [primary] + self.replicas}
+        # expiry by key, in the order of the expiries (the duration being the same)
+        self._sticky = OrderedDict()
+        self._cycle = itertools.cycle(range(len(self.replicas))) if len(self.replicas) else None
+        self._lock = Lock()
+
+    def choose(self, key=None):
+        """Choose the engine of a read query.
+
+        Args:
+            key (optional): The read-your-writes key (e.g. the user id), see `mark_written`. Defaults to None.
+
+        Returns:
+            The engine
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            if key in self._sticky or None in self._sticky:
+                return self.primary
+            healthy = [engine for engine in self.replicas if self._stats[id(engine)].ejected_until <= now]
+            if not len(healthy):
+                return self.primary
+            if self.strategy == "least_outstanding":
+                return min(healthy, key=lambda engine: self._stats[id(engine)].outstanding)
+            for _ in range(len(self.replicas)):
+                engine = self.replicas[next(self._cycle)]
+                if engine in healthy:
+                    return engine
+
+    @contextmanager
+    def read(self, key=None):
+        """Choose the engine of a read query and record the outstanding queries, durations and failures of the engine.
+
+        Args:
+            key (optional): The read-your-writes key. Defaults to None.
+
+        Yields:
+            The engine
+        """
+        engine = self.choose(key)
+        stats = self._stats[id(engine)]
+        with self._lock:
+            stats.outstanding += 1
+            stats.requests += 1
+        start = time.monotonic()
+        try:
+            yield engine
+        except Exception as e:
+            # errors of the query itself (e.g. an invalid value) do not tell about the health of the engine
+            if _is_connection_failure(e):
+                with self._lock:
+                    stats.failures += 1
+                    stats.consecutive_failures += 1
+                    if engine is not self.primary and stats.consecutive_failures >= self.max_failures:
+                        stats.ejected_until = time.monotonic() + self.eject_seconds
+                        stats.consecutive_failures = 0
+            raise
+        else:
+            with self._lock:
+                stats.consecutive_failures = 0
+        finally:
+            with self._lock:
+                stats.outstanding -= 1
+                stats.total_duration += time.monotonic() - start
+
+    def mark_written(self, key=None):
+        """Route the reads of a key to the primary for `sticky_seconds`, so that they see the writes.
+
+        Args:
+            key (optional): The read-your-writes key, None for all the reads. Defaults to None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._sticky[key] = now + self.sticky_seconds
+            self._sticky.move_to_end(key)
+            self._prune(now)
+
+    def track(self, target):
+        """Mark the writes of the sessions after they are committed, see `mark_written`, with the key
+        found in `session.info["replica_key"]` (None if not set).
+
+        Args:
+            target: A Session class (e.g. `sqlmodel.Session`), a sessionmaker or a session
+        """
+        event.listen(target, "after_flush", self._after_flush)
+        event.listen(target, "after_commit", self._after_commit)
+
+    def stats(self) -> list:
+        """Get the statistics of the engines, the primary first.
+
+        Returns:
+            list: The url, health, outstanding queries, requests, failures, mean duration and pool usage of each engine
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [self._stats[id(engine)].as_dict(now) for engine in [self.primary] + self.replicas]
+
+    def _prune(self, now):
+        # the expired keys are dropped, not to grow with the number of keys
+        while len(self._sticky) and next(iter(self._sticky.values())) <= now:
+            self._sticky.popitem(last=False)
+
+    def _after_flush(self, session, flush_context):
+        session.info["replica_written"] = True
+
+    def _after_commit(self, session):
+        if session.info.pop("replica_written", False):
+            self.mark_written(session.info.get("replica_key"))
+
+
+def _is_connection_failure(e):
+    # asyncio.TimeoutError is not the builtin TimeoutError before Python 3.11
+    if isinstance(e, (OperationalError, InterfaceError, OSError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    return isinstance(e, DBAPIError) and e.connection_invalidated
@@ -0,0 +1,272 @@
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+from sqlalchemy import event
+from enacit4r_sql.models.query import ListResult
+from enacit4r_sql.utils.normalize import normalize_filter
+from enacit4r_sql.utils.query import QueryBuilder
+
+
+class MemoryBackend:
+    """In-process result cache backend: bounded LRU dictionary with expiry.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        """Initialize the backend.
+
+        Args:
+            maxsize (int, optional): Maximum number of entries to keep. Defaults to 1024.
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = Lock()
+
+    def get(self, key: str):
+        """Get the value stored for the key.
+
+        Args:
+            key (str): The key
+
+        Returns:
+            The value, None if not found or expired
+        """
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float = None):
+        """Store a value, evicting the least recently used one if the backend is full.
+
+        Args:
+            key (str): The key
+            value: The value
+            ttl (float, optional): Time to live, in seconds. Defaults to None (no expiry).
+        """
+        with self._lock:
+            self._entries[key] = (None if ttl is None else time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def incr(self, key: str) -> int:
+        """Increment a counter, that never expires nor is evicted.
+
+        Args:
+            key (str): The key
+
+        Returns:
+            int: The new value
+        """
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        """Remove all the entries and counters."""
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class SharedMemoryBackend:
+    """Result cache backend shared by processes, on a proxied mapping and lock, e.g. from
+    `multiprocessing.Manager()`. The expiry is based on the wall clock; when full, the expired entries
+    then the oldest ones, with or without expiry, are evicted (counters are kept).
+    """
+
+    def __init__(self, mapping, lock, maxsize: int = 1024):
+        """Initialize the backend.
+
+        Args:
+            mapping: The shared mapping, e.g. `manager.dict()`
+            lock: The shared lock, e.g. `manager.Lock()`
+            maxsize (int, optional): Maximum number of entries to keep. Defaults to 1024.
+        """
+        self.maxsize = maxsize
+        self._entries = mapping
+        self._lock = lock
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored, expires, value = entry
+        return None if expires is not None and expires < time.time() else value
+
+    def set(self, key: str, value, ttl: float = None):
+        with self._lock:
+            now = time.time()
+            self._entries[key] = (now, None if ttl is None else now + ttl, value)
+            if len(self._entries) > self.maxsize:
+                entries = dict(self._entries)
+                expired = [k for k, (stored, expires, v) in entries.items() if expires is not None and expires < now]
+                # the counters have no storage time
+                oldest = sorted([k for k, (stored, expires, v) in entries.items() if stored is not None and k not in expired],
+                                key=lambda k: entries[k][0])
+                for k in (expired + oldest)[:len(entries) - self.maxsize]:
+                    del self._entries[k]
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            stored, expires, value = self._entries.get(key, (None, None, 0))
+            self._entries[key] = (None, None, value + 1)
+            return value + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResultCache:
+    """Cache of the counts and pages of the list queries, keyed by model, normalized filter, sort, range and fields.
+    Each cached result is tagged with the versions of the queried tables: writes bump the versions of their tables,
+    so that the stale results are no longer found (and are eventually evicted). Versions are bumped by the sessions
+    that are listened to, see `listen`, or explicitly, see `invalidate`.
+    """
+
+    def __init__(self, backend=None, ttl: float = 60):
+        """Initialize the cache.
+
+        Args:
+            backend (optional): The storage, MemoryBackend or SharedMemoryBackend. Defaults to None, a MemoryBackend.
+            ttl (float, optional): Time to live of the cached results, in seconds. Defaults to 60.
+        """
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def listen(self, target):
+        """Bump the versions of the tables written by the sessions: after flush, so that a session reads
+        its own writes, and after commit, so that the results cached by other sessions in the meantime are evicted.
+        Bulk ORM `insert`, `update` and `delete` statements are included.
+
+        Args:
+            target: A Session class (e.g. `sqlmodel.Session`), a sessionmaker or a session
+        """
+        event.listen(target, "after_flush", self._after_flush)
+        event.listen(target, "do_orm_execute", self._do_orm_execute)
+        event.listen(target, "after_commit", self._after_commit)
+        event.listen(target, "after_rollback", self._after_rollback)
+
+    def invalidate(self, *tables: str):
+        """Evict the results of the queries on the tables.
+
+        Args:
+            tables (str): The table names
+        """
+        for table in tables:
+            self.backend.incr(f"version:{table}")
+
+    def count(self, session, query_builder: QueryBuilder) -> int:
+        """Count the rows that match the filter, from the cache if available.
+
+        Args:
+            session: The database session
+            query_builder (QueryBuilder): The query builder
+
+        Returns:
+            int: The total count of rows that match the filter.
+        """
+        key = self._make_key("count", query_builder)
+        total = self._get(key)
+        if total is None:
+            total = session.execute(query_builder.build_count_query(), query_builder.params).scalar_one()
+            self.backend.set(key, total, self.ttl)
+        return total
+
+    def list(self, session, query_builder: QueryBuilder, fields: list = None) -> tuple:
+        """Count the rows that match the filter and retrieve the requested page, from the cache if available.
+
+        Args:
+            session: The database session
+            query_builder (QueryBuilder): The query builder
+            fields (list, optional): List of fields to retrieve. Defaults to None.
+
+        Returns:
+            tuple: A tuple containing the ListResult and the items: model instances (transient copies
+            when cached), or tuples of the fields values.
+        """
+        total_count = self.count(session, query_builder)
+        start, end, query = query_builder.build_query(total_count, fields)
+        key = self._make_key("page", query_builder, fields)
+        values = self._get(key)
+        if values is None:
+            result = session.execute(query, query_builder.params)
+            if fields:
+                items = [tuple(row) for row in result.all()]
+                values = items
+            else:
+                items = result.scalars().all()
+                values = [item.model_dump() for item in items]
+            self.backend.set(key, values, self.ttl)
+        else:
+            items = values if fields else [query_builder.model(**value) for value in values]
+        return ListResult(total=total_count, skip=start, limit=total_count if end is None else end), items
+
+    def stats(self) -> dict:
+        """Get the cache counters.
+
+        Returns:
+            dict: The hits and misses of the cache
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def _make_key(self, kind, query_builder, fields=None):
+        tables = [query_builder.model.__table__.name] + [model.__table__.name for model in query_builder.joinModels.values()]
+        if kind == "page":
+            # the related models of the retrieved fields and of the sort
+            related = [field for field in fields or [] if "." in field]
+            related += [field for field, desc, nulls in query_builder._parse_sort() if "." in field]
+            for field in related:
+                table = query_builder._resolve_field(field)[0].__table__.name
+                if table not in tables:
+                    tables.append(table)
+        versions = [[table, self.backend.get(f"version:{table}") or 0] for table in tables]
+        key = [kind, versions, normalize_filter(query_builder.filter, query_builder.joinModels), query_builder.joinMode]
+        if kind == "page":
+            key += [query_builder.sort, query_builder.range, fields or [],
+                    [[loader, list(names)] for loader, names in sorted(query_builder.loadOptions.items())]]
+        return json.dumps(key, sort_keys=True, default=str)
+
+    def _after_flush(self, session, flush_context):
+        tables = {_get_table(obj) for obj in list(session.new) + list(session.dirty) + list(session.deleted)}
+        tables.discard(None)
+        session.info.setdefault("result_cache_tables", set()).update(tables)
+        self.invalidate(*tables)
+
+    def _do_orm_execute(self, orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            table = orm_execute_state.statement.table.name
+            orm_execute_state.session.info.setdefault("result_cache_tables", set()).add(table)
+            self.invalidate(table)
+
+    def _after_commit(self, session):
+        self.invalidate(*session.info.pop("result_cache_tables", set()))
+
+    def _after_rollback(self, session):
+        session.info.pop("result_cache_tables", None)
+
+
+def _get_table(obj):
+    table = getattr(type(obj), "__table__", None)
+    return table.name if table is not None else None
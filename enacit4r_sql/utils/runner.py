@@ -0,0 +1,129 @@
+import asyncio
+from contextlib import asynccontextmanager
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from enacit4r_sql.models.query import ListResult
+from enacit4r_sql.utils.count import count
+from enacit4r_sql.utils.query import QueryBuilder
+from enacit4r_sql.utils.replicas import ReplicaRouter
+
+
+async def _gather(*coros):
+    # like asyncio.gather, but the other queries are cancelled as soon as one fails or is cancelled
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class AsyncQueryRunner:
+    """Execute the queries of a QueryBuilder on asyncio. When built on an engine, the count and the page
+    queries run concurrently, each on its own pooled connection; when built on a session, they run one after
+    the other on the session connection. When built on a ReplicaRouter (of async engines), each query runs on
+    the engine chosen by the router.
+    """
+
+    def __init__(self, bind: AsyncEngine | AsyncSession | ReplicaRouter, timeout: float = None, key=None):
+        """Initialize the runner.
+
+        Args:
+            bind (AsyncEngine | AsyncSession | ReplicaRouter): The engine, the session, or the replica router, to execute the queries with
+            timeout (float, optional): Maximum duration of each query, in seconds. Defaults to None (no timeout).
+            key (optional): The read-your-writes key of the replica router, see `ReplicaRouter.mark_written`. Defaults to None.
+        """
+        self.bind = bind
+        self.timeout = timeout
+        self.key = key
+
+    async def list(self, query_builder: QueryBuilder, fields: list = None, count_strategy: str = "exact", cap: int = 1000) -> tuple:
+        """Count the rows that match the filter and retrieve the requested page.
+
+        Args:
+            query_builder (QueryBuilder): The query builder
+            fields (list, optional): List of fields to retrieve. Defaults to None.
+            count_strategy (str, optional): The count strategy, see `enacit4r_sql.utils.count.count`. Defaults to "exact".
+            cap (int, optional): The maximum number of rows to count with the capped strategy. Defaults to 1000.
+
+        Returns:
+            tuple: A tuple containing the ListResult and the items (model instances, or rows of the fields values).
+
+        Raises:
+            ValidationError: If the filter applies to join models without a join mode
+            TimeoutError: If a query lasts longer than the timeout
+        """
+        # the caller cannot add the joins of the filter
+        query_builder._check_join_mode()
+        start, end, query = query_builder.build_query(None, fields)
+        params = dict(query_builder.params)
+        count_ = self._run(lambda session: session.run_sync(count, query_builder, count_strategy, cap))
+        page = self._run(lambda session: self._fetch(session, query, params, fields))
+        if isinstance(self.bind, AsyncSession):
+            (total_count, is_estimate, strategy), items = await count_, await page
+        else:
+            (total_count, is_estimate, strategy), items = await _gather(count_, page)
+        return ListResult(total=total_count, skip=start, limit=total_count if end is None else end,
+                          count_strategy=strategy, is_estimate=is_estimate), items
+
+    async def count(self, query_builder: QueryBuilder, count_strategy: str = "exact", cap: int = 1000) -> tuple:
+        """Count the rows that match the filter.
+
+        Args:
+            query_builder (QueryBuilder): The query builder
+            count_strategy (str, optional): The count strategy, see `enacit4r_sql.utils.count.count`. Defaults to "exact".
+            cap (int, optional): The maximum number of rows to count with the capped strategy. Defaults to 1000.
+
+        Returns:
+            tuple: A tuple containing the count, whether it is an estimate, and the strategy that was applied.
+
+        Raises:
+            ValidationError: If the filter applies to join models without a join mode
+        """
+        query_builder._check_join_mode()
+        return await self._run(lambda session: session.run_sync(count, query_builder, count_strategy, cap))
+
+    async def stream(self, query_builder: QueryBuilder, fields: list = None, batch_size: int = 1000):
+        """Stream the rows that match the filter in batches, using a server-side cursor, see `enacit4r_sql.utils.export.stream`.
+        The timeout does not apply.
+
+        Args:
+            query_builder (QueryBuilder): The query builder
+            fields (list, optional): List of fields to retrieve. Defaults to None.
+            batch_size (int, optional): The number of rows per batch. Defaults to 1000.
+
+        Yields:
+            list: A batch of items (model instances, or rows of the fields values)
+
+        Raises:
+            ValidationError: If the filter applies to join models without a join mode
+        """
+        query_builder._check_join_mode()
+        start, end, query = query_builder.build_query(None, fields)
+        async with self._session() as session:
+            result = await session.stream(query.execution_options(yield_per=batch_size), query_builder.params)
+            if not fields:
+                result = result.scalars()
+            async for batch in result.partitions():
+                yield batch
+
+    @asynccontextmanager
+    async def _session(self):
+        if isinstance(self.bind, AsyncSession):
+            yield self.bind
+        elif isinstance(self.bind, ReplicaRouter):
+            with self.bind.read(self.key) as engine:
+                async with AsyncSession(engine) as session:
+                    yield session
+        else:
+            async with AsyncSession(self.bind) as session:
+                yield session
+
+    async def _run(self, func):
+        async with self._session() as session:
+            return await asyncio.wait_for(func(session), self.timeout)
+
+    async def _fetch(self, session: AsyncSession, query, params: dict, fields: list):
+        result = await session.execute(query, params)
+        return result.all() if fields else result.scalars().all()
@@ -0,0 +1,68 @@
+from sqlalchemy import func, literal
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.elements import BindParameter, ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+from sqlalchemy.types import Boolean
+
+LIKE_ESCAPE = "/"
+
+
+def escape_like(value: str) -> str:
+    """Escape the LIKE metacharacters of a value, with the `LIKE_ESCAPE` character
+
+    Args:
+        value (str): The value
+
+    Returns:
+        str: The escaped value
+    """
+    return value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace("%", LIKE_ESCAPE + "%").replace("_", LIKE_ESCAPE + "_")
+
+
+class TextSearch(ColumnElement):
+    """Full-text search of a column: `to_tsvector(config, column) @@ plainto_tsquery(config, value)` on PostgreSQL.
+    Other databases, that have no full-text index on a plain column, fall back to the case-insensitive match of the value.
+    """
+
+    inherit_cache = True
+    type = Boolean()
+    _traverse_internals = [
+        ("column", InternalTraversal.dp_clauseelement),
+        ("value", InternalTraversal.dp_clauseelement),
+        ("pattern", InternalTraversal.dp_clauseelement),
+        ("config", InternalTraversal.dp_string),
+    ]
+
+    def __init__(self, column, value, config: str = "simple"):
+        """Initialize the expression.
+
+        Args:
+            column: The column to search
+            value (str | BindParameter): The search text
+            config (str, optional): The PostgreSQL text search configuration. Defaults to "simple".
+        """
+        self.column = column
+        self.config = config
+        if isinstance(value, BindParameter):
+            self.value = value
+            # the value of a cached template is escaped by the database
+            pattern = value
+            for char in [LIKE_ESCAPE, "%", "_"]:
+                pattern = func.replace(pattern, char, LIKE_ESCAPE + char)
+            self.pattern = literal("%") + pattern + literal("%")
+        else:
+            self.value = literal(value)
+            self.pattern = literal(f"%{escape_like(value)}%")
+
+
+@compiles(TextSearch, "postgresql")
+def _compile_text_search_postgresql(element, compiler, **kw):
+    config = compiler.process(literal(element.config), literal_binds=True)
+    column = compiler.process(element.column, **kw)
+    value = compiler.process(element.value, **kw)
+    return f"to_tsvector({config}, {column}) @@ plainto_tsquery({config}, {value})"
+
+
+@compiles(TextSearch)
+def _compile_text_search(element, compiler, **kw):
+    return compiler.process(element.column.ilike(element.pattern, escape=LIKE_ESCAPE), **kw)
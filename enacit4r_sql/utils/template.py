@@ -0,0 +1,139 @@
+from sqlalchemy import bindparam
+from sqlmodel import SQLModel
+from enacit4r_sql.utils.inlist import InListPolicy
+from enacit4r_sql.utils.query import QueryBuilder, ValidationError, ANCHORED_OPERATORS
+from enacit4r_sql.utils.search import escape_like
+
+
+# operators which value can be a placeholder
+PARAM_OPERATORS = ["$eq", "$ne", "$gt", "$ge", "$gte", "$lt", "$le", "$lte", "$in", "$nin", "$like", "$ilike", "$contains",
+                   "$search"] + ANCHORED_OPERATORS
+
+
+class Param:
+    """Named placeholder of a filter template value.
+    """
+
+    def __init__(self, name: str):
+        """Initialize the placeholder.
+
+        Args:
+            name (str): The name of the value, to be passed to `FilterTemplate.bind`
+        """
+        self.name = name
+
+    def __repr__(self):
+        return f"Param({self.name!r})"
+
+
+class FilterTemplate:
+    """Filter declared once with named placeholders (`Param`), in place of the values of the equality, comparison,
+    `$in`/`$nin`, pattern and search operators. The statements are built once, with bind parameters, and reused for
+    each set of values, so that neither the filter tree is walked again nor the SQL compiled again (and the
+    driver can reuse its prepared statement).
+
+    A placeholder cannot be bound to None (the filter `{"field": None}` is compiled as `IS NULL`, not as an equality).
+    """
+
+    def __init__(self, model: SQLModel, filter: dict, sort: list, range: list, joinModels: dict = {}, joinMode: str = None, inListPolicy: InListPolicy = None):
+        """Initialize the template.
+
+        Args:
+            model (SQLModel): The model to query
+            filter (dict): Filter parameters, with placeholders
+            sort (list): Sort parameters
+            range (list): Range parameters
+            joinModels (dict, optional): Dictionary of join models. Defaults to {}.
+            joinMode (str, optional): How filters on join models are applied, see QueryBuilder. Defaults to None.
+            inListPolicy (InListPolicy, optional): On PostgreSQL, the `$in`/`$nin` placeholders are bound as a single array
+                parameter, whatever the list size. Defaults to None, one parameter per value.
+
+        Raises:
+            ValidationError: If a placeholder name is used twice, or is the value of an operator that does not support it
+        """
+        self._transforms = {}
+        self._inStrategy = "array" if inListPolicy is not None and inListPolicy.dialect == "postgresql" else "expanding"
+        self._inParams = {}
+        self.builder = QueryBuilder(model, self._prepare(filter, joinModels), sort, range, joinModels=joinModels, joinMode=joinMode)
+        for name, strategy in self._inParams.items():
+            self.builder.add_in_param(name, strategy)
+        self._statements = {}
+
+    def bind(self, **values) -> dict:
+        """Get the parameters of the template statements for a set of values.
+
+        Args:
+            values: The values, by placeholder name
+
+        Returns:
+            dict: The parameters to pass at execution time
+
+        Raises:
+            ValidationError: If a value is missing, or unknown
+        """
+        missing = [name for name in self._transforms if name not in values]
+        if len(missing):
+            raise ValidationError(f"Missing template values: {', '.join(missing)}")
+        unknown = [name for name in values if name not in self._transforms]
+        if len(unknown):
+            raise ValidationError(f"Unknown template values: {', '.join(unknown)}")
+        return {name: self._transforms[name](value) for name, value in values.items()}
+
+    def build_query(self, fields: list = None):
+        """Get the query that retrieves the rows that match the filter, sorted and ranged as specified, see `QueryBuilder.build_query`.
+
+        Args:
+            fields (list, optional): List of fields to retrieve. Defaults to None.
+
+        Returns:
+            tuple: A tuple containing the start index, end index and the query object.
+        """
+        return self._get(("query", tuple(fields or [])), lambda: self.builder.build_query(None, fields))
+
+    def build_count_query(self):
+        """Get the query that counts the rows that match the filter, see `QueryBuilder.build_count_query`.
+
+        Returns:
+            The query object.
+        """
+        return self._get(("count",), self.builder.build_count_query)
+
+    def _get(self, key, build):
+        statement = self._statements.get(key)
+        if statement is None:
+            statement = build()
+            self._statements[key] = statement
+        return statement
+
+    def _prepare(self, filter, joinModels):
+        prepared = {}
+        for field, value in filter.items():
+            if field == "$and" or field == "$or":
+                prepared[field] = [self._prepare(sub_filter, joinModels) for sub_filter in value]
+            elif field in joinModels:
+                prepared[field] = self._prepare(value, joinModels)
+            elif isinstance(value, dict):
+                prepared[field] = {op: self._make_param(op_value, op) if isinstance(op_value, Param) else op_value
+                                   for op, op_value in value.items()}
+            elif isinstance(value, Param):
+                prepared[field] = self._make_param(value, "$eq")
+            else:
+                prepared[field] = value
+        return prepared
+
+    def _make_param(self, param, op):
+        if op not in PARAM_OPERATORS:
+            raise ValidationError(f"Invalid template value: {param.name}, not supported by the operator {op}")
+        if param.name in self._transforms:
+            raise ValidationError(f"Duplicate template value: {param.name}")
+        if op == "$like" or op == "$ilike":
+            self._transforms[param.name] = lambda value: f"%{value}%"
+        elif op in ANCHORED_OPERATORS:
+            self._transforms[param.name] = (lambda value: f"%{escape_like(value)}") if op == "$endswith" else (lambda value: f"{escape_like(value)}%")
+        elif op == "$in" or op == "$nin":
+            self._transforms[param.name] = list
+            self._inParams[param.name] = self._inStrategy
+            return bindparam(param.name, expanding=self._inStrategy == "expanding")
+        else:
+            self._transforms[param.name] = lambda value: value
+        return bindparam(param.name)
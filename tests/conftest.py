@@ -0,0 +1,29 @@
+import pytest
+from sqlmodel import Session, create_engine
+from test_query import Article
+
+
+def _add_articles(engine):
+    Article.__table__.create(engine)
+    with Session(engine) as session:
+        for i in range(20):
+            session.add(Article(id=i + 1, title=f"Drone {i}" if i % 2 else f"Robot {i}", stars=i % 5))
+        session.commit()
+
+
+@pytest.fixture
+def engine():
+    """In-memory SQLite database with 20 articles."""
+    engine = create_engine("sqlite://")
+    _add_articles(engine)
+    return engine
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """SQLite database file with the 20 articles of the engine fixture, e.g. to be opened by an async engine."""
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    _add_articles(engine)
+    engine.dispose()
+    return path
@@ -0,0 +1,52 @@
+from enacit4r_sql.utils.query import QueryBuilder
+from enacit4r_sql.utils.advisor import IndexAdvisor
+from test_query import Article, Author
+
+def test_composite_recommendation():
+    advisor = IndexAdvisor()
+    advisor.record(QueryBuilder(Article, {"stars": 1, "$and": [{"title": ["a", "b"]}]}, ["title", "desc"], [0, 9]))
+    advisor.record(QueryBuilder(Article, {"stars": {"$eq": 2}, "title": "c"}, [["title"]], [0, 9]))
+    advisor.record(QueryBuilder(Article, {"stars": {"$gte": 2}}, [], [0, 9]))
+    advisor.record(QueryBuilder(Article, {"id": 3, "stars": 4}, ["title"], [0, 9]))
+    recommendations = advisor.recommend()
+    assert [(r.table, r.columns, r.count) for r in recommendations] == [("article", ["stars", "title"], 2), ("article", ["stars"], 1)]
+    assert recommendations[0].ddl == "CREATE INDEX IF NOT EXISTS ix_article_stars_title ON article (stars, title);"
+    assert len(advisor.recommend(min_count=2)) == 1
+
+def test_or_recommendation():
+    advisor = IndexAdvisor()
+    advisor.record(QueryBuilder(Article, {"$or": [{"stars": 1}, {"title": {"$lt": "b"}}]}, [], []))
+    assert [(r.columns, r.reason) for r in advisor.recommend()] == [(["stars"], "single column criteria in $or"), (["title"], "single column criteria in $or")]
+
+def test_text_and_json_recommendation():
+    advisor = IndexAdvisor()
+    advisor.record(QueryBuilder(Article, {"title": {"$ilike": "drone"}}, [], []))
+    advisor.record(QueryBuilder(Author, {"institutions": {"$contains": ["EPFL"]}}, [], []))
+    recommendations = {r.using: r for r in advisor.recommend()}
+    assert recommendations["gin_trgm"].ddl == "CREATE EXTENSION IF NOT EXISTS pg_trgm; CREATE INDEX IF NOT EXISTS ix_article_title_trgm ON article USING gin (title gin_trgm_ops);"
+    assert recommendations["gin"].ddl == "CREATE INDEX IF NOT EXISTS ix_author_institutions_gin ON author USING gin (institutions jsonb_path_ops);"
+
+def test_join_recommendation():
+    advisor = IndexAdvisor()
+    advisor.record(QueryBuilder(Article, {"$author": {"name": "John", "email": {"$exists": True}}}, [], [], joinModels={"$author": Author}, joinMode="exists"))
+    assert [(r.table, r.columns) for r in advisor.recommend()] == [("author", ["article_id", "name"])]
+
+def test_warnings():
+    advisor = IndexAdvisor()
+    advisor.record(QueryBuilder(Article, {"title": {"$like": "drone"}, "stars": {"$nin": [1]}}, [], []))
+    advisor.record(QueryBuilder(Article, {"title": {"$like": "robot"}}, [], []))
+    warnings = advisor.warnings()
+    assert [(w.column, w.operator, w.count) for w in warnings] == [("title", "$like", 2), ("stars", "$nin", 1)]
+    advisor.clear()
+    assert advisor.warnings() == []
+    assert advisor.recommend() == []
+
+def test_anchored_and_search_recommendation():
+    advisor = IndexAdvisor()
+    advisor.record(QueryBuilder(Article, {"title": {"$istartswith": "dro"}}, [], []))
+    advisor.record(QueryBuilder(Author, {"name": {"$search": "john"}, "email": {"$endswith": "@epfl.ch"}}, [], []))
+    ddl = sorted(r.ddl for r in advisor.recommend())
+    assert ddl == ["CREATE EXTENSION IF NOT EXISTS pg_trgm; CREATE INDEX IF NOT EXISTS ix_author_email_trgm ON author USING gin (email gin_trgm_ops);",
+                   "CREATE INDEX IF NOT EXISTS ix_article_title_lower_pattern ON article (lower(title) text_pattern_ops);",
+                   "CREATE INDEX IF NOT EXISTS ix_author_name_fts ON author USING gin (to_tsvector('simple', name));"]
+    assert [w.operator for w in advisor.warnings()] == ["$endswith"]
@@ -0,0 +1,190 @@
+from datetime import datetime
+from typing import Optional
+import pytest
+from sqlmodel import SQLModel, Field, Session
+from sqlalchemy.dialects import postgresql
+from enacit4r_sql.utils.aggregate import AggregateBuilder
+from enacit4r_sql.utils.cache import StatementCache
+from enacit4r_sql.utils.query import QueryBuilder, ValidationError
+from test_query import Article, Author, as_sql
+
+
+class Reading(SQLModel, table=True):
+    id: Optional[int] = Field(primary_key=True)
+    measured: datetime
+    value: float
+
+
+@pytest.fixture
+def readings(engine):
+    """Readings of 2024, on the 1st and the 15th of each month."""
+    Reading.__table__.create(engine)
+    with Session(engine) as session:
+        for month in range(1, 13):
+            for day in [1, 15]:
+                session.add(Reading(measured=datetime(2024, month, day, 10, 30), value=month))
+        session.commit()
+    return engine
+
+
+def test_group_by_query():
+    builder = AggregateBuilder(QueryBuilder(Article, {"title": {"$like": "drone"}}, [], []),
+                               {"groupBy": ["stars"], "measures": {"count": {"op": "count"}, "max_id": {"op": "max", "field": "id"}}})
+    start, end, query = builder.build_query()
+    assert as_sql(query) == ("SELECT article.stars AS stars, count(*) AS count, max(article.id) AS max_id, count(*) OVER () AS total_count "
+                             "FROM article WHERE article.title LIKE :title_1 GROUP BY article.stars ORDER BY stars")
+
+
+def test_group_by(engine):
+    builder = AggregateBuilder(QueryBuilder(Article, {"stars": {"$gt": 0}}, [["count", "DESC"]], [0, 1]),
+                               {"groupBy": ["stars"], "measures": {"count": {"op": "count"}, "min_id": {"op": "min", "field": "id"}}})
+    start, end, query = builder.build_query()
+    with Session(engine) as session:
+        result = builder.make_result(session.execute(query).all())
+    # 4 groups of 4 articles, the tie broken by stars
+    assert result.total == 4
+    assert (result.skip, result.limit) == (0, 1)
+    assert result.columns == {"stars": [1, 2], "count": [4, 4], "min_id": [2, 3]}
+
+
+def test_measures_without_groups(engine):
+    builder = AggregateBuilder(QueryBuilder(Article, {}, [], []),
+                               {"measures": {"sum": {"op": "sum", "field": "stars"}, "avg": {"op": "avg", "field": "stars"}, "titles": {"op": "count_distinct", "field": "title"}}})
+    start, end, query = builder.build_query()
+    with Session(engine) as session:
+        result = builder.make_result(session.execute(query).all())
+    assert result.total == 1
+    assert result.columns == {"sum": [40], "avg": [2.0], "titles": [20]}
+
+
+def test_spec_as_json():
+    builder = AggregateBuilder(QueryBuilder(Article, {}, [], []), '{"groupBy": ["title"]}')
+    assert list(builder.groups) == ["title"]
+
+
+def test_join_model_group():
+    builder = AggregateBuilder(QueryBuilder(Article, {"$author": {"name": "John"}}, [], [], joinModels={"$author": Author}, joinMode="join"),
+                               {"groupBy": ["$author.email"], "measures": {"count": {"op": "count"}}})
+    start, end, query = builder.build_query()
+    sql = as_sql(query)
+    assert sql.startswith("WITH filtered_ids AS (SELECT DISTINCT article.id AS id FROM article JOIN author ON article.id = author.article_id WHERE author.name = :name_1)")
+    assert "count(distinct(article.id)) AS count" in sql
+    assert "FROM article LEFT OUTER JOIN author ON article.id = author.article_id WHERE article.id IN (SELECT filtered_ids.id FROM filtered_ids) GROUP BY author.email" in sql
+
+
+def test_join_model_group_exists():
+    # the join model of the filter is also outer joined for the groups
+    builder = AggregateBuilder(QueryBuilder(Article, {"$author": {"name": "John"}}, [], [], joinModels={"$author": Author}, joinMode="exists"),
+                               {"groupBy": ["$author.name"], "measures": {"count": {"op": "count"}}})
+    start, end, query = builder.build_query()
+    assert as_sql(query) == ("SELECT author.name AS \"$author.name\", count(distinct(article.id)) AS count, count(*) OVER () AS total_count "
+                             "FROM article LEFT OUTER JOIN author ON article.id = author.article_id "
+                             "WHERE EXISTS (SELECT 1 FROM author WHERE article.id = author.article_id AND author.name = :name_1) "
+                             "GROUP BY author.name ORDER BY \"$author.name\"")
+
+
+def test_one_to_many_measures():
+    query_builder = QueryBuilder(Article, {}, [], [], joinModels={"$author": Author})
+    # the stars of an article would be summed once per author
+    for measure in [{"op": "sum", "field": "stars"}, {"op": "avg", "field": "stars"}, {"op": "count", "field": "title"}]:
+        with pytest.raises(ValidationError, match="multiplied by one-to-many related models"):
+            AggregateBuilder(query_builder, {"measures": {"authors": {"op": "count_distinct", "field": "$author.name"}, "measure": measure}})
+    # not changed by the duplicated rows, or computed on the multiplied rows
+    AggregateBuilder(query_builder, {"groupBy": ["stars"], "measures": {"authors": {"op": "count_distinct", "field": "$author.name"},
+                                                                       "max": {"op": "max", "field": "id"}, "count": {"op": "count"},
+                                                                       "ids": {"op": "sum", "field": "$author.id"}}})
+    # many-to-one related model
+    AggregateBuilder(QueryBuilder(Author, {}, [], []), {"groupBy": ["article.title"], "measures": {"total": {"op": "sum", "field": "id"}}})
+
+
+def test_join_model_without_join_mode():
+    # the join cannot be added by the caller
+    builder = AggregateBuilder(QueryBuilder(Article, {"$author": {"name": "John"}}, [], [], joinModels={"$author": Author}),
+                               {"groupBy": ["stars"], "measures": {"count": {"op": "count"}}})
+    with pytest.raises(ValidationError, match="A join mode is required"):
+        builder.build_query()
+
+
+def test_date_buckets(readings):
+    with Session(readings) as session:
+        for unit, total, first in [("month", 12, datetime(2024, 1, 1)), ("quarter", 4, datetime(2024, 1, 1)),
+                                   ("week", 24, datetime(2024, 1, 1)), ("year", 1, datetime(2024, 1, 1)), ("day", 24, datetime(2024, 1, 1))]:
+            builder = AggregateBuilder(QueryBuilder(Reading, {}, [], []),
+                                       {"buckets": {unit: {"field": "measured", "unit": unit}}, "measures": {"total": {"op": "sum", "field": "value"}}})
+            start, end, query = builder.build_query()
+            result = builder.make_result(session.execute(query).all())
+            assert result.total == total
+            assert result.columns[unit][0] == first
+            if unit == "week":
+                # Thursday 1st of February
+                assert result.columns[unit][2] == datetime(2024, 1, 29)
+    builder = AggregateBuilder(QueryBuilder(Reading, {}, [], []),
+                               {"buckets": {"quarter": {"field": "measured", "unit": "quarter"}}, "measures": {"total": {"op": "sum", "field": "value"}}})
+    start, end, query = builder.build_query()
+    with Session(readings) as session:
+        result = builder.make_result(session.execute(query).all())
+    assert result.columns["total"] == [12.0, 30.0, 48.0, 66.0]
+
+
+def test_date_bucket_postgresql():
+    builder = AggregateBuilder(QueryBuilder(Reading, {}, [["month", "DESC"]], []),
+                               {"buckets": {"month": {"field": "measured", "unit": "month"}}, "measures": {"count": {"op": "count"}}})
+    start, end, query = builder.build_query()
+    sql = as_sql(query.compile(dialect=postgresql.dialect()))
+    assert sql == ("SELECT date_trunc('month', reading.measured) AS month, count(*) AS count, count(*) OVER () AS total_count "
+                   "FROM reading GROUP BY date_trunc('month', reading.measured) ORDER BY month DESC")
+
+
+def test_date_bucket_cache_key():
+    def build(unit):
+        builder = AggregateBuilder(QueryBuilder(Reading, {}, [], []), {"buckets": {"bucket": {"field": "measured", "unit": unit}}})
+        return builder.build_query()[2]._generate_cache_key()
+    assert build("month") is not None
+    assert build("month").key == build("month").key
+    assert build("month").key != build("year").key
+
+
+def test_range_out_of_groups(engine):
+    builder = AggregateBuilder(QueryBuilder(Article, {}, [], [10, 19]), {"groupBy": ["stars"]})
+    start, end, query = builder.build_query()
+    with Session(engine) as session:
+        rows = session.execute(query).all()
+    assert rows == []
+    with pytest.raises(ValueError):
+        builder.make_result(rows)
+    assert builder.make_result(rows, 5).total == 5
+
+
+def test_cached_aggregate(engine):
+    cache = StatementCache()
+    spec = {"groupBy": ["stars"], "measures": {"count": {"op": "count"}}}
+    with Session(engine) as session:
+        results = []
+        for title in ["Drone%", "Robot%"]:
+            query_builder = QueryBuilder(Article, {"title": {"$like": title}}, [], [], cache=cache)
+            builder = AggregateBuilder(query_builder, spec)
+            start, end, query = builder.build_query()
+            results.append(builder.make_result(session.execute(query, query_builder.params).all()))
+    assert len(cache) == 1
+    assert results[0].columns["count"] == [2, 2, 2, 2, 2]
+    assert results[1].total == 5
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({}, "Empty aggregation"),
+    ({"groupBy": ["unknown"]}, "Invalid aggregate field: unknown"),
+    ({"groupBy": ["$unknown.name"]}, "Invalid field: $unknown.name"),
+    ({"buckets": {"month": {"field": "stars", "unit": "fortnight"}}}, "Invalid bucket unit: fortnight"),
+    ({"measures": {"total": {"op": "median", "field": "stars"}}}, "Invalid aggregate operator: median"),
+    ({"measures": {"total": {"op": "sum"}}}, "Missing field of measure: total"),
+    ({"groupBy": ["stars"], "measures": {"stars": {"op": "count"}}}, "Duplicate aggregate name: stars"),
+])
+def test_invalid_spec(spec, message):
+    with pytest.raises(ValidationError, match=message.replace("$", r"\$")):
+        AggregateBuilder(QueryBuilder(Article, {}, [], []), spec)
+
+
+def test_invalid_sort():
+    builder = AggregateBuilder(QueryBuilder(Article, {}, ["title", "ASC"], []), {"groupBy": ["stars"]})
+    with pytest.raises(ValidationError, match="Invalid sort field: title"):
+        builder.build_query()
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import event, text
+from sqlmodel import Session
+from enacit4r_sql.utils.batch import list_batch
+from enacit4r_sql.utils.cache import StatementCache
+from enacit4r_sql.utils.query import QueryBuilder, ValidationError
+from test_query import Article, Author
+
+def test_list_batch(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    requests = [
+        QueryBuilder(Article, {"stars": 1}, ["id", "desc"], [0, 1]),
+        (QueryBuilder(Article, {"title": {"$startswith": "Robot"}}, ["title"], [1, 2]), ["title"]),
+        QueryBuilder(Article, {}, ["title"], [0, 2]),
+        (QueryBuilder(Article, {"stars": 4}, [], []), ["id"]),
+        QueryBuilder(Article, {"stars": 2}, ["id"], [0, 0], cache=StatementCache()),
+    ]
+    with Session(engine) as session:
+        results = list_batch(session, requests)
+    assert [(result.total, result.skip, result.limit) for result, items in results] == [(4, 0, 1), (10, 1, 2), (20, 0, 2), (4, 0, 4), (4, 0, 0)]
+    assert [article.id for article in results[0][1]] == [17, 12]
+    assert results[1][1] == [("Robot 10",), ("Robot 12",)]
+    assert [article.title for article in results[2][1]] == ["Drone 1", "Drone 11", "Drone 13"]
+    assert results[3][1] == [(5,), (10,), (15,), (20,)]
+    assert [article.id for article in results[4][1]] == [3]
+    # cached count, combined counts, cached page, union of the entity pages, title page, id page
+    assert len(statements) == 6
+    assert statements[3].count("UNION ALL") == 1
+
+def test_list_batch_join(engine):
+    # the JSONB column of the authors cannot be created on SQLite
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE author (id INTEGER PRIMARY KEY, name VARCHAR, email VARCHAR, institutions JSON, article_id INTEGER)"))
+        for i, article_id in enumerate([2, 2, 3, 4, 9]):
+            conn.execute(text("INSERT INTO author (name, email, article_id) VALUES (:name, :email, :article_id)"),
+                         {"name": f"John {i}", "email": f"john{i}@example.com", "article_id": article_id})
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    requests = [
+        QueryBuilder(Article, {"$author": {"name": {"$startswith": "John"}}}, ["$author.name", "desc"], [0, 2],
+                     joinModels={"$author": Author}, joinMode="join"),
+        QueryBuilder(Article, {"$author": {"email": {"$exists": True}}}, ["stars"], [], joinModels={"$author": Author}, joinMode="exists"),
+    ]
+    with Session(engine) as session:
+        results = list_batch(session, requests)
+    assert [(result.total, result.skip, result.limit) for result, items in results] == [(4, 0, 2), (4, 0, 4)]
+    # the rows are not multiplied by the authors, and sorted by the name of their last author
+    assert [article.id for article in results[0][1]] == [9, 4, 3]
+    assert [article.id for article in results[1][1]] == [2, 3, 4, 9]
+    # combined counts, union of the entity pages
+    assert len(statements) == 2
+    assert statements[1].count("UNION ALL") == 1
+    # the join cannot be added by the caller
+    with Session(engine) as session:
+        with pytest.raises(ValidationError, match="A join mode is required"):
+            list_batch(session, [QueryBuilder(Article, {}, [], []), QueryBuilder(Article, {"$author": {"name": "John 1"}}, [], [], joinModels={"$author": Author})])
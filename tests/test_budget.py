@@ -0,0 +1,62 @@
+import json
+import pytest
+from enacit4r_sql.utils.query import QueryBuilder, ValidationError, validate_params
+from enacit4r_sql.utils.budget import FilterBudget
+from test_query import Article
+
+FILTER = {"stars": [1, 2, 3], "$or": [{"title": {"$ilike": "drone"}}, {"$and": [{"id": {"$nin": [4, 5]}}]}], "$author": {"name": 'Jo"hn, {x}'}}
+
+def test_check_stats():
+    budget = FilterBudget()
+    expected = {"depth": 7, "nodes": 7, "in_values": 5, "max_in_size": 3, "joins": 1, "cost": 17}
+    stats = budget.check(json.dumps(FILTER))
+    assert stats == {"bytes": len(json.dumps(FILTER)), **expected}
+    assert budget.check(FILTER) == {"bytes": len(json.dumps(FILTER)), **expected}
+    # bytes, not characters
+    assert budget.check('{"title": "é"}')["bytes"] == 15
+    assert budget.check({"title": "é"})["bytes"] == len(json.dumps({"title": "é"}).encode())
+    assert budget.check("") == budget.check({}) == {"bytes": 0, "depth": 0, "nodes": 0, "in_values": 0, "max_in_size": 0, "joins": 0, "cost": 0}
+
+@pytest.mark.parametrize("budget, message", [
+    (FilterBudget(max_bytes=10), "bytes budget"),
+    (FilterBudget(max_depth=4), "depth budget"),
+    (FilterBudget(max_nodes=6), "nodes budget"),
+    (FilterBudget(max_in_size=2), "IN list size budget"),
+    (FilterBudget(max_joins=0), "joins budget"),
+])
+def test_check_limits(budget, message):
+    for filter in [json.dumps(FILTER), FILTER]:
+        with pytest.raises(ValidationError, match=message):
+            budget.check(filter)
+
+def test_join_models():
+    budget = FilterBudget(max_joins=0)
+    for filter in [json.dumps(FILTER), FILTER]:
+        # only the keys of the join models are joins
+        assert budget.check(filter, {})["joins"] == 0
+        with pytest.raises(ValidationError, match="joins budget"):
+            budget.check(filter, {"$author": Article})
+    with pytest.raises(ValidationError, match="joins budget"):
+        validate_params(FILTER, [], [], budget=budget, joinModels={"$author": Article})
+
+
+def test_validate_params_budget():
+    params = validate_params(json.dumps({"stars": {"$in": [1, 2]}, "title": "Drone"}), [], [])
+    assert params["budget"]["nodes"] == 2
+    assert params["budget"]["cost"] == 2
+    assert params["filter"] == {"stars": {"$in": [1, 2]}, "title": "Drone"}
+    assert validate_params({}, [], [], budget=None)["budget"] is None
+
+
+def test_pathological_filter():
+    filter = {"id": 1}
+    for _ in range(300):
+        filter = {"$or": [filter]}
+    text = json.dumps(filter)
+    with pytest.raises(ValidationError, match="depth budget"):
+        validate_params(text, [], [])
+    with pytest.raises(ValidationError, match="depth budget"):
+        QueryBuilder(Article, filter, [], [], validate=True)
+    with pytest.raises(ValidationError, match="IN list size budget"):
+        validate_params({"id": list(range(100001))}, [], [])
+    assert FilterBudget(max_in_size=None).check({"id": list(range(100001))})["max_in_size"] == 100001
@@ -0,0 +1,86 @@
+from sqlmodel import Session
+from enacit4r_sql.utils.query import QueryBuilder
+from enacit4r_sql.utils.cache import StatementCache
+from test_query import Article, Author, as_sql
+
+
+def test_cached_query():
+    cache = StatementCache()
+    builder = QueryBuilder(Article, {"title": { "$like": "Drone" }, "stars": [1, 2]}, ["title", "desc"], [0, 9], cache=cache)
+    start, end, query = builder.build_query(1)
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE article.title LIKE :p_0 AND article.stars IN (__[POSTCOMPILE_p_1]) ORDER BY article.title DESC, article.id DESC LIMIT :param_1 OFFSET :param_2"
+    assert builder.params == {"p_0": "%Drone%", "p_1": [1, 2]}
+
+def test_cache_hit_on_same_shape():
+    cache = StatementCache()
+    builder = QueryBuilder(Article, {"$or": [{"stars": { "$ge": 1 }}, {"title": "Drone"}]}, [], [], cache=cache)
+    count_query = builder.build_count_query()
+    builder = QueryBuilder(Article, {"$or": [{"stars": { "$ge": 3 }}, {"title": "Robot"}]}, [], [], cache=cache)
+    assert builder.build_count_query() is count_query
+    assert builder.params == {"p_0": 3, "p_1": "Robot"}
+    builder = QueryBuilder(Article, {"$or": [{"stars": { "$le": 3 }}, {"title": "Robot"}]}, [], [], cache=cache)
+    assert builder.build_count_query() is not count_query
+    assert cache.stats() == {"hits": 1, "misses": 2, "evictions": 0, "size": 2, "maxsize": 128}
+
+def test_cache_key_includes_sort_and_fields():
+    cache = StatementCache()
+    QueryBuilder(Article, {"stars": 1}, ["title"], [], cache=cache).build_query(1)
+    QueryBuilder(Article, {"stars": 2}, ["title", "desc"], [], cache=cache).build_query(1)
+    QueryBuilder(Article, {"stars": 3}, ["title"], [], cache=cache).build_query(1, fields=["id"])
+    QueryBuilder(Article, {"stars": 4}, ["title"], [], cache=cache).build_query(1)
+    assert cache.hits == 1
+    assert cache.misses == 3
+
+def test_cache_eviction():
+    cache = StatementCache(maxsize=2)
+    QueryBuilder(Article, {"stars": 1}, [], [], cache=cache).build_count_query()
+    QueryBuilder(Article, {"title": "Drone"}, [], [], cache=cache).build_count_query()
+    QueryBuilder(Article, {"stars": 1}, [], [], cache=cache).build_count_query()
+    QueryBuilder(Article, {"id": 1}, [], [], cache=cache).build_count_query()
+    assert cache.evictions == 1
+    assert len(cache) == 2
+    QueryBuilder(Article, {"stars": 2}, [], [], cache=cache).build_count_query()
+    assert cache.hits == 2
+
+def test_cached_join_query():
+    cache = StatementCache()
+    builder = QueryBuilder(Article, {"$author": {"name": {"$ilike": "john"}, "institutions": { "$exists": True }}}, [], [], joinModels={"$author": Author}, cache=cache)
+    start, end, query = builder.build_query(1)
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article, author WHERE lower(author.name) LIKE lower(:p_0) AND author.institutions IS NOT NULL AND CAST(author.institutions AS VARCHAR) != :param_1"
+    assert builder.params == {"p_0": "%john%"}
+
+def test_cached_results(engine):
+    cache = StatementCache()
+    filters = [
+        {"$and": [{"stars": { "$gte": 2 }}, {"$or": [{"title": { "$ilike": "drone" }}, {"id": [1, 2, None]}]}]},
+        {"$and": [{"stars": { "$gte": 1 }}, {"$or": [{"title": { "$ilike": "robot" }}, {"id": [3, None]}]}]},
+        {"stars": { "$nin": [0, 1] }, "title": [None]},
+    ]
+    with Session(engine) as session:
+        for filter in filters:
+            builder = QueryBuilder(Article, filter, ["title", "desc"], [0, 4])
+            expected_count = session.exec(builder.build_count_query()).one()
+            expected_ids = [a.id for a in session.exec(builder.build_query(expected_count)[2])]
+            builder = QueryBuilder(Article, filter, ["title", "desc"], [0, 4], cache=cache)
+            count = session.exec(builder.build_count_query(), params=builder.params).one()
+            ids = [a.id for a in session.exec(builder.build_query(count)[2], params=builder.params)]
+            assert count == expected_count
+            assert ids == expected_ids
+    assert cache.hits == 2
+
+def test_cached_keyset_query(engine):
+    cache = StatementCache()
+    with Session(engine) as session:
+        ids = []
+        cursor = None
+        for stars in [1, 1, 1, 1, 1]:
+            builder = QueryBuilder(Article, {"stars": { "$ge": stars }}, ["stars"], [0, 4], cache=cache)
+            page, cursor = builder.keyset_page(session.exec(builder.build_keyset_query(cursor), params=builder.params).all())
+            ids.extend([a.id for a in page])
+            if cursor is None:
+                break
+        assert len(ids) == 16
+        assert len(set(ids)) == 16
+    assert cache.stats()["size"] == 2
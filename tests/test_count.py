@@ -0,0 +1,50 @@
+from sqlmodel import Session
+from sqlalchemy.dialects import postgresql
+from enacit4r_sql.models.query import ListResult
+from enacit4r_sql.utils.query import QueryBuilder, ValidationError
+from enacit4r_sql.utils.count import count
+from enacit4r_sql.utils.cache import StatementCache
+from enacit4r_sql.utils.explain import Explain
+from test_query import Article, Author, as_sql
+
+def test_capped_count_query():
+    builder = QueryBuilder(Article, {"title": { "$like": "drone" }}, [], [])
+    query = builder.build_count_query(cap=100)
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT count(*) AS count_1 FROM (SELECT DISTINCT article.id AS id FROM article WHERE article.title LIKE :title_1 LIMIT :param_1) AS anon_1"
+
+def test_explain_query():
+    builder = QueryBuilder(Article, {"stars": { "$ge": 1 }}, [], [])
+    query = Explain(builder.build_ids_query())
+    sql = " ".join(str(query.compile(dialect=postgresql.dialect())).split())
+    assert sql == "EXPLAIN (FORMAT JSON) SELECT DISTINCT article.id FROM article WHERE article.stars >= %(stars_1)s"
+
+def test_count_strategies(engine):
+    with Session(engine) as session:
+        builder = QueryBuilder(Article, {"stars": { "$ge": 1 }}, [], [])
+        assert count(session, builder) == (16, False, "exact")
+        assert count(session, builder, "capped", cap=10) == (10, True, "capped")
+        assert count(session, builder, "capped", cap=16) == (16, False, "capped")
+        # no planner estimate on SQLite
+        assert count(session, builder, "estimate") == (16, False, "exact")
+        builder = QueryBuilder(Article, {"stars": { "$ge": 1 }}, [], [], cache=StatementCache())
+        assert count(session, builder, "capped", cap=10) == (10, True, "capped")
+        try:
+            count(session, builder, "whatever")
+            assert False
+        except ValidationError:
+            pass
+        # the join cannot be added by the caller
+        builder = QueryBuilder(Article, {"$author": {"name": "John"}}, [], [], joinModels={"$author": Author})
+        try:
+            count(session, builder)
+            assert False
+        except ValidationError:
+            pass
+
+def test_list_result_count():
+    result = ListResult(total=1000, skip=0, limit=9, count_strategy="capped", is_estimate=True)
+    assert result.is_estimate
+    result = ListResult(total=10, skip=0, limit=9)
+    assert result.count_strategy == "exact"
+    assert not result.is_estimate
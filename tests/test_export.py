@@ -0,0 +1,86 @@
+import json
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, create_engine
+from enacit4r_sql.utils.query import QueryBuilder, ValidationError
+from enacit4r_sql.utils.cache import StatementCache
+from enacit4r_sql.utils.export import stream, to_ndjson, to_csv, partition_ranges, stream_parallel
+from test_query import Article, Author
+
+def test_stream_batches(engine):
+    with Session(engine) as session:
+        batches = list(stream(session, QueryBuilder(Article, {"stars": { "$ge": 1 }}, ["id"], []), batch_size=5))
+        assert [len(batch) for batch in batches] == [5, 5, 5, 1]
+        assert [a.id for batch in batches for a in batch][:3] == [2, 3, 4]
+        builder = QueryBuilder(Article, {"stars": { "$ge": 1 }}, ["id"], [], cache=StatementCache())
+        batches = list(stream(session, builder, fields=["id", "title"], batch_size=10))
+        assert [len(batch) for batch in batches] == [10, 6]
+        assert batches[0][0].title == "Drone 1"
+
+def test_ndjson(engine):
+    with Session(engine) as session:
+        builder = QueryBuilder(Article, {"id": [1, 2]}, ["id"], [])
+        lines = "".join(to_ndjson(stream(session, builder, batch_size=1))).splitlines()
+        assert [json.loads(line) for line in lines] == [{"id": 1, "title": "Robot 0", "stars": 0}, {"id": 2, "title": "Drone 1", "stars": 1}]
+
+def test_csv(engine):
+    with Session(engine) as session:
+        builder = QueryBuilder(Article, {"id": [1, 2]}, ["id"], [])
+        chunks = list(to_csv(stream(session, builder, fields=["id", "title"], batch_size=1)))
+        assert chunks == ["id,title\r\n1,Robot 0\r\n", "2,Drone 1\r\n"]
+        chunks = list(to_csv(stream(session, builder, batch_size=10), columns=["title"]))
+        assert chunks == ["title\r\nRobot 0\r\nDrone 1\r\n"]
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    # connections of the parallel scans share the database file
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    Article.__table__.create(engine)
+    with Session(engine) as session:
+        for i in range(100):
+            session.add(Article(id=i + 1, title=f"Drone {i}" if i % 2 else f"Robot {i}", stars=i % 5))
+        session.commit()
+    yield engine
+    engine.dispose()
+
+def test_partition_ranges(engine):
+    with Session(engine) as session:
+        builder = QueryBuilder(Article, {"stars": {"$ge": 1}}, [], [])
+        assert partition_ranges(session, builder, 4) == [(None, 7), (7, 12), (12, 17), (17, None)]
+        assert partition_ranges(session, builder, 4, "quantiles") == [(None, 7), (7, 12), (12, 17), (17, None)]
+        assert partition_ranges(session, QueryBuilder(Article, {"id": [1, 2, 3, 20]}, [], []), 2, "quantiles") == [(None, 3), (3, None)]
+        assert partition_ranges(session, QueryBuilder(Article, {"stars": 7}, [], []), 4) == [(None, None)]
+        with pytest.raises(ValidationError):
+            partition_ranges(session, builder, 4, "random")
+
+def test_stream_parallel(file_engine):
+    builder = QueryBuilder(Article, {"stars": {"$ge": 1}}, ["title"], [])
+    batches = list(stream_parallel(file_engine, builder, batch_size=7, partitions=3, workers=2, ordered=True, max_batches=1))
+    assert [a.id for batch in batches for a in batch] == [i + 1 for i in range(100) if i % 5]
+    builder = QueryBuilder(Article, {"stars": {"$ge": 1}}, [], [], cache=StatementCache())
+    batches = list(stream_parallel(file_engine, builder, fields=["id"], batch_size=10, partitions=4, method="quantiles"))
+    assert sorted(row.id for batch in batches for row in batch) == [i + 1 for i in range(100) if i % 5]
+    # early stop of the consumer
+    for batch in stream_parallel(file_engine, builder, batch_size=1, max_batches=1):
+        break
+    # the scans not started are cancelled
+    statements = []
+    event.listen(file_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    for batch in stream_parallel(file_engine, QueryBuilder(Article, {}, [], []), batch_size=1, partitions=8, workers=1, max_batches=1):
+        break
+    # the ranges, then a single scan
+    assert len(statements) == 2
+    with pytest.raises(ValidationError):
+        next(stream_parallel(file_engine, QueryBuilder(Article, {}, [], [0, 9])))
+
+def test_join_model_without_join_mode(engine):
+    # the join cannot be added by the caller
+    builder = QueryBuilder(Article, {"$author": {"name": "John"}}, [], [], joinModels={"$author": Author})
+    with Session(engine) as session:
+        with pytest.raises(ValidationError, match="A join mode is required"):
+            next(stream(session, builder))
+        with pytest.raises(ValidationError, match="A join mode is required"):
+            partition_ranges(session, builder, 4)
+    with pytest.raises(ValidationError, match="A join mode is required"):
+        next(stream_parallel(engine, builder))
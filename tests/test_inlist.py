@@ -0,0 +1,76 @@
+from sqlmodel import Session
+from sqlalchemy.dialects import postgresql
+from enacit4r_sql.utils.query import QueryBuilder
+from enacit4r_sql.utils.cache import StatementCache
+from enacit4r_sql.utils.inlist import InListPolicy
+from test_query import Article, as_sql
+
+def as_pg_sql(query):
+    return " ".join(str(query.compile(dialect=postgresql.dialect())).split())
+
+def test_policy_choose():
+    policy = InListPolicy("postgresql", array_threshold=10, unnest_threshold=100)
+    assert policy.choose(9) == "expanding"
+    assert policy.choose(10) == "array"
+    assert policy.choose(100) == "unnest"
+    policy = InListPolicy("sqlite", chunk_size=10)
+    assert policy.choose(10) == "expanding"
+    assert policy.choose(11) == "chunked"
+    assert policy.chunks(list(range(25))) == [list(range(10)), list(range(10, 20)), list(range(20, 25))]
+    assert InListPolicy().choose(100000) == "expanding"
+
+def test_array_query():
+    policy = InListPolicy("postgresql", array_threshold=3, unnest_threshold=100)
+    builder = QueryBuilder(Article, {"id": [1, 2, 3, None], "stars": {"$nin": [1, 2, 3]}, "title": {"$in": ["a", "b"]}}, [], [], inListPolicy=policy)
+    start, end, query = builder.build_query(1)
+    #print(as_pg_sql(query))
+    assert as_pg_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE (article.id IS NULL OR article.id = ANY (%(param_1)s::INTEGER[])) AND article.stars != ALL (%(param_2)s::INTEGER[]) AND article.title IN (__[POSTCOMPILE_title_1])"
+    assert builder.inListStrategies == {"Article.id": "array", "Article.stars": "array", "Article.title": "expanding"}
+
+def test_unnest_query():
+    policy = InListPolicy("postgresql", array_threshold=3, unnest_threshold=5)
+    builder = QueryBuilder(Article, {"id": list(range(10))}, [], [], inListPolicy=policy)
+    query = builder.build_count_query()
+    #print(as_pg_sql(query))
+    assert as_pg_sql(query) == "SELECT count(distinct(article.id)) AS count_1 FROM article WHERE article.id IN (SELECT unnest(%(param_1)s::INTEGER[]) AS unnest_1)"
+    assert builder.inListStrategies == {"Article.id": "unnest"}
+
+def test_cached_array_query():
+    policy = InListPolicy("postgresql", array_threshold=3)
+    cache = StatementCache()
+    builder = QueryBuilder(Article, {"id": [1, 2, 3]}, [], [], inListPolicy=policy, cache=cache)
+    query = builder.build_count_query()
+    #print(as_pg_sql(query))
+    assert as_pg_sql(query) == "SELECT count(distinct(article.id)) AS count_1 FROM article WHERE article.id = ANY (%(p_0)s::INTEGER[])"
+    assert builder.params == {"p_0": [1, 2, 3]}
+    # same shape, other size class
+    builder = QueryBuilder(Article, {"id": [1, 2]}, [], [], inListPolicy=policy, cache=cache)
+    query = builder.build_count_query()
+    assert as_pg_sql(query) == "SELECT count(distinct(article.id)) AS count_1 FROM article WHERE article.id IN (__[POSTCOMPILE_p_0])"
+    assert cache.misses == 2
+    assert builder.inListStrategies == {"Article.id": "expanding"}
+    # statement found in the cache
+    builder = QueryBuilder(Article, {"id": [4, 5, 6]}, [], [], inListPolicy=policy, cache=cache)
+    builder.build_count_query()
+    assert cache.misses == 2
+    assert builder.inListStrategies == {"Article.id": "array"}
+
+def test_chunked_results(engine):
+    policy = InListPolicy("sqlite", chunk_size=3)
+    filters = [
+        {"id": [1, 2, 3, 4, 5, 6, 7, None]},
+        {"stars": {"$in": [1, 2, 3, 4]}},
+        {"id": {"$nin": [1, 2, 3, 4, 5, 6, 7]}},
+    ]
+    with Session(engine) as session:
+        for cache in [None, StatementCache()]:
+            for filter in filters:
+                expected = session.exec(QueryBuilder(Article, filter, ["id"], []).build_query(0)[2]).all()
+                builder = QueryBuilder(Article, filter, ["id"], [], inListPolicy=policy, cache=cache)
+                found = session.exec(builder.build_query(0)[2], params=builder.params).all()
+                assert list(builder.inListStrategies.values()) == ["chunked"]
+                assert [a.id for a in found] == [a.id for a in expected]
+    builder = QueryBuilder(Article, {"id": [1, 2, 3, 4]}, [], [], inListPolicy=policy)
+    query = builder.build_count_query()
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT count(distinct(article.id)) AS count_1 FROM article WHERE article.id IN (__[POSTCOMPILE_id_1]) OR article.id IN (__[POSTCOMPILE_id_2])"
@@ -0,0 +1,90 @@
+from sqlmodel import Session
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+from enacit4r_sql.utils.query import QueryBuilder, validate_params
+from enacit4r_sql.utils.instrument import add_listener, remove_listener, filter_stats, instrument_engine, OpenTelemetryListener, PrometheusAggregator
+from test_query import Article, Author
+
+FILTER = {"stars": [1, 2, 3], "$or": [{"title": {"$ilike": "drone"}}, {"$and": [{"id": {"$nin": [4, 5]}}]}], "$author": {"name": "John"}}
+
+def test_filter_stats():
+    assert filter_stats(FILTER, {"$author": Author}) == {"nodes": 7, "depth": 3, "joins": 1, "in_sizes": [3, 2]}
+    assert filter_stats({}) == {"nodes": 0, "depth": 1, "joins": 0, "in_sizes": []}
+
+def test_listener(engine):
+    events = []
+    listener = lambda phase, table, start, duration, stats: events.append((phase, table, duration >= 0, stats))
+    instrument_engine(engine)
+    add_listener(listener)
+    try:
+        validate_params({"stars": 1}, [], [])
+        builder = QueryBuilder(Article, {"stars": 1}, [], [0, 9])
+        start, end, query = builder.build_query(0)
+        with Session(engine) as session:
+            session.exec(query).all()
+    finally:
+        remove_listener(listener)
+    stats = {"nodes": 1, "depth": 1, "joins": 0, "in_sizes": []}
+    assert events == [("validate", None, True, {**stats, "cost": 1}), ("construct", "article", True, stats), ("build_query", "article", True, stats),
+                      ("compile", "article", True, None), ("execute", "article", True, None)]
+    QueryBuilder(Article, {}, [], []).build_query(0)
+    assert len(events) == 5
+
+def test_validate_joins():
+    events = []
+    listener = lambda phase, table, start, duration, stats: events.append(stats)
+    add_listener(listener)
+    try:
+        validate_params({"$author": {"name": {"$eq": "John"}}}, [], [], joinModels={"$author": Author})
+    finally:
+        remove_listener(listener)
+    assert events[0]["joins"] == 1
+
+def test_failed_statement(engine):
+    events = []
+    listener = lambda phase, table, start, duration, stats: events.append(phase)
+    instrument_engine(engine)
+    add_listener(listener)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+            assert conn.info["query_timings"] == []
+            conn.execute(select(Article.id)).all()
+            assert conn.info["query_timings"] == []
+    finally:
+        remove_listener(listener)
+    assert events == ["compile", "compile", "execute"]
+
+def test_prometheus_aggregator():
+    aggregator = PrometheusAggregator(buckets=[0.1, 1])
+    aggregator("build_query", "article", 0, 0.05, {"nodes": 3, "depth": 1, "joins": 0, "in_sizes": []})
+    aggregator("build_query", "article", 0, 0.5, {"nodes": 3, "depth": 1, "joins": 0, "in_sizes": []})
+    aggregator("execute", "article", 0, 2, None)
+    metrics = aggregator.render()
+    assert 'enacit4r_sql_phase_duration_seconds_bucket{table="article",phase="build_query",le="0.1"} 1' in metrics
+    assert 'enacit4r_sql_phase_duration_seconds_bucket{table="article",phase="build_query",le="+Inf"} 2' in metrics
+    assert 'enacit4r_sql_phase_duration_seconds_bucket{table="article",phase="execute",le="1"} 0' in metrics
+    assert 'enacit4r_sql_phase_duration_seconds_count{table="article",phase="execute"} 1' in metrics
+    assert 'enacit4r_sql_filter_nodes_bucket{table="article",phase="build_query",le="5"} 2' in metrics
+    aggregator.clear()
+    assert "_bucket" not in aggregator.render()
+
+def test_opentelemetry_listener():
+    spans = []
+
+    class Span:
+        def __init__(self, name, start_time, attributes):
+            spans.append((name, attributes))
+            self.start_time = start_time
+
+        def end(self, end_time):
+            assert end_time - self.start_time == 2000000
+
+    class Tracer:
+        def start_span(self, name, start_time, attributes):
+            return Span(name, start_time, attributes)
+
+    OpenTelemetryListener(Tracer())("build_query", "article", 1.5, 0.002, {"nodes": 3, "depth": 2, "joins": 1, "in_sizes": [2]})
+    assert spans == [("query.build_query", {"db.sql.table": "article", "filter.nodes": 3, "filter.depth": 2, "filter.joins": 1, "filter.in_sizes": [2]})]
@@ -0,0 +1,71 @@
+from sqlmodel import Session
+from enacit4r_sql.utils.normalize import normalize_filter, FALSE_FILTER
+from enacit4r_sql.utils.query import QueryBuilder
+from test_query import Article, Author, as_sql
+
+def test_flatten():
+    assert normalize_filter({"$and": [{"stars": 1}, {"$and": [{"title": "Drone"}, {"$and": [{"id": {"$gt": 3}}]}]}]}) == \
+        {"$and": [{"id": {"$gt": 3}}, {"stars": 1}, {"title": "Drone"}]}
+    assert normalize_filter({"$or": [{"$or": [{"stars": {"$gt": 3}}, {"title": {"$like": "Drone"}}]}, {"id": {"$lt": 3}}]}) == \
+        {"$or": [{"id": {"$lt": 3}}, {"stars": {"$gt": 3}}, {"title": {"$like": "Drone"}}]}
+
+def test_unwrap_single_child():
+    assert normalize_filter({"$or": [{"stars": {"$gt": 3}}]}) == {"stars": {"$gt": 3}}
+    assert normalize_filter({"$and": [{"$or": [{"$and": [{"title": {"$ilike": "drone"}}]}]}]}) == {"title": {"$ilike": "drone"}}
+
+def test_dedup():
+    assert normalize_filter({"$and": [{"title": {"$ilike": "drone"}}, {"title": {"$ilike": "drone"}}]}) == {"title": {"$ilike": "drone"}}
+
+def test_merge_or_equalities():
+    assert normalize_filter({"$or": [{"stars": 1}, {"stars": {"$eq": 2}}, {"stars": [3, 1]}, {"title": "Drone"}]}) == \
+        {"$or": [{"stars": [1, 2, 3]}, {"title": "Drone"}]}
+    assert normalize_filter({"$or": [{"title": "Drone"}, {"title": None}]}) == {"title": ["Drone", None]}
+    assert normalize_filter({"stars": {"$in": [2]}}) == {"stars": 2}
+
+def test_intersect_and_equalities():
+    assert normalize_filter({"stars": [1, 2], "$and": [{"stars": [2, 3]}]}) == {"stars": 2}
+    assert normalize_filter({"stars": 1, "$and": [{"stars": 2}]}) == FALSE_FILTER
+
+def test_fold_constants():
+    assert normalize_filter({}) == {}
+    assert normalize_filter({"$and": []}) == {}
+    assert normalize_filter({"stars": {"$in": []}, "title": "Drone"}) == FALSE_FILTER
+    assert normalize_filter({"$or": [{"stars": {"$in": []}}, {"title": "Drone"}]}) == {"title": "Drone"}
+    assert normalize_filter({"$or": [{"stars": {"$nin": []}}, {"title": "Drone"}]}) == {}
+    assert normalize_filter({"$or": [{"title": {"$exists": True}}, {"title": {"$exists": False}}], "stars": 1}) == {"stars": 1}
+
+def test_keep_semantics():
+    # $in does not match null, unlike a list value
+    assert normalize_filter({"title": {"$in": ["Drone", None]}}) == {"title": {"$in": ["Drone", None]}}
+    # booleans are not merged with integers
+    assert normalize_filter({"$or": [{"stars": True}, {"stars": 1}]}) == {"$or": [{"stars": 1}, {"stars": True}]}
+
+def test_canonical_form():
+    filter1 = {"$or": [{"title": "Robot"}, {"title": "Drone"}], "stars": {"$gt": 1}}
+    filter2 = {"$and": [{"stars": {"$gt": 1}}, {"$or": [{"title": ["Drone"]}, {"$or": [{"title": "Robot"}]}]}]}
+    assert normalize_filter(filter1) == normalize_filter(filter2)
+
+def test_normalize_join():
+    filter = {"stars": 1, "$author": {"$and": [{"name": "John"}, {"$or": [{"name": "John"}]}]}}
+    assert normalize_filter(filter, {"$author": Author}) == {"stars": 1, "$author": {"name": "John"}}
+    assert normalize_filter({"stars": 1, "$author": {"name": {"$in": []}}}, {"$author": Author}) == FALSE_FILTER
+
+def test_normalized_query():
+    builder = QueryBuilder(Article, {"$and": [{"id": 1}, {"$or": [{"stars": 1}, {"stars": 2}]}]}, [], [], normalize=True)
+    start, end, query = builder.build_query(1)
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE article.id = :id_1 AND article.stars IN (__[POSTCOMPILE_stars_1])"
+
+def test_normalized_results(engine):
+    filters = [
+        {"$or": [{"stars": 1}, {"stars": {"$eq": 2}}, {"$and": [{"title": {"$like": "Drone"}}, {"title": {"$like": "Drone"}}]}]},
+        {"stars": [1, 2, None], "$and": [{"stars": [2, 3]}, {"$or": [{"id": {"$gt": 5}}]}]},
+        {"stars": 1, "$and": [{"stars": 2}]},
+        {"$or": [{"stars": {"$in": []}}, {"title": {"$exists": False}}, {"title": {"$exists": True}}]},
+        {"$or": [{"title": "Drone 1"}, {"title": None}, {"id": 3}]},
+    ]
+    with Session(engine) as session:
+        for filter in filters:
+            expected = session.exec(QueryBuilder(Article, filter, ["id"], []).build_query(0)[2]).all()
+            found = session.exec(QueryBuilder(Article, filter, ["id"], [], normalize=True).build_query(0)[2]).all()
+            assert [a.id for a in found] == [a.id for a in expected]
@@ -0,0 +1,52 @@
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session
+from enacit4r_sql.utils.query import QueryBuilder, ValidationError
+from enacit4r_sql.utils.explain import Explain
+from enacit4r_sql.utils.plan import explain, analyze_plan, PlanSampler
+from test_query import Article, Author, as_sql
+
+def test_explain_analyze_query():
+    builder = QueryBuilder(Article, {"stars": 1}, [], [])
+    sql = as_sql(Explain(builder.build_count_query(), analyze=True).compile(dialect=postgresql.dialect()))
+    assert sql.startswith("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) SELECT count(distinct(article.id))")
+
+def test_explain_sqlite(engine):
+    with Session(engine) as session:
+        summary = explain(session, QueryBuilder(Article, {"stars": {"$gte": 1}, "title": {"$ilike": "drone"}}, ["title"], [0, 9]))
+    assert summary.dialect == "sqlite"
+    assert [(issue.kind, issue.relation, issue.criteria) for issue in summary.issues] == \
+        [("seq_scan", "article", ["stars $gte", "title $ilike"]), ("sort_spill", None, [])]
+    try:
+        explain(None, QueryBuilder(Article, {}, [], []), kind="ids")
+        assert False
+    except ValidationError:
+        pass
+
+def test_analyze_postgresql_plan():
+    plan = [{"Plan": {"Node Type": "Sort", "Sort Key": ["article.title"], "Sort Method": "external merge", "Sort Space Used": 5000, "Sort Space Type": "Disk",
+                      "Actual Rows": 20000, "Actual Loops": 1, "Plans": [
+        {"Node Type": "Nested Loop", "Actual Rows": 20000, "Actual Loops": 1, "Plans": [
+            {"Node Type": "Seq Scan", "Relation Name": "article", "Actual Rows": 20000, "Actual Loops": 1,
+             "Filter": "(stars >= 1)", "Rows Removed by Filter": 80000},
+            {"Node Type": "Index Scan", "Relation Name": "author", "Index Cond": "(article_id = article.id)", "Actual Rows": 1, "Actual Loops": 20000}]}]}}]
+    builder = QueryBuilder(Article, {"stars": {"$gte": 1}, "title": {"$ilike": "drone"}, "$author": {"name": "John"}}, ["title"], [],
+                           joinModels={"$author": Author}, joinMode="join")
+    summary = analyze_plan(plan, builder, "postgresql")
+    assert [(issue.kind, issue.relation, issue.rows, issue.criteria) for issue in summary.issues] == [
+        ("sort_spill", "article", 20000, []),
+        ("nested_loop", "author", 20000, ["name $eq"]),
+        ("seq_scan", "article", 100000, ["stars $gte"]),
+        ("rows_removed", "article", 80000, ["stars $gte"]),
+    ]
+
+def test_plan_sampler(engine):
+    summaries = []
+    sampler = PlanSampler(threshold=0, callback=summaries.append)
+    with Session(engine) as session:
+        assert sampler.execute(session, QueryBuilder(Article, {"stars": 1}, [], []), kind="count") == 4
+        assert len(sampler.execute(session, QueryBuilder(Article, {"stars": 1}, [], []), fields=["title"])) == 4
+    assert len(sampler.samples) == 2 and summaries[0].kind == "count" and summaries[0].duration >= 0
+    sampler = PlanSampler(threshold=10)
+    with Session(engine) as session:
+        sampler.execute(session, QueryBuilder(Article, {}, [], []))
+    assert len(sampler.samples) == 0
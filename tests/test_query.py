@@ -1,7 +1,10 @@
+from datetime import date, datetime
 from typing import List, Optional
-from sqlmodel import SQLModel, Field, Relationship, Column
+from sqlmodel import SQLModel, Field, Relationship, Column, Session
 from sqlalchemy.dialects.postgresql import JSONB as JSON
-from enacit4r_sql.utils.query import QueryBuilder
+from sqlalchemy.dialects import postgresql
+from enacit4r_sql.utils.query import QueryBuilder, ValidationError, encode_cursor, decode_cursor
+from enacit4r_sql.utils.cache import StatementCache
 
 class Author(SQLModel, table=True):
     id: Optional[int] = Field(primary_key=True)
@@ -47,7 +50,7 @@ def test_empty_query_with_sort():
     start, end, query = builder.build_query(1)
     assert query is not None
     #print(as_sql(query))
-    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article ORDER BY article.title DESC"
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article ORDER BY article.title DESC, article.id DESC"
 
 def test_empty_query_with_range():
     builder = QueryBuilder(Article, {}, [], [0, 9])
@@ -155,6 +158,44 @@ def test_ilike_query():
     #print(as_sql(query))
     assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE lower(article.title) LIKE lower(:title_1)"
 
+def test_anchored_queries():
+    builder = QueryBuilder(Article, {"title": { "$startswith": "Dro" }}, [], [])
+    start, end, query = builder.build_query(1)
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE article.title LIKE :title_1 ESCAPE '/'"
+    assert query.compile().params["title_1"] == "Dro%"
+    builder = QueryBuilder(Article, {"title": { "$istartswith": "dro" }}, [], [])
+    start, end, query = builder.build_query(1)
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE lower(article.title) LIKE lower(:title_1) ESCAPE '/'"
+    # not ILIKE, to use the lower(title) text_pattern_ops index
+    assert as_sql(query.compile(dialect=postgresql.dialect())) == "SELECT article.id, article.title, article.stars FROM article WHERE lower(article.title) LIKE lower(%(title_1)s) ESCAPE '/'"
+    builder = QueryBuilder(Article, {"title": { "$endswith": "50%_/" }}, [], [])
+    start, end, query = builder.build_query(1)
+    assert query.compile().params["title_1"] == "%50/%/_//"
+
+def test_search_query():
+    builder = QueryBuilder(Article, {"title": { "$search": "drone 1" }}, [], [])
+    start, end, query = builder.build_query(1)
+    assert as_sql(query.compile(dialect=postgresql.dialect())) == "SELECT article.id, article.title, article.stars FROM article WHERE to_tsvector('simple', article.title) @@ plainto_tsquery('simple', %(param_1)s)"
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE lower(article.title) LIKE lower(:param_1) ESCAPE '/'"
+    # the statements of other search values share their compiled form
+    query = QueryBuilder(Article, {"title": { "$search": "drone" }}, [], []).build_query(1)[2]
+    other = QueryBuilder(Article, {"title": { "$search": "robot" }}, [], []).build_query(1)[2]
+    assert query._generate_cache_key().key == other._generate_cache_key().key
+    assert other.compile().params["param_1"] == "%robot%"
+
+def test_anchored_results(engine):
+    with Session(engine) as session:
+        for filter, expected in [({"$startswith": "Drone 1"}, [2, 12, 14, 16, 18, 20]),
+                                 ({"$istartswith": "robot 2"}, [3]),
+                                 ({"$endswith": "0"}, [1, 11]),
+                                 ({"$startswith": "Drone_"}, []),
+                                 ({"$search": "drone 1"}, [2, 12, 14, 16, 18, 20]),
+                                 ({"$search": "_"}, [])]:
+            for cache in [None, StatementCache()]:
+                builder = QueryBuilder(Article, {"title": filter}, ["id"], [], cache=cache)
+                start, end, query = builder.build_query(None)
+                assert [a.id for a in session.exec(query, params=builder.params).all()] == expected
+
 def test_contains_query():
     builder = QueryBuilder(Author, {"institutions": { "$contains": ["CERN", "MIT"] }}, [], [])
     start, end, query = builder.build_query(1)
@@ -238,4 +279,308 @@ def test_join_query():
 
 
 def as_sql(query):
-    return "".join(str(query).split("\n"))
\ No newline at end of file
+    return "".join(str(query).split("\n"))
+
+def test_keyset_query():
+    builder = QueryBuilder(Article, {"stars": { "$ge": 1 }}, ["title", "desc"], [0, 9])
+    query = builder.build_keyset_query()
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE article.stars >= :stars_1 ORDER BY article.title DESC, article.id DESC LIMIT :param_1"
+    query = builder.build_keyset_query(encode_cursor(["Drone", 5]))
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE article.stars >= :stars_1 AND (article.title, article.id) < (:param_1, :param_2) ORDER BY article.title DESC, article.id DESC LIMIT :param_3"
+
+def test_keyset_query_by_id():
+    builder = QueryBuilder(Article, {}, [], [0, 9])
+    query = builder.build_keyset_query(encode_cursor([5]), fields=["title"])
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.title, article.id FROM article WHERE (article.id) > (:param_1) ORDER BY article.id LIMIT :param_2"
+
+def test_invalid_keyset_cursor():
+    builder = QueryBuilder(Article, {}, ["title"], [0, 9])
+    for cursor in ["not a cursor", encode_cursor([5]), encode_cursor({"a": 1})]:
+        try:
+            builder.build_keyset_query(cursor)
+            assert False
+        except ValidationError:
+            pass
+
+def test_cursor_values():
+    values = ["a", 1, 2.5, None, date(2024, 1, 31), datetime(2024, 1, 31, 12, 30)]
+    assert decode_cursor(encode_cursor(values)) == values
+
+def test_keyset_pages(engine):
+    for sort in [["stars"], ["stars", "desc"], ["title", "desc"], []]:
+        with Session(engine) as session:
+            builder = QueryBuilder(Article, {"stars": { "$ge": 1 }}, sort, [])
+            expected = [a.id for a in session.exec(builder.build_query(0)[2].order_by(Article.id.desc() if "desc" in sort else Article.id))]
+            ids = []
+            cursor = None
+            while True:
+                builder = QueryBuilder(Article, {"stars": { "$ge": 1 }}, sort, [0, 2])
+                page, cursor = builder.keyset_page(session.exec(builder.build_keyset_query(cursor)).all())
+                ids.extend([a.id for a in page])
+                if cursor is None:
+                    break
+            assert ids == expected
+
+def test_cached_keyset_pages(engine):
+    cache = StatementCache()
+    with Session(engine) as session:
+        for size in [3, 10]:
+            builder = QueryBuilder(Article, {"stars": {"$ge": 1}}, ["id"], [0, size - 1], cache=cache)
+            page, cursor = builder.keyset_page(session.exec(builder.build_keyset_query(), params=builder.params).all())
+            assert len(page) == size
+            assert cursor is not None
+    assert len(cache) == 1
+
+def test_page_query():
+    builder = QueryBuilder(Article, {"stars": { "$ge": 1 }}, ["title", "desc"], [0, 9])
+    start, end, query = builder.build_page_query()
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars, count(*) OVER () AS total_count FROM article WHERE article.stars >= :stars_1 ORDER BY article.title DESC, article.id DESC LIMIT :param_1 OFFSET :param_2"
+
+def test_page_join_query():
+    builder = QueryBuilder(Article, {"$author": {"name": {"$ilike": "john"}}}, [], [], joinModels={"$author": Author}, joinMode="join")
+    start, end, query = builder.build_page_query(fields=["title"])
+    #print(as_sql(query))
+    assert as_sql(query) == "WITH filtered_ids AS (SELECT DISTINCT article.id AS id FROM article JOIN author ON article.id = author.article_id WHERE lower(author.name) LIKE lower(:name_1)) SELECT article.title, count(*) OVER () AS total_count FROM article WHERE article.id IN (SELECT filtered_ids.id FROM filtered_ids)"
+    # the join cannot be added by the caller
+    builder = QueryBuilder(Article, {"$author": {"name": {"$ilike": "john"}}}, [], [], joinModels={"$author": Author})
+    try:
+        builder.build_page_query(fields=["title"])
+        assert False
+    except ValidationError:
+        pass
+
+def test_page_results(engine):
+    with Session(engine) as session:
+        for range_ in [[0, 4], [10, 14], [], [50, 59]]:
+            builder = QueryBuilder(Article, {"stars": { "$ge": 1 }}, ["title"], range_)
+            total_count = session.exec(builder.build_count_query()).one()
+            start, expected_end, query = builder.build_query(total_count)
+            expected = session.exec(query).all()
+            start, end, query = builder.build_page_query()
+            rows = session.exec(query).all()
+            if len(rows) or not start:
+                result, items = builder.make_list_result(rows)
+            else:
+                result, items = builder.make_list_result(rows, total_count=total_count)
+            assert result.total == total_count
+            assert result.skip == start
+            assert result.limit == expected_end
+            assert [a.id for a in items] == [a.id for a in expected]
+        builder = QueryBuilder(Article, {"id": 1}, [], [0, 4])
+        result, items = builder.make_list_result(session.exec(builder.build_page_query(fields=["title", "stars"])[2]).all())
+        assert result.total == 1
+        assert items == [("Robot 0", 0)]
+        builder = QueryBuilder(Article, {}, [], [50, 59])
+        rows = session.exec(builder.build_page_query(fields=["title", "stars"])[2]).all()
+        result, items = builder.make_list_result(rows, total_count=16)
+        assert items == []
+        try:
+            builder.make_list_result(rows)
+            assert False
+        except ValueError:
+            pass
+
+def test_auto_join_query():
+    builder = QueryBuilder(Article, {"$author": {"name": {"$ilike": "john"}}}, ["title"], [], joinModels={"$author": Author}, joinMode="join")
+    start, end, query = builder.build_query(1)
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE article.id IN (SELECT article.id FROM article JOIN author ON article.id = author.article_id WHERE lower(author.name) LIKE lower(:name_1)) ORDER BY article.title, article.id"
+    query = builder.build_count_query()
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT count(distinct(article.id)) AS count_1 FROM article JOIN author ON article.id = author.article_id WHERE lower(author.name) LIKE lower(:name_1)"
+
+def test_exists_join_query():
+    builder = QueryBuilder(Article, {"stars": 1, "$author": {"name": {"$ilike": "john"}, "email": "john@doe.com"}}, [], [], joinModels={"$author": Author}, joinMode="exists")
+    start, end, query = builder.build_query(1)
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE article.stars = :stars_1 AND (EXISTS (SELECT 1 FROM author WHERE article.id = author.article_id AND lower(author.name) LIKE lower(:name_1) AND author.email = :email_1))"
+    query = builder.build_count_query()
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT count(article.id) AS count_1 FROM article WHERE article.stars = :stars_1 AND (EXISTS (SELECT 1 FROM author WHERE article.id = author.article_id AND lower(author.name) LIKE lower(:name_1) AND author.email = :email_1))"
+
+def test_reverse_join_query():
+    builder = QueryBuilder(Author, {"$article": {"stars": {"$gt": 3}}}, [], [], joinModels={"$article": Article}, joinMode="exists")
+    start, end, query = builder.build_query(1)
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT author.id, author.name, author.email, author.institutions, author.article_id FROM author WHERE EXISTS (SELECT 1 FROM article WHERE article.id = author.article_id AND article.stars > :stars_1)"
+
+def test_exists_join_fields_query():
+    # the join model of the filter is also outer joined for its fields
+    builder = QueryBuilder(Author, {"$article": {"stars": {"$gt": 3}}}, ["name"], [0, 9], joinModels={"$article": Article}, joinMode="exists")
+    exists = "EXISTS (SELECT 1 FROM article WHERE article.id = author.article_id AND article.stars > :stars_1)"
+    start, end, query = builder.build_query(None, ["name", "$article.title"])
+    assert as_sql(query) == ("SELECT author.name, article.title AS \"$article.title\" FROM author LEFT OUTER JOIN article ON article.id = author.article_id "
+                             f"WHERE {exists} ORDER BY author.name, author.id LIMIT :param_1 OFFSET :param_2")
+    start, end, query = builder.build_page_query(["name", "$article.title"])
+    assert f"FROM author LEFT OUTER JOIN article ON article.id = author.article_id WHERE {exists}" in as_sql(query)
+
+def test_invalid_join_mode():
+    try:
+        QueryBuilder(Article, {}, [], [], joinMode="cross")
+        assert False
+    except ValidationError:
+        pass
+
+def test_id_operator_query():
+    builder = QueryBuilder(Article, {"id": { "$in": [1, 2] }}, [], [])
+    start, end, query = builder.build_query(1)
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE article.id IN (__[POSTCOMPILE_id_1])"
+
+def test_multi_sort_query():
+    builder = QueryBuilder(Article, {}, [["stars", "desc", "last"], ["title", "asc", "first"]], [])
+    start, end, query = builder.build_query(1)
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article ORDER BY article.stars DESC NULLS LAST, article.title ASC NULLS FIRST, article.id DESC"
+    builder = QueryBuilder(Article, {}, [["stars"], ["id", "desc"]], [])
+    start, end, query = builder.build_query(1)
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article ORDER BY article.stars, article.id DESC"
+
+def test_join_sort_query():
+    builder = QueryBuilder(Article, {}, [["$author.name", "desc"]], [], joinModels={"$author": Author})
+    start, end, query = builder.build_query(1)
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article ORDER BY (SELECT max(author_1.name) AS max_1 FROM author AS author_1 WHERE article.id = author_1.article_id) DESC, article.id DESC"
+
+def test_join_sort_and_filter_query():
+    filter = {"$author": {"name": "John"}}
+    builder = QueryBuilder(Article, filter, [["$author.name", "desc"]], [], joinModels={"$author": Author}, joinMode="join")
+    start, end, query = builder.build_query(1, ["title"])
+    #print(as_sql(query))
+    assert as_sql(query) == ("SELECT article.title FROM article WHERE article.id IN (SELECT article.id FROM article JOIN author ON article.id = author.article_id WHERE author.name = :name_1) "
+                             "ORDER BY (SELECT max(author_1.name) AS max_1 FROM author AS author_1 WHERE article.id = author_1.article_id) DESC, article.id DESC")
+    # joined by the caller
+    builder = QueryBuilder(Article, filter, [["$author.name", "desc"]], [], joinModels={"$author": Author})
+    start, end, query = builder.build_query(1)
+    query = query.join(Author, Article.id == Author.article_id)
+    assert as_sql(query) == ("SELECT article.id, article.title, article.stars FROM article JOIN author ON article.id = author.article_id WHERE author.name = :name_1 "
+                             "ORDER BY (SELECT max(author_1.name) AS max_1 FROM author AS author_1 WHERE article.id = author_1.article_id) DESC, article.id DESC")
+
+def test_multi_sort_keyset_query():
+    builder = QueryBuilder(Article, {}, [["stars", "desc"], ["title", "desc"]], [0, 9])
+    query = builder.build_keyset_query(encode_cursor([1, "Drone", 5]))
+    #print(as_sql(query))
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE (article.stars, article.title, article.id) < (:param_1, :param_2, :param_3) ORDER BY article.stars DESC, article.title DESC, article.id DESC LIMIT :param_4"
+    for sort in [[["stars", "desc"], ["title", "asc"]], [["stars", "desc", "last"]]]:
+        try:
+            QueryBuilder(Article, {}, sort, [0, 9]).build_keyset_query()
+            assert False
+        except ValidationError:
+            pass
+
+def test_nullable_keyset_query():
+    try:
+        QueryBuilder(Author, {}, ["article_id"], [0, 9]).build_keyset_query(encode_cursor([None, 5]))
+        assert False
+    except ValidationError as e:
+        assert "not nullable: article_id" in str(e)
+    QueryBuilder(Author, {}, ["email"], [0, 9]).build_keyset_query()
+
+def test_multi_sort_results(engine):
+    with Session(engine) as session:
+        builder = QueryBuilder(Article, {}, [["stars", "desc"], ["title"]], [0, 4])
+        articles = session.exec(builder.build_query(20)[2]).all()
+        assert [(a.stars, a.title) for a in articles] == [(4, "Drone 19"), (4, "Drone 9"), (4, "Robot 14"), (4, "Robot 4"), (3, "Drone 13")]
+
+def test_facets_query():
+    builder = QueryBuilder(Author, {"institutions": {"$contains": ["EPFL"]}}, [], [])
+    query = builder.build_facets_query(["institutions", "name"], exclude_own=True)
+    sql = as_sql(query.compile(dialect=postgresql.dialect()))
+    assert "CAST(institutions_value AS VARCHAR) AS value" in sql
+    assert "FROM author, jsonb_array_elements_text(author.institutions) AS institutions_value" in sql
+    assert sql.startswith("WITH facet_ids_0 AS (SELECT DISTINCT author.id AS id FROM author), facet_ids_1 AS (SELECT DISTINCT author.id AS id FROM author WHERE (author.institutions @> %(institutions_1)s::JSONB))")
+    assert "WHERE author.id IN (SELECT facet_ids_0.id FROM facet_ids_0) GROUP BY CAST(institutions_value AS VARCHAR) UNION ALL" in sql
+    try:
+        builder.build_facets_query(["unknown"])
+        assert False
+    except ValidationError:
+        pass
+
+def test_facets_join_query():
+    builder = QueryBuilder(Article, {"$author": {"name": "John"}}, [], [], joinModels={"$author": Author}, joinMode="join")
+    query = builder.build_facets_query(["stars"])
+    #print(as_sql(query))
+    assert as_sql(query) == ("WITH facet_ids_0 AS (SELECT DISTINCT article.id AS id FROM article JOIN author ON article.id = author.article_id WHERE author.name = :name_1) "
+                             "SELECT :param_1 AS facet, CAST(article.stars AS VARCHAR) AS value, count(distinct(article.id)) AS count FROM article "
+                             "WHERE article.id IN (SELECT facet_ids_0.id FROM facet_ids_0) GROUP BY CAST(article.stars AS VARCHAR)")
+    # the join cannot be added by the caller
+    builder = QueryBuilder(Article, {"$author": {"name": "John"}}, [], [], joinModels={"$author": Author})
+    try:
+        builder.build_facets_query(["stars"])
+        assert False
+    except ValidationError:
+        pass
+
+def test_facets_results(engine):
+    with Session(engine) as session:
+        builder = QueryBuilder(Article, {"stars": [1, 2], "$and": [{"title": {"$startswith": "Drone"}}]}, [], [])
+        rows = session.exec(builder.build_facets_query(["stars", "title"])).all()
+        facets = builder.make_facets(rows)
+        assert facets["stars"] == {1: 2, 2: 2}
+        assert sorted(facets["title"].items()) == [("Drone 1", 1), ("Drone 11", 1), ("Drone 17", 1), ("Drone 7", 1)]
+        rows = session.exec(builder.build_facets_query(["stars", "title"], exclude_own=True)).all()
+        facets = builder.make_facets(rows)
+        assert facets["stars"] == {0: 2, 1: 2, 2: 2, 3: 2, 4: 2}
+        assert sorted(facets["title"]) == ["Drone 1", "Drone 11", "Drone 17", "Drone 7", "Robot 12", "Robot 16", "Robot 2", "Robot 6"]
+
+def test_related_fields_query():
+    builder = QueryBuilder(Author, {}, [], [], joinModels={"$article": Article})
+    start, end, query = builder.build_query(None, ["name", "$article.title"])
+    assert as_sql(query) == 'SELECT author.name, article.title AS "$article.title" FROM author LEFT OUTER JOIN article ON article.id = author.article_id'
+    # joined by the caller
+    builder = QueryBuilder(Author, {"$article": {"stars": 1}}, [], [], joinModels={"$article": Article})
+    start, end, query = builder.build_query(None, ["name", "article.title"])
+    assert as_sql(query) == 'SELECT author.name, article.title AS "article.title" FROM author, article WHERE article.stars = :stars_1'
+    # joined by the filter
+    builder = QueryBuilder(Author, {"$article": {"stars": 1}}, [], [], joinModels={"$article": Article}, joinMode="join")
+    start, end, query = builder.build_query(None, ["name", "article.title"])
+    assert as_sql(query) == ('SELECT author.name, article.title AS "article.title" FROM author LEFT OUTER JOIN article ON article.id = author.article_id '
+                             'WHERE author.id IN (SELECT author.id FROM author JOIN article ON article.id = author.article_id WHERE article.stars = :stars_1)')
+    start, end, query = builder.build_page_query(["name", "$article.title"])
+    assert "LEFT OUTER JOIN article ON article.id = author.article_id WHERE author.id IN (SELECT filtered_ids.id FROM filtered_ids)" in as_sql(query)
+    for field in ["$book.name", "article.unknown"]:
+        try:
+            builder.build_query(None, [field])
+            assert False
+        except ValidationError:
+            pass
+
+def test_one_to_many_fields_query():
+    # the rows would be multiplied by the related rows
+    builder = QueryBuilder(Article, {}, [], [], joinModels={"$author": Author})
+    for field in ["$author.name", "authors.name"]:
+        try:
+            builder.build_page_query(["title", field])
+            assert False
+        except ValidationError:
+            pass
+
+def test_load_options_query():
+    builder = QueryBuilder(Author, {}, [], [], loadOptions={"load_only": ["name"]})
+    start, end, query = builder.build_query(None)
+    assert as_sql(query) == "SELECT author.id, author.name FROM author"
+    builder = QueryBuilder(Author, {}, [], [], loadOptions={"defer": ["institutions", "email"]}, cache=StatementCache())
+    start, end, query = builder.build_query(None)
+    assert as_sql(query) == "SELECT author.id, author.name, author.article_id FROM author"
+    builder = QueryBuilder(Article, {}, [], [], loadOptions={"selectinload": ["authors"]})
+    start, end, query = builder.build_query(None)
+    assert len(query._with_options) == 1
+    for loadOptions in [{"joinedload": ["article"]}, {"selectinload": ["name"]}, {"defer": ["article"]}]:
+        try:
+            QueryBuilder(Author, {}, [], [], loadOptions=loadOptions)
+            assert False
+        except ValidationError:
+            pass
+
+def test_load_options_results(engine):
+    with Session(engine) as session:
+        builder = QueryBuilder(Article, {"stars": 1}, ["id"], [0, 0], loadOptions={"defer": ["title"]})
+        start, end, query = builder.build_query(None)
+        article = session.exec(query).one()
+        assert "title" not in article.__dict__
+        assert article.title == "Drone 1"
@@ -0,0 +1,122 @@
+import asyncio
+import sqlite3
+import time
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlmodel import Session, create_engine, select
+from enacit4r_sql.utils.query import QueryBuilder
+from enacit4r_sql.utils.replicas import ReplicaRouter
+from test_query import Article
+
+
+def make_engine(path, stars):
+    engine = create_engine(f"sqlite:///{path}")
+    Article.__table__.create(engine)
+    with Session(engine) as session:
+        session.add(Article(id=1, title="Drone", stars=stars))
+        session.commit()
+    return engine
+
+@pytest.fixture
+def engines(tmp_path):
+    # the stars tell the databases apart
+    engines = [make_engine(tmp_path / f"db{i}.db", i) for i in range(3)]
+    yield engines
+    for engine in engines:
+        engine.dispose()
+
+def read_stars(router, key=None):
+    with router.read(key) as engine:
+        with Session(engine) as session:
+            return session.exec(select(Article.stars).where(Article.id == 1)).one()
+
+def test_round_robin(engines):
+    router = ReplicaRouter(engines[0], engines[1:])
+    assert [read_stars(router) for _ in range(4)] == [1, 2, 1, 2]
+    stats = router.stats()
+    assert [s["requests"] for s in stats] == [0, 2, 2]
+    assert stats[1]["healthy"] and stats[1]["outstanding"] == 0 and stats[1]["mean_duration"] >= 0
+    assert "checkedout" in stats[1]["pool"]
+
+def test_least_outstanding(engines):
+    router = ReplicaRouter(engines[0], engines[1:], strategy="least_outstanding")
+    with router.read() as first:
+        with router.read() as second:
+            assert {first, second} == set(engines[1:])
+    with pytest.raises(ValueError):
+        ReplicaRouter(engines[0], engines[1:], strategy="random")
+
+def refuse_connections(engine):
+    def do_connect(dialect, conn_rec, cargs, cparams):
+        raise sqlite3.OperationalError("unable to open database file")
+    engine.dispose()
+    event.listen(engine, "do_connect", do_connect)
+
+def test_ejection(engines):
+    router = ReplicaRouter(engines[0], engines[1:], max_failures=2)
+    # errors of the queries (here a ProgrammingError) do not eject the replicas
+    for _ in range(4):
+        with pytest.raises(DBAPIError):
+            with router.read() as engine:
+                with Session(engine) as session:
+                    session.exec(text("SELECT * FROM article WHERE id = :id"), params={"id": [1]})
+    assert [s["healthy"] for s in router.stats()] == [True, True, True]
+    assert [s["failures"] for s in router.stats()] == [0, 0, 0]
+    for engine in engines[1:]:
+        refuse_connections(engine)
+    for _ in range(4):
+        with pytest.raises(OperationalError):
+            read_stars(router)
+    assert [s["healthy"] for s in router.stats()] == [True, False, False]
+    assert [s["failures"] for s in router.stats()] == [0, 2, 2]
+    # reads go to the primary
+    assert read_stars(router) == 0
+
+def test_read_your_writes(engines):
+    router = ReplicaRouter(engines[0], engines[1:2], sticky_seconds=60)
+    with Session(engines[0]) as session:
+        router.track(session)
+        session.info["replica_key"] = "user1"
+        session.add(Article(id=2, title="Robot", stars=0))
+        session.commit()
+    assert read_stars(router, "user1") == 0
+    assert read_stars(router, "user2") == 1
+    router.mark_written()
+    assert read_stars(router, "user2") == 0
+
+def test_async_timeout_ejection(engines):
+    router = ReplicaRouter(engines[0], engines[1:2], max_failures=1)
+    with pytest.raises(asyncio.TimeoutError):
+        with router.read() as engine:
+            raise asyncio.TimeoutError()
+    assert [s["healthy"] for s in router.stats()] == [True, False]
+
+def test_sticky_keys_expire(engines):
+    router = ReplicaRouter(engines[0], engines[1:2], sticky_seconds=0.05)
+    for i in range(100):
+        router.mark_written(f"user{i}")
+    assert router.choose("user1") is engines[0]
+    time.sleep(0.06)
+    router.mark_written("user100")
+    # the expired keys are dropped
+    assert list(router._sticky) == ["user100"]
+    assert router.choose("user1") is engines[1]
+
+def test_runner_with_router(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from enacit4r_sql.utils.runner import AsyncQueryRunner
+    for i in range(2):
+        make_engine(tmp_path / f"db{i}.db", i).dispose()
+
+    async def run():
+        engines = [create_async_engine(f"sqlite+aiosqlite:///{tmp_path / f'db{i}.db'}") for i in range(2)]
+        router = ReplicaRouter(engines[0], engines[1:])
+        result, items = await AsyncQueryRunner(router).list(QueryBuilder(Article, {}, [], []))
+        assert result.total == 1 and items[0].stars == 1
+        assert [s["requests"] for s in router.stats()] == [0, 2]
+        for engine in engines:
+            await engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,90 @@
+import time
+from threading import Lock
+from sqlalchemy import update
+from sqlmodel import Session
+from enacit4r_sql.utils.query import QueryBuilder
+from enacit4r_sql.utils.results import ResultCache, MemoryBackend, SharedMemoryBackend
+from test_query import Article, Author
+
+def make_builder():
+    return QueryBuilder(Article, {"stars": 1}, ["id"], [0, 1])
+
+def test_list_cached(engine):
+    cache = ResultCache()
+    with Session(engine) as session:
+        result, items = cache.list(session, make_builder())
+        assert (result.total, result.skip, result.limit) == (4, 0, 1)
+        assert [item.id for item in items] == [2, 7]
+        assert cache.stats() == {"hits": 0, "misses": 2}
+        result, items = cache.list(session, make_builder())
+        assert (result.total, [item.id for item in items], [item.title for item in items]) == (4, [2, 7], ["Drone 1", "Robot 6"])
+        assert isinstance(items[0], Article)
+        assert cache.stats() == {"hits": 2, "misses": 2}
+        result, items = cache.list(session, make_builder(), fields=["title"])
+        assert items == [("Drone 1",), ("Robot 6",)]
+        assert cache.list(session, make_builder(), fields=["title"])[1] == items
+        # equivalent filter
+        assert cache.count(session, QueryBuilder(Article, {"$and": [{"stars": {"$eq": 1}}]}, [], [])) == 4
+        assert cache.stats() == {"hits": 6, "misses": 3}
+
+def test_invalidation(engine):
+    cache = ResultCache()
+    with Session(engine) as session:
+        cache.listen(session)
+        assert cache.count(session, make_builder()) == 4
+        session.add(Article(id=21, title="Drone 20", stars=1))
+        session.commit()
+        assert cache.count(session, make_builder()) == 5
+        session.execute(update(Article).where(Article.id == 21).values(stars=2))
+        session.commit()
+        assert cache.count(session, make_builder()) == 4
+        assert cache.stats() == {"hits": 0, "misses": 3}
+    cache.invalidate("article")
+    with Session(engine) as session:
+        assert cache.count(session, make_builder()) == 4
+    assert cache.stats() == {"hits": 0, "misses": 4}
+
+def test_memory_backend():
+    backend = MemoryBackend(maxsize=2)
+    backend.incr("version")
+    backend.set("a", 1)
+    backend.set("b", 2, ttl=0.01)
+    backend.set("c", 3)
+    assert (backend.get("a"), backend.get("c"), backend.get("version")) == (None, 3, 1)
+    time.sleep(0.02)
+    assert backend.get("b") is None
+
+def test_shared_memory_backend():
+    mapping = {}
+    backend = SharedMemoryBackend(mapping, Lock(), maxsize=3)
+    assert backend.incr("version") == 1
+    for key in ["a", "b", "c"]:
+        backend.set(key, key, ttl=60)
+    assert sorted(mapping) == ["b", "c", "version"]
+    backend.set("d", "d", ttl=0)
+    backend.set("e", "e", ttl=60)
+    assert sorted(mapping) == ["c", "e", "version"]
+    assert (backend.get("e"), backend.get("version")) == ("e", 1)
+    # entries without expiry are evicted too
+    backend.set("f", "f")
+    backend.set("g", "g")
+    assert sorted(mapping) == ["f", "g", "version"]
+    assert backend.incr("version") == 2
+
+def test_related_tables():
+    cache = ResultCache()
+    builder = QueryBuilder(Author, {}, [["$article.stars", "desc"]], [], joinModels={"$article": Article})
+    key = cache._make_key("page", QueryBuilder(Author, {}, ["id"], []), ["name", "article.title"])
+    sort_key = cache._make_key("page", builder)
+    cache.invalidate("article")
+    # the versions of the tables of the related fields and of the sort
+    assert cache._make_key("page", QueryBuilder(Author, {}, ["id"], []), ["name", "article.title"]) != key
+    assert cache._make_key("page", builder) != sort_key
+
+def test_load_options(engine):
+    cache = ResultCache()
+    with Session(engine) as session:
+        result, items = cache.list(session, QueryBuilder(Article, {"stars": 1}, ["id"], [0, 1], loadOptions={"defer": ["title"]}))
+        result, items = cache.list(session, make_builder())
+        assert [item.title for item in items] == ["Drone 1", "Robot 6"]
+        assert cache.stats() == {"hits": 1, "misses": 3}
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from enacit4r_sql.utils.query import QueryBuilder, ValidationError
+from enacit4r_sql.utils.cache import StatementCache
+from enacit4r_sql.utils.runner import AsyncQueryRunner
+from test_query import Article, Author
+
+pytest.importorskip("aiosqlite")
+
+
+def test_list_with_engine(db_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        runner = AsyncQueryRunner(engine)
+        result, items = await runner.list(QueryBuilder(Article, {"stars": { "$ge": 1 }}, ["id", "desc"], [0, 4]))
+        assert result.total == 16
+        assert result.skip == 0
+        assert result.limit == 4
+        assert [a.id for a in items] == [20, 19, 18, 17, 15]
+        result, items = await runner.list(QueryBuilder(Article, {"stars": { "$ge": 1 }}, ["id"], [], cache=StatementCache()), fields=["title"])
+        assert result.total == 16
+        assert result.limit == 16
+        assert items[0].title == "Drone 1"
+        result, items = await runner.list(QueryBuilder(Article, {}, [], [0, 4]), count_strategy="capped", cap=10)
+        assert result.total == 10
+        assert result.is_estimate
+        await engine.dispose()
+    asyncio.run(run())
+
+def test_list_with_session(db_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        async with AsyncSession(engine) as session:
+            runner = AsyncQueryRunner(session)
+            result, items = await runner.list(QueryBuilder(Article, {"title": { "$like": "Robot" }}, [], [0, 4]))
+            assert result.total == 10
+            assert len(items) == 5
+            assert await runner.count(QueryBuilder(Article, {}, [], [])) == (20, False, "exact")
+        await engine.dispose()
+    asyncio.run(run())
+
+def test_list_timeout(db_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        runner = AsyncQueryRunner(engine, timeout=0)
+        with pytest.raises(asyncio.TimeoutError):
+            await runner.list(QueryBuilder(Article, {}, [], []))
+        # connections were released
+        result, items = await AsyncQueryRunner(engine, timeout=10).list(QueryBuilder(Article, {}, [], []))
+        assert result.total == 20
+        assert engine.pool.checkedout() == 0
+        await engine.dispose()
+    asyncio.run(run())
+
+def test_stream(db_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        runner = AsyncQueryRunner(engine)
+        sizes = [len(batch) async for batch in runner.stream(QueryBuilder(Article, {"stars": { "$ge": 1 }}, [], []), batch_size=5)]
+        assert sizes == [5, 5, 5, 1]
+        titles = [row.title async for batch in runner.stream(QueryBuilder(Article, {"id": 2}, [], []), fields=["title"]) for row in batch]
+        assert titles == ["Drone 1"]
+        await engine.dispose()
+    asyncio.run(run())
+
+def test_join_model_without_join_mode(db_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        runner = AsyncQueryRunner(engine)
+        # the join cannot be added by the caller
+        builder = QueryBuilder(Article, {"$author": {"name": "John"}}, [], [], joinModels={"$author": Author})
+        with pytest.raises(ValidationError, match="A join mode is required"):
+            await runner.list(builder)
+        with pytest.raises(ValidationError, match="A join mode is required"):
+            await runner.count(builder)
+        with pytest.raises(ValidationError, match="A join mode is required"):
+            [batch async for batch in runner.stream(builder)]
+        await engine.dispose()
+    asyncio.run(run())
@@ -1,4 +1,5 @@
-from enacit4r_sql.utils.query import validate_params, ValidationError
+import pytest
+from enacit4r_sql.utils.query import validate_params, get_validator, ValidationError
 
 def test_validate_empty_params():
   try:
@@ -187,4 +188,63 @@ def test_validate_filter_or_and():
   try:
     validate_params({"$or": [ {"stars": { "$ge": 1 }}, {"$and": [ {"title": { "$like": "Drone" }}, {"title": { "$like": "Robot" }} ]} ]}, [], [])
   except ValidationError as e:
-    assert False, f"Error: {e}"
\ No newline at end of file
+    assert False, f"Error: {e}"
+
+
+def test_validator_is_cached():
+  assert get_validator() is get_validator()
+
+def test_fast_validator():
+  pytest.importorskip("fastjsonschema")
+  # generated function, not the validate method of a jsonschema validator
+  assert not hasattr(get_validator(), "__self__")
+  try:
+    get_validator()({"filter": {"stars": {"$unknown": 1}}})
+    assert False
+  except Exception as e:
+    assert "filter" in str(e)
+
+def test_validate_multi_sort_params():
+  try:
+    validate_params({}, [["name", "asc"], ["$author.name", "desc", "last"], ["id"]], [])
+  except ValidationError as e:
+    assert False, f"Error: {e}"
+  try:
+    validate_params({}, [["name", "toto"]], [])
+    assert False
+  except ValidationError as e:
+    pass
+  try:
+    validate_params({}, [["name", "asc", "middle"]], [])
+    assert False
+  except ValidationError as e:
+    pass
+  try:
+    validate_params({}, [[]], [])
+    assert False
+  except ValidationError as e:
+    pass
+
+def test_validate_filter_text_match():
+  for op in ["$startswith", "$istartswith", "$endswith", "$search"]:
+    try:
+      validate_params({"title": { op: "Drone" }}, [], [])
+    except ValidationError as e:
+      assert False, f"Error: {e}"
+    try:
+      validate_params({"title": { op: 1 }}, [], [])
+      assert False
+    except ValidationError as e:
+      pass
+
+def test_validate_dotted_fields_params():
+  try:
+    validate_params({}, [], [], ["title", "$author.name", "authors.email"])
+  except ValidationError as e:
+    assert False, f"Error: {e}"
+  for fields in [["author..name"], ["author.name.first"], ["title; drop"]]:
+    try:
+      validate_params({}, [], [], fields)
+      assert False
+    except ValidationError as e:
+      pass
@@ -0,0 +1,53 @@
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session
+from enacit4r_sql.utils.query import ValidationError
+from enacit4r_sql.utils.inlist import InListPolicy
+from enacit4r_sql.utils.template import FilterTemplate, Param
+from test_query import Article, Author, as_sql
+
+def test_template_query():
+    template = FilterTemplate(Article, {"stars": {"$gte": Param("min_stars")}, "$or": [{"id": Param("id")}, {"title": {"$startswith": Param("prefix")}}]}, ["id"], [0, 9])
+    start, end, query = template.build_query()
+    assert as_sql(query) == "SELECT article.id, article.title, article.stars FROM article WHERE article.stars >= :min_stars AND (article.id = :id OR article.title LIKE :prefix ESCAPE '/') ORDER BY article.id LIMIT :param_1 OFFSET :param_2"
+    assert template.build_query()[2] is query
+    assert template.build_count_query() is template.build_count_query()
+    assert template.bind(min_stars=1, id=2, prefix="50%") == {"min_stars": 1, "id": 2, "prefix": "50/%%"}
+
+def test_template_in_query():
+    template = FilterTemplate(Author, {"$article": {"stars": {"$in": Param("stars")}}}, [], [], joinModels={"$article": Article}, joinMode="exists",
+                              inListPolicy=InListPolicy("postgresql"))
+    query = template.build_count_query()
+    sql = as_sql(query.compile(dialect=postgresql.dialect()))
+    assert "article.stars = ANY (%(stars)s::INTEGER[])" in sql
+    assert template.bind(stars=(1, 2)) == {"stars": [1, 2]}
+
+def test_template_bind_errors():
+    template = FilterTemplate(Article, {"id": Param("id")}, [], [])
+    for values in [{}, {"id": 1, "other": 2}]:
+        try:
+            template.bind(**values)
+            assert False
+        except ValidationError:
+            pass
+    try:
+        FilterTemplate(Article, {"id": Param("id"), "stars": Param("id")}, [], [])
+        assert False
+    except ValidationError:
+        pass
+    try:
+        FilterTemplate(Article, {"title": {"$exists": Param("exists")}}, [], [])
+        assert False
+    except ValidationError:
+        pass
+    try:
+        template.builder.add_in_param("ids", "chunked")
+        assert False
+    except ValidationError:
+        pass
+
+def test_template_results(engine):
+    template = FilterTemplate(Article, {"stars": {"$gte": Param("min_stars")}, "title": {"$ilike": Param("text")}, "id": {"$nin": Param("ids")}}, ["id"], [])
+    start, end, query = template.build_query(["id"])
+    with Session(engine) as session:
+        assert session.exec(query, params=template.bind(min_stars=3, text="drone", ids=[4])).all() == [10, 14, 20]
+        assert session.exec(query, params=template.bind(min_stars=4, text="robot 1", ids=[])).all() == [15]